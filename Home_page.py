@@ -1,4 +1,26 @@
-from streamlit import set_page_config, title, write
+from os.path import basename
+
+from streamlit import (
+    set_page_config,
+    title,
+    write,
+    expander,
+    json,
+    dataframe,
+    download_button,
+    multiselect,
+    selectbox,
+    session_state,
+)
+
+from src.cache import get_shared_cache
+from src.profiler import (
+    PROFILED_PAGES,
+    collapsed_stacks,
+    hot_functions,
+    list_profiles,
+    load_profile,
+)
 
 set_page_config(
     page_title="Home page !",
@@ -13,6 +35,32 @@ write(
 )
 write("> Have fun ! :tada:")
 
+with expander("Shared cache statistics"):
+    json(get_shared_cache().stats())
+
+with expander("Profiling (sampling profiler)"):
+    # kept out of the widget state, dropped on a page switch
+    session_state["profiled_pages"] = multiselect(
+        label="Pages profiled on each rerun of this session:",
+        options=PROFILED_PAGES,
+        default=session_state.get("profiled_pages", []),
+    )
+    profiles = list_profiles()
+    dataframe(profiles.drop(columns="Path"), hide_index=True, use_container_width=True)
+    if not profiles.empty:
+        path = selectbox(label="Profile :", options=profiles["Path"])
+        stacks, metadata = load_profile(path)
+        dataframe(
+            hot_functions(stacks, metadata["interval"]),
+            hide_index=True,
+            use_container_width=True,
+        )
+        download_button(
+            label="Download the collapsed stacks (flamegraph.pl, speedscope)",
+            data=collapsed_stacks(stacks),
+            file_name=basename(path),
+        )
+
 
 # TODO : DOCSTRING
 # TODO : Index.py
@@ -1,23 +1,57 @@
 from streamlit import (
+    caption,
     title,
     session_state,
+    text_input,
     write,
     dataframe,
     toggle,
     columns,
+    expander,
     number_input,
     button,
+    selectbox,
     spinner,
     success,
     set_page_config,
+    error,
 )
-from pandas import DataFrame, date_range
+from functools import partial
+from secrets import token_urlsafe
+from pandas import DataFrame, Series, date_range
+from time import perf_counter
 from numpy import arange
 from numpy.random import randn
-from src.space_projection import compute_tsfeatures
-from src.utils import load_data, transform_dataset, inject_toy_series
+from src.cache import content_key, get_shared_cache
+from src.length_policy import DEFAULT_MAX_LENGTH, LENGTH_POLICIES, LengthPolicy
+from src.partitioning import (
+    compute_partitioned_tsfeatures,
+    detect_partitioned_periods,
+    open_server_dataset,
+)
+from src.planner import (
+    DEFAULT_LATENCY_BUDGET,
+    DEFAULT_MEMORY_BUDGET,
+    FEATURE_TIERS,
+    plan_execution,
+)
+from src.profiler import hot_functions, owned_task, start_profiler, stop_profiler
+from src.snapshot import (
+    list_snapshots,
+    load_snapshot,
+    owner_directory,
+    save_snapshot,
+    snapshot_directory,
+)
+from src.seasonality import compute_grouped_tsfeatures, detect_periods
+from src.space_projection import compute_tsfeatures, recompute_tsfeatures
+from src.summary import summarize_dataset
+from src.utils import TOY_SERIES, load_data, transform_dataset, inject_toy_series
+from src.views import ViewCache
 
 set_page_config(page_title="Dataset Loading")
+# the operator profiles the reruns of the pages from the Home page
+profiler = start_profiler("Dataset Loading", session_state)
 title(":green[Dataset management] page 💾")
 
 tuto = toggle("Show guide")
@@ -60,31 +94,367 @@ if tuto:
         ":warning: The date column name must be 'date' so the algorithm recognizes it."
     )
 
-dataset = load_data()
+out_of_core = toggle("Out-of-core mode (panels larger than memory)")
+with expander("Execution budget"):
+    # the features tier and the projections strategies are chosen to fit the budget
+    session_state["budget"] = {
+        "latency_budget": number_input(
+            label="Latency budget per step (s) :",
+            min_value=1,
+            value=DEFAULT_LATENCY_BUDGET,
+        ),
+        "memory_budget": number_input(
+            label="Memory budget (MB) :", min_value=64, value=DEFAULT_MEMORY_BUDGET
+        ),
+    }
+    # the features of the series longer than the max length are approximated
+    policy = selectbox(
+        label="Long series policy :", options=[None, *LENGTH_POLICIES], index=0
+    )
+    max_length = number_input(
+        label="Max exact series length :", min_value=16, value=DEFAULT_MAX_LENGTH
+    )
+    length_policy = (
+        None if policy is None else LengthPolicy(policy, max_length=max_length)
+    )
+    compute_features = (
+        compute_tsfeatures
+        if length_policy is None
+        else length_policy.compute_tsfeatures
+    )
+
+
+def previous_features(source_key: str):
+    # the features of the same series with other periods, only the period dependent
+    # features are computed again
+    if session_state.get("features_source") == source_key:
+        return session_state["features"]
+    return None
 
-if dataset is not None:
+
+def with_approximations(compute):
+    # the features and the series the length policy approximated, cached together
+    features = compute()
+    return features, None if length_policy is None else length_policy.approximations()
+
+
+def show_plan():
+    if "plan" in session_state:
+        with expander("Execution plan"):
+            dataframe(
+                session_state["plan"].describe(),
+                hide_index=True,
+                use_container_width=True,
+            )
+    approximations = session_state.get("approximations")
+    if approximations is not None and approximations["Approximated"].any():
+        with expander("Approximated long series"):
+            approximated = approximations[approximations["Approximated"]]
+            caption(
+                f"{len(approximated)} long series approximated, median standard error "
+                f"of their features {approximated['Standard error'].median():.3f}"
+            )
+            dataframe(
+                approximated.drop(columns="Approximated"),
+                hide_index=True,
+                use_container_width=True,
+            )
+    if session_state.get("periods"):
+        with expander("Detected seasonal periods"):
+            dataframe(
+                DataFrame(
+                    Series(session_state["periods"]).value_counts(),
+                ).rename_axis("Period"),
+                use_container_width=True,
+            )
+
+
+# a whole analysis is saved on the server disk, and reopened after an expired session
+with expander("Session snapshots"):
+    # the snapshots of a user are only found with their secret key, kept across the pages
+    if "snapshot_key_input" not in session_state:
+        session_state["snapshot_key_input"] = session_state.setdefault(
+            "snapshot_key", token_urlsafe(16)
+        )
+    snapshot_key = text_input(
+        label="Snapshot key (keep it to restore your snapshots in a later session) :",
+        key="snapshot_key_input",
+        type="password",
+    )
+    session_state["snapshot_key"] = snapshot_key
+    owner = owner_directory(snapshot_key)
+    c_save, c_restore = columns(2)
+    with c_save:
+        snapshot_name = text_input(label="Snapshot name (letters, digits, _ and -) :")
+        save = button(
+            "Save the analysis",
+            disabled="data_loaded" not in session_state
+            or not snapshot_name
+            or not snapshot_key,
+        )
+        if save:
+            try:
+                directory = snapshot_directory(owner, snapshot_name)
+            except ValueError as invalid:
+                error(str(invalid))
+            else:
+                cache = get_shared_cache()
+                embeddings = {
+                    key: cache.get(key)
+                    for key in session_state.get("embedding_keys", {}).values()
+                    if key in cache
+                }
+                try:
+                    with spinner("Saving the analysis"):
+                        save_snapshot(session_state, directory, embeddings)
+                except OSError as failure:
+                    error(f"The analysis could not be saved: {failure}")
+                else:
+                    success(f":green[Analysis saved as {snapshot_name}] ✅.")
+    with c_restore:
+        snapshots = list_snapshots(owner)
+        snapshot = selectbox(label="Snapshot :", options=snapshots["Snapshot"])
+        restore = button(
+            "Restore the analysis", disabled=snapshot is None or not snapshot_key
+        )
+        if restore:
+            start = perf_counter()
+            state, embeddings = load_snapshot(snapshot_directory(owner, snapshot))
+            # the projections are found in the shared cache, not computed again
+            for key, embedding in embeddings.items():
+                get_shared_cache().put(key, embedding)
+            # the approximations are only saved by a policy
+            state.setdefault("approximations", None)
+            # the selections are picked up by the Global Analysis widgets
+            for name, value in state.pop("selection", {}).items():
+                session_state[name] = value
+            for name, value in state.items():
+                session_state[name] = value
+            session_state["view_cache"] = ViewCache()
+            session_state["data_loaded"] = True
+            session_state["next_stage"] = True
+            success(f":green[{snapshot} restored in {perf_counter() - start:.1f}s] ✅.")
+
+if out_of_core:
     c_left, _, c_right = columns([0.35, 0.1, 0.55])
     with c_left:
+        source = text_input(
+            label="Path of a nixtla formatted .csv file or of a partitioned dataset in the server data directory :"
+        )
+        n_partitions = number_input(
+            label="Number of partitions :", min_value=1, value=64
+        )
         period = number_input(label="Enter the seasonal period :", min_value=1)
-        transform = button("Transform and compute")
-        if transform:
-            dataset = transform_dataset(dataset)
-    with c_right:
-        dataframe(dataset)
-    if (
-        ("unique_id" in dataset.columns)
-        & ("ds" in dataset.columns)
-        & ("y" in dataset.columns)
-        & (transform)
-    ):
+        detect = toggle("Detect the seasonal period of each serie")
+        transform = button("Partition and compute")
+    dataset = None
+    if source and transform:
+        with c_left:
+            try:
+                # only one partition at a time is loaded, only the features are kept in memory
+                with spinner("Partitioning"):
+                    dataset = open_server_dataset(source, n_partitions)
+            except ValueError as invalid:
+                error(str(invalid))
+    if dataset is not None:
         with c_left:
             with spinner("Features computation"):
-                session_state["dataset"] = inject_toy_series(dataset, freq=period)
-                session_state["features"] = compute_tsfeatures(
-                    df=session_state["dataset"], freq=period, fill_value=0
+                dataset.add_toy_series(freq=period)
+                lengths = [length for _, length in dataset.manifest["series"].values()]
+                plan = plan_execution(
+                    len(lengths),
+                    series_length=sum(lengths) / len(lengths),
+                    **session_state["budget"],
+                )
+                session_state["dataset"] = dataset
+                # the series are grouped by detected period, one features run per period
+                periods = (
+                    get_shared_cache().get_or_compute(
+                        content_key("periods", dataset.directory, dataset.manifest),
+                        lambda: detect_partitioned_periods(dataset),
+                    )
+                    if detect
+                    else None
+                )
+                session_state["features_key"] = content_key(
+                    "features",
+                    dataset.directory,
+                    dataset.manifest,
+                    period,
+                    detect,
+                    plan.feature_tier,
+                    repr(length_policy),
+                )
+                source_key = content_key(
+                    "features_source",
+                    dataset.directory,
+                    dataset.manifest["series"],
+                    plan.feature_tier,
+                    repr(length_policy),
                 )
+                previous = previous_features(source_key)
+                start = perf_counter()
+                (
+                    session_state["features"],
+                    session_state["approximations"],
+                ) = get_shared_cache().get_or_compute(
+                    session_state["features_key"],
+                    lambda: with_approximations(
+                        lambda: compute_partitioned_tsfeatures(
+                            dataset,
+                            freq=period,
+                            fill_value=0,
+                            features=FEATURE_TIERS[plan.feature_tier],
+                            length_policy=length_policy,
+                            periods=periods,
+                            previous=previous,
+                            wrap_task=owned_task,
+                        )
+                    ),
+                )
+                session_state["features_source"] = source_key
+                plan.record("Features", perf_counter() - start)
+                session_state["summary"] = get_shared_cache().get_or_compute(
+                    content_key("summary", dataset.directory, dataset.manifest),
+                    lambda: summarize_dataset(dataset),
+                )
+                session_state["plan"] = plan
+                session_state["period"] = period
+                session_state["periods"] = {} if periods is None else periods.to_dict()
+                session_state["view_cache"] = ViewCache()
                 session_state["data_loaded"] = True
                 session_state["next_stage"] = True
+        with c_right:
+            dataframe(
+                DataFrame(
+                    dataset.manifest["series"].values(),
+                    index=dataset.manifest["series"].keys(),
+                    columns=["Partition", "Length"],
+                )
+            )
     with c_left:
         if "next_stage" in session_state:
             success(":green[Loading complete] ✅.")
+            show_plan()
+else:
+    dataset = load_data()
+
+    if dataset is not None:
+        c_left, _, c_right = columns([0.35, 0.1, 0.55])
+        with c_left:
+            period = number_input(label="Enter the seasonal period :", min_value=1)
+            detect = toggle("Detect the seasonal period of each serie")
+            transform = button("Transform and compute")
+            if transform:
+                dataset = transform_dataset(dataset)
+        with c_right:
+            dataframe(dataset)
+        if (
+            ("unique_id" in dataset.columns)
+            & ("ds" in dataset.columns)
+            & ("y" in dataset.columns)
+            & (transform)
+        ):
+            with c_left:
+                with spinner("Features computation"):
+                    # the dataset and its features are shared between the sessions
+                    cache = get_shared_cache()
+                    dataset_key = content_key("dataset", dataset, period)
+                    session_state["dataset"] = cache.get_or_compute(
+                        dataset_key, lambda: inject_toy_series(dataset, freq=period)
+                    )
+                    lengths = session_state["dataset"].groupby("unique_id").size()
+                    plan = plan_execution(
+                        len(lengths),
+                        series_length=lengths.mean(),
+                        **session_state["budget"],
+                    )
+                    # the series are grouped by detected period, one features run per period
+                    periods = (
+                        cache.get_or_compute(
+                            content_key("periods", dataset_key),
+                            lambda: detect_periods(session_state["dataset"]),
+                        )
+                        if detect
+                        else None
+                    )
+                    session_state["features_key"] = content_key(
+                        "features",
+                        dataset_key,
+                        detect,
+                        plan.feature_tier,
+                        repr(length_policy),
+                    )
+                    source_key = content_key(
+                        "features_source",
+                        content_key("dataset", dataset),
+                        plan.feature_tier,
+                        repr(length_policy),
+                    )
+                    previous = previous_features(source_key)
+                    compute = (
+                        compute_features
+                        if previous is None
+                        else partial(
+                            recompute_tsfeatures,
+                            previous=previous,
+                            compute=compute_features,
+                            # the toys series are generated again with the new period
+                            stale=TOY_SERIES,
+                        )
+                    )
+                    start = perf_counter()
+                    (
+                        session_state["features"],
+                        session_state["approximations"],
+                    ) = cache.get_or_compute(
+                        session_state["features_key"],
+                        lambda: with_approximations(
+                            lambda: (
+                                compute(
+                                    df=session_state["dataset"],
+                                    freq=period,
+                                    fill_value=0,
+                                    features=FEATURE_TIERS[plan.feature_tier],
+                                )
+                                if periods is None
+                                else compute_grouped_tsfeatures(
+                                    session_state["dataset"],
+                                    periods,
+                                    fill_value=0,
+                                    features=FEATURE_TIERS[plan.feature_tier],
+                                    compute=compute,
+                                    wrap_task=owned_task,
+                                )
+                            )
+                        ),
+                    )
+                    session_state["features_source"] = source_key
+                    plan.record("Features", perf_counter() - start)
+                    # the panel statistics, computed once for all the series
+                    session_state["summary"] = cache.get_or_compute(
+                        content_key("summary", dataset_key),
+                        lambda: summarize_dataset(session_state["dataset"]),
+                    )
+                    session_state["plan"] = plan
+                    session_state["period"] = period
+                    session_state["periods"] = (
+                        {} if periods is None else periods.to_dict()
+                    )
+                    session_state["view_cache"] = ViewCache()
+                    session_state["data_loaded"] = True
+                    session_state["next_stage"] = True
+        with c_left:
+            if "next_stage" in session_state:
+                success(":green[Loading complete] ✅.")
+                show_plan()
+
+if profiler is not None:
+    profile_path = stop_profiler(profiler, "Dataset Loading", session_state)
+    with expander("Sampling profile of this rerun"):
+        caption(f"{profiler.duration:.1f}s sampled, saved to {profile_path}")
+        dataframe(
+            hot_functions(profiler.stacks, profiler.interval),
+            hide_index=True,
+            use_container_width=True,
+        )
@@ -1,26 +1,33 @@
 from streamlit import (
+    caption,
     columns,
+    multiselect,
+    text_input,
+    number_input,
+    toggle,
     selectbox,
+    slider,
     plotly_chart,
     dataframe,
+    expander,
     write,
     title,
     session_state,
     set_page_config,
 )
-from src.space_projection import compute_fft, compute_wavelets, compute_freq_and_psd
-from src.utils import transform_nixtla_format, advanced_describe, print_ts_features
-from src.plotting_tools import (
-    plot_time_view,
-    plot_fft_view,
-    plot_wavelet_view,
-    plot_density_view,
-    plot_psd_view,
-)
-from pandas import DataFrame
+from src.cache import content_key, get_shared_cache
+from src.neighbors import build_feature_index
+from src.partitioning import list_series, serie_length
+from src.profiler import hot_functions, start_profiler, stop_profiler
+from src.summary import SUMMARY_COLUMNS, outlier_statistics, summarize_dataset
+from src.utils import print_ts_features
+from src.views import VIEWS, WAVELET_MAX_POINTS, ViewCache, neighbouring_series
+from time import perf_counter
 
 
 set_page_config(page_title="Local Analysis")
+# the operator profiles the reruns of the pages from the Home page
+profiler = start_profiler("Local Analysis", session_state)
 
 if "data_loaded" in session_state:
     dataset = session_state["dataset"]
@@ -29,55 +36,109 @@ if "data_loaded" in session_state:
     title(":orange[Graphical] analysis :male-detective:")
 
     # layout
+    series_names = list_series(dataset)
     c1, c2 = columns(2)
     with c1:
         serie_name = selectbox(
             label="Choose the serie to plot:",
-            options=dataset.unique_id.sort_values().unique(),
+            options=series_names,
             index=1,
         )
     with c2:
-        plot_name = selectbox(
-            label="CHoose the type of plot:",
-            options=[
-                "Time view",
-                "Density view",
-                "Frequentist (FFT) view",
-                "Frequentist (PSD) view",
-                "Wavelets (ricker) view",
-            ],
-        )
+        plot_name = selectbox(label="CHoose the type of plot:", options=VIEWS)
 
-    data = transform_nixtla_format(dataset, serie_name)
-
-    # plot
-    match plot_name:
-        case "Time view":
-            fig = plot_time_view(data, serie_name)
-        case "Density view":
-            fig = plot_density_view(data, serie_name)
-        case "Frequentist (FFT) view":
-            fig = plot_fft_view(*compute_fft(data.loc[:, serie_name]), serie_name)
-        case "Frequentist (PSD) view":
-            frequencies, psd = compute_freq_and_psd(data)
-            fig = plot_psd_view(frequencies, psd, serie_name)
-        case "Wavelets (ricker) view":
-            widths, _, cwt_result = compute_wavelets(data)
-            fig = plot_wavelet_view(widths, len(data), cwt_result, serie_name)
-        case _:
-            raise ValueError("Unknown type of plot")
+    # the views are cached per session, the neighbouring series are prefetched
+    period = session_state.get("period", 24)
+    # the detected seasonal period of the serie, if any
+    period = session_state.get("periods", {}).get(serie_name, period)
+    if "view_cache" not in session_state:
+        session_state["view_cache"] = ViewCache()
+    view_cache = session_state["view_cache"]
+    window = None
+    if plot_name == "Wavelets (ricker) view":
+        # long series are shown as a pooled overview, zoom in for full resolution tiles
+        length = serie_length(dataset, serie_name) - 1
+        if length > WAVELET_MAX_POINTS:
+            window = slider(
+                label="Visible time window:",
+                min_value=0,
+                max_value=length,
+                value=(0, length),
+            )
+            window = None if window == (0, length) else window
+    fig, describe = view_cache.get_view(
+        dataset, serie_name, plot_name, period, window=window
+    )
+    view_cache.prefetch(
+        dataset, neighbouring_series(series_names, serie_name), plot_name, period
+    )
 
     plotly_chart(fig, use_container_width=True)
 
     # numerical analysis
     title(":blue[Numerical] analysis :male-detective:")
     write("Base analysis :")
-    dataframe(DataFrame(advanced_describe(data.loc[:, serie_name])).T)
+    dataframe(describe)
 
     write("Advanced analysis :")
     print_ts_features(features, serie_name)
 
+    title(":violet[Panel] summary :male-detective:")
+    # computed once after the upload, sortable by clicking the columns headers
+    if "summary" not in session_state:
+        session_state["summary"] = summarize_dataset(dataset)
+    summary = session_state["summary"]
+    summary = summary.assign(Outlying=outlier_statistics(summary))
+    c5, c6, c7 = columns([0.4, 0.3, 0.3])
+    with c5:
+        name_filter = text_input(label="Series names containing:")
+    with c6:
+        outlying_only = toggle("Outlying series only")
+    with c7:
+        shown_columns = multiselect(
+            label="Statistics:", options=SUMMARY_COLUMNS, default=SUMMARY_COLUMNS
+        )
+    if name_filter:
+        summary = summary[summary.index.str.contains(name_filter, regex=False)]
+    if outlying_only:
+        summary = summary[summary["Outlying"] != ""]
+    dataframe(
+        summary.loc[:, shown_columns + ["approximate", "Outlying"]],
+        use_container_width=True,
+    )
+    caption(f"{len(summary)} series")
+
+    title(":green[Closest] series :male-detective:")
+    c3, c4 = columns(2)
+    with c3:
+        n_neighbors = number_input(
+            label="Number of neighbours:", min_value=1, max_value=50, value=5
+        )
+    with c4:
+        include_reference = toggle("Include the M4 reference series")
+    features_key = session_state.get("features_key") or content_key(
+        "features", features
+    )
+    index = get_shared_cache().get_or_compute(
+        content_key("feature_index", features_key, include_reference),
+        lambda: build_feature_index(features, include_reference=include_reference),
+    )
+    start = perf_counter()
+    neighbours = index.query(serie_name, k=n_neighbors)
+    dataframe(neighbours, width=1000)
+    caption(f"Query time: {1000 * (perf_counter() - start):.2f} ms")
+
 else:
     title(
         ":warning: You must load your dataset first in the :orange[Dataset Management] page !"
     )
+
+if profiler is not None:
+    profile_path = stop_profiler(profiler, "Local Analysis", session_state)
+    with expander("Sampling profile of this rerun"):
+        caption(f"{profiler.duration:.1f}s sampled, saved to {profile_path}")
+        dataframe(
+            hot_functions(profiler.stacks, profiler.interval),
+            hide_index=True,
+            use_container_width=True,
+        )
@@ -1,65 +1,213 @@
 from streamlit import (
+    caption,
     columns,
+    dataframe,
+    expander,
     selectbox,
     plotly_chart,
     multiselect,
     title,
+    toggle,
+    spinner,
     session_state,
     set_page_config,
+    slider,
+    warning,
 )
 
-from src.utils import (
-    build_reduc_dim_df,
-    get_top_five_correlations,
-    encoder,
-    preprocess_features,
-)
-from src.plotting_tools import plot_reducted_dim, plot_correlation_heatmap
-from src.dimension_reduction import PCAReductor, UMAPReductor, TSNEReductor
+from src.aggregation import AGGREGATION_THRESHOLD, AXES
+from src.atlas import ATLAS_TIERS
+from src.dimension_reduction import REDUCTION_ALGORITHMS
+from src.export import EXPORT_FORMATS
+from src.feature_pruning import DEFAULT_PRUNING_THRESHOLD
+from src.global_analysis import GlobalAnalysis, reference_atlas
+from src.plotting_tools import plot_correlation_heatmap
+from src.profiler import hot_functions, owned_task, start_profiler, stop_profiler
 
 
 set_page_config(page_title="Global analysis")
+# the operator profiles the reruns of the pages from the Home page
+profiler = start_profiler("Global Analysis", session_state)
 
 if "data_loaded" in session_state:
     # Data loading - to be removed
     features = session_state["features"]
 
-    names, features, features_values = preprocess_features(features=features)
+    with expander("Redundant features pruning"):
+        prune = toggle("Keep one feature per group of near-duplicates")
+        threshold = slider(
+            label="Absolute rank correlation threshold :",
+            min_value=0.5,
+            max_value=1.0,
+            value=DEFAULT_PRUNING_THRESHOLD,
+            step=0.01,
+        )
+        analysis = GlobalAnalysis(
+            features,
+            session_state.get("features_key"),
+            plan=session_state.get("plan"),
+            budget=session_state.get("budget"),
+            pruning_threshold=threshold if prune else None,
+        )
+        if analysis.dropped is not None:
+            caption(
+                f"{len(analysis.dropped)} of the {features.shape[1] - 1} features dropped"
+            )
+            dataframe(analysis.dropped, hide_index=True, use_container_width=True)
+    session_state["plan"] = plan = analysis.plan
+    names = analysis.names
 
     # layout
     c1, c2 = columns([0.3, 0.7])
     with c1:
         reduc_dim_algo = selectbox(
             label="Dimension reduction algorithm :",
-            options=["PCA", "T-SNE", "UMAP"],
+            options=REDUCTION_ALGORITHMS,
             index=0,
         )
+        compute_all = toggle("Compute all the projections concurrently")
+        side_by_side = toggle("Side by side comparison", disabled=not compute_all)
+        fast = toggle("Fast mode (non-deterministic, multi-threaded UMAP)")
+        # beyond some tens of thousands of markers the 3d scatter freezes the browser
+        aggregate = toggle(
+            "Density-aggregated rendering",
+            value=analysis.n_samples > AGGREGATION_THRESHOLD,
+        )
+        # an updated panel starts from the layout of the previous one
+        keep_layout = toggle("Keep the previous layout (warm start)", value=True)
     with c2:
-        selected_datasets = multiselect(label="Dataset(s) to focus on:", options=names)
+        selected_datasets = multiselect(
+            label="Dataset(s) to focus on:", options=names, key="selected_datasets"
+        )
+        with expander("Feature trajectories (rolling windows)"):
+            period = session_state.get("period", 24)
+            followed_series = multiselect(
+                label="Series to follow:", options=names, key="followed_series"
+            )
+            c_window, c_step = columns(2)
+            window = c_window.number_input(
+                label="Window (points):", min_value=2, value=4 * period
+            )
+            step = c_step.number_input(
+                label="Step (points):", min_value=1, value=period
+            )
+        with expander("M4 reference atlas"):
+            # the partitions of the seasonal periods of the series only
+            periods = sorted(set(session_state.get("periods", {}).values()) or {period})
+            atlas, frequencies, mismatches = reference_atlas(
+                periods, analysis.features.columns
+            )
+            atlas_tier = selectbox(
+                label="Reference series overlaid (per frequency):",
+                options=["None", *ATLAS_TIERS],
+                disabled=not frequencies or bool(mismatches),
+            )
+            caption(
+                f"Frequencies of the periods {periods}: {', '.join(frequencies) or 'none'}"
+            )
+            if mismatches:
+                warning(
+                    "The reference features do not match the features of the dataset, "
+                    f"the atlas is not overlaid: {'; '.join(mismatches)}"
+                )
+
+    # the widget values are dropped on a page switch, kept here for the snapshots
+    session_state["selection"] = {
+        "selected_datasets": selected_datasets,
+        "followed_series": followed_series,
+    }
+
+    # all the projections run in the background, switching algorithm is then instant
+    analysis.launch(
+        REDUCTION_ALGORITHMS if compute_all else [reduc_dim_algo],
+        session_state.setdefault("previous_embeddings", {}),
+        session_state.setdefault("embedding_keys", {}),
+        keep_layout=keep_layout,
+        fast=fast,
+        wrap_task=owned_task,
+    )
+    layers = {
+        "aggregate": aggregate,
+        "window_features": analysis.window_features(
+            session_state.get("dataset"), followed_series, window, step, period
+        ),
+        "reference": (
+            None
+            if not frequencies or mismatches or atlas_tier == "None"
+            else analysis.reference_series(atlas, periods, atlas_tier)
+        ),
+    }
 
     title(":blue[Feature space projection] analysis :male-detective:")
     # Reducted dim scatterplot
-    if reduc_dim_algo == "PCA":
-        reducted_features = PCAReductor().fit_transform(features_values)
-    elif reduc_dim_algo == "T-SNE":
-        reducted_features = TSNEReductor(
-            perplexity=min(30, features_values.shape[0] - 1)
-        ).fit_transform(features_values)
+    if compute_all and side_by_side:
+        placeholders = {}
+        for algo, column in zip(REDUCTION_ALGORITHMS, columns(3)):
+            placeholders[algo] = column.empty()
+            placeholders[algo].info(f"{algo} projection running...")
+        for algo, reducted_features in analysis.completed():
+            fig = analysis.figure(
+                algo,
+                analysis.embedding_frame(reducted_features, selected_datasets),
+                **layers,
+            )
+            placeholders[algo].plotly_chart(
+                figure_or_data=fig, use_container_width=True
+            )
     else:
-        reducted_features = UMAPReductor().fit_transform(features_values)
-
-    reducted_df = build_reduc_dim_df(reducted_features, serie_names=names)
-    reducted_df["Style"] = names.apply(encoder, selected_datasets=selected_datasets)
-
-    fig = plot_reducted_dim(reducted_df, reduc_dim_algo)
-    plotly_chart(figure_or_data=fig, use_container_width=True)
+        with spinner(f"{reduc_dim_algo} projection running..."):
+            reducted_features = analysis.embedding(reduc_dim_algo)
+        reducted_df = analysis.embedding_frame(reducted_features, selected_datasets)
+        region = None
+        if aggregate:
+            region = {}
+            with expander("Zoom (drill down to the individual series)"):
+                for axis, column in zip(AXES, columns(3)):
+                    low, high = reducted_df[axis].agg(["min", "max"]).astype(float)
+                    region[axis] = column.slider(axis, low, high, (low, high))
+        fig = analysis.figure(reduc_dim_algo, reducted_df, region=region, **layers)
+        plotly_chart(figure_or_data=fig, use_container_width=True)
 
     title(":violet[Features/dimension correlation] analysis :male-detective:")
     # Correlation part
-    top_five = get_top_five_correlations(reducted_df.iloc[:, :3], features)
+    reducted_df = analysis.embedding_frame(
+        analysis.embedding(reduc_dim_algo), selected_datasets
+    )
+    top_five = analysis.correlations(reducted_df)
     fig = plot_correlation_heatmap(top_five)
     plotly_chart(figure_or_data=fig, use_container_width=True)
+
+    # the same numbers for the downstream jobs, with a shared metadata
+    with expander("Export (Arrow IPC / Parquet)"):
+        export_format = selectbox(label="Format :", options=list(EXPORT_FORMATS))
+        exported = analysis.exports(
+            reduc_dim_algo,
+            reducted_df,
+            top_five,
+            export_format,
+            period,
+            session_state.get("periods"),
+        )
+        for (kind, data), column in zip(exported.items(), columns(3)):
+            column.download_button(
+                label=f"Download the {kind}",
+                data=data,
+                file_name=kind + EXPORT_FORMATS[export_format],
+            )
+
+    with expander("Execution plan"):
+        dataframe(plan.describe(), hide_index=True, use_container_width=True)
 else:
     title(
         ":warning: You must load your dataset first in the :orange[Dataset Management] page !"
     )
+
+if profiler is not None:
+    profile_path = stop_profiler(profiler, "Global Analysis", session_state)
+    with expander("Sampling profile of this rerun"):
+        caption(f"{profiler.duration:.1f}s sampled, saved to {profile_path}")
+        dataframe(
+            hot_functions(profiler.stacks, profiler.interval),
+            hide_index=True,
+            use_container_width=True,
+        )
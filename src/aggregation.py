@@ -0,0 +1,155 @@
+from typing import Dict, Tuple
+
+from numpy import array, bincount, clip, int64, log1p, ravel_multi_index, unique
+from pandas import DataFrame, Series
+from sklearn.cluster import KMeans
+
+
+AXES = ["fst_dim", "snd_dim", "trd_dim"]
+AGGREGATION_THRESHOLD = 50_000
+
+
+def voxelize(
+    reducted_df: DataFrame,
+    bins: int = 20,
+    region: Dict[str, Tuple[float, float]] = None,
+) -> DataFrame:
+    """
+    Bins a 3d embedding into bins**3 voxels and summarizes each non-empty voxel by the centroid
+    and the number of its points. The result has at most bins**3 rows, whatever the number of
+    series.
+
+    Args:
+        reducted_df (DataFrame): The 3d reducted features space of the series.
+        bins (int, optional): The number of bins per axis. Defaults to 20.
+        region (Dict[str, Tuple[float, float]], optional): The (low, high) bounds of each axis to
+            bin, the points outside being clipped to the border voxels. Defaults to the extent
+            of the embedding.
+
+    Returns:
+        DataFrame: The voxels centroids (fst_dim, snd_dim, trd_dim) and their "Count".
+    """
+    coordinates = reducted_df.loc[:, AXES].to_numpy(dtype=float)
+    if region is None:
+        lower, upper = coordinates.min(axis=0), coordinates.max(axis=0)
+    else:
+        lower = array([region[axis][0] for axis in AXES], dtype=float)
+        upper = array([region[axis][1] for axis in AXES], dtype=float)
+    width = (upper - lower) / bins
+    width[width == 0] = 1
+    cells = clip(((coordinates - lower) / width).astype(int64), 0, bins - 1)
+    voxels, inverse, counts = unique(
+        ravel_multi_index(cells.T, (bins,) * 3), return_inverse=True, return_counts=True
+    )
+    aggregated = DataFrame(
+        {
+            axis: bincount(inverse, weights=coordinates[:, i]) / counts
+            for i, axis in enumerate(AXES)
+        }
+    )
+    aggregated["Count"] = counts
+    return aggregated
+
+
+def cluster_centroids(
+    voxels: DataFrame, n_clusters: int = 8, random_state: int = 0
+) -> DataFrame:
+    """
+    Clusters the voxels (weighted by their number of points) with KMeans, the cost depending on
+    the number of voxels only.
+
+    Args:
+        voxels (DataFrame): The voxels (see voxelize).
+        n_clusters (int, optional): The number of clusters. Defaults to 8.
+        random_state (int, optional): The KMeans seed. Defaults to 0.
+
+    Returns:
+        DataFrame: The clusters centroids, their "Count" and their "Name".
+    """
+    n_clusters = min(n_clusters, len(voxels))
+    kmeans = KMeans(n_clusters=n_clusters, n_init=3, random_state=random_state)
+    labels = kmeans.fit_predict(voxels.loc[:, AXES], sample_weight=voxels["Count"])
+    centroids = DataFrame(kmeans.cluster_centers_, columns=AXES)
+    centroids["Count"] = bincount(
+        labels, weights=voxels["Count"], minlength=n_clusters
+    ).astype(int64)
+    centroids["Name"] = [f"Cluster {i}" for i in range(n_clusters)]
+    return centroids
+
+
+def in_region(reducted_df: DataFrame, region: Dict[str, Tuple[float, float]]) -> Series:
+    """
+    Returns the mask of the points inside a box of the embedding.
+
+    Args:
+        reducted_df (DataFrame): The 3d reducted features space of the series.
+        region (Dict[str, Tuple[float, float]]): The (low, high) bounds of each axis.
+
+    Returns:
+        Series: The boolean mask.
+    """
+    mask = Series(True, index=reducted_df.index)
+    for axis, (low, high) in region.items():
+        mask &= reducted_df[axis].between(low, high)
+    return mask
+
+
+def aggregate_embedding(
+    reducted_df: DataFrame,
+    region: Dict[str, Tuple[float, float]] = None,
+    max_points: int = 5000,
+    bins: int = 20,
+    n_clusters: int = 8,
+) -> Tuple[DataFrame, DataFrame, DataFrame]:
+    """
+    Splits an embedding between the points to draw individually and a density summary. The
+    highlighted ("Selected" and "Added") series are always drawn individually. The other series
+    of the region are drawn individually when they are at most max_points, and are otherwise
+    summarized by their voxels and cluster centroids, bounding the figure size.
+
+    Args:
+        reducted_df (DataFrame): The 3d reducted features space of the series (see
+            build_reduc_dim_df), with the "Style" column.
+        region (Dict[str, Tuple[float, float]], optional): The zoomed region, as (low, high)
+            bounds per axis. Defaults to None (the whole embedding).
+        max_points (int, optional): The number of points above which the region is aggregated.
+            Defaults to 5000.
+        bins (int, optional): The number of voxels per axis. Defaults to 20.
+        n_clusters (int, optional): The number of cluster centroids. Defaults to 8.
+
+    Returns:
+        Tuple[DataFrame, DataFrame, DataFrame]: [The points drawn individually, the voxels,
+        the clusters centroids], the last two being None when nothing is aggregated.
+    """
+    highlighted = reducted_df["Style"] != "Base"
+    visible = Series(True, index=reducted_df.index)
+    if region is not None:
+        visible = in_region(reducted_df, region)
+    base = reducted_df[visible & ~highlighted]
+    if len(base) <= max_points:
+        return reducted_df[visible | highlighted], None, None
+    voxels = voxelize(base, bins=bins, region=region)
+    return (
+        reducted_df[highlighted],
+        voxels,
+        cluster_centroids(voxels, n_clusters=n_clusters),
+    )
+
+
+def marker_sizes(counts: Series, min_size: float = 3, max_size: float = 14) -> Series:
+    """
+    Scales the markers of the voxels with the log of their number of points.
+
+    Args:
+        counts (Series): The number of points of each voxel.
+        min_size (float, optional): The size of the smallest voxel. Defaults to 3.
+        max_size (float, optional): The size of the largest voxel. Defaults to 14.
+
+    Returns:
+        Series: The markers sizes.
+    """
+    scaled = log1p(counts)
+    span = scaled.max() - scaled.min()
+    if span == 0:
+        return Series(max_size, index=counts.index)
+    return min_size + (max_size - min_size) * (scaled - scaled.min()) / span
@@ -0,0 +1,316 @@
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from json import dump, load
+from os import makedirs
+from os.path import exists, join
+from typing import Callable, Dict, Iterable, Iterator, List
+import os
+
+from numpy import isnan, repeat
+from numpy.random import default_rng
+from pandas import DataFrame, concat, read_csv
+
+from precomputed_ressources.loader import load_computed_features
+from src.export import (
+    export_metadata,
+    feature_set_version,
+    read_export,
+    to_table,
+    write_table,
+)
+from src.space_projection import compute_tsfeatures
+
+
+ATLAS_DIRECTORY = join("precomputed_ressources", "atlas")
+ATLAS_VERSION = 1
+MANIFEST = "manifest.json"
+# the seasonal periods of the M4 frequencies, as in the competition
+M4_FREQUENCIES = {
+    "Yearly": 1,
+    "Quarterly": 4,
+    "Monthly": 12,
+    "Weekly": 1,
+    "Daily": 1,
+    "Hourly": 24,
+}
+# the rows of a partition are shuffled, its first rows are a uniform sample of its series
+ATLAS_TIERS = {"Overview": 1_000, "Detailed": 5_000, "Full": None}
+
+
+class ReferenceAtlas:
+    """
+    The precomputed features of a reference collection of series (the M4 competition), stored
+    in one memory mappable Arrow partition per frequency and described by a manifest. Only
+    the partitions of the seasonal periods of a dataset are read, and only the columns and
+    the series asked for.
+    """
+
+    def __init__(self, directory: str = ATLAS_DIRECTORY) -> None:
+        self.directory = directory
+        with open(join(directory, MANIFEST)) as handle:
+            self.manifest = load(handle)
+
+    def __repr__(self):
+        return f"ReferenceAtlas\nDirectory : {self.directory}\nSeries : {sum(self.series().values())}"
+
+    @staticmethod
+    def is_atlas(directory: str = ATLAS_DIRECTORY) -> bool:
+        return exists(join(directory, MANIFEST))
+
+    def series(self) -> Dict[str, int]:
+        return {
+            frequency: partition["series"]
+            for frequency, partition in self.manifest["partitions"].items()
+        }
+
+    def frequencies(self, periods: Iterable[int]) -> List[str]:
+        """
+        Returns the frequencies of the partitions matching seasonal periods.
+
+        Args:
+            periods (Iterable[int]): The seasonal periods.
+
+        Returns:
+            List[str]: The frequencies, in the order of M4_FREQUENCIES.
+        """
+        periods = set(periods)
+        return [
+            frequency
+            for frequency, partition in self.manifest["partitions"].items()
+            if partition["period"] in periods
+        ]
+
+    def check_features(
+        self, periods: Iterable[int], columns: Iterable[str]
+    ) -> List[str]:
+        """
+        Checks that the partitions matching seasonal periods hold all the features of a
+        dataset, computed by the same tsfeatures version. A partition whose
+        feature_set_version is the one of the features matches without being read.
+
+        Args:
+            periods (Iterable[int]): The seasonal periods.
+            columns (Iterable[str]): The features of the dataset.
+
+        Returns:
+            List[str]: The mismatches of the partitions, empty if they match.
+        """
+        columns = list(columns)
+        version = feature_set_version(columns)
+        problems = []
+        for frequency in self.frequencies(periods):
+            partition = self.manifest["partitions"][frequency]
+            if partition["feature_set_version"] == version:
+                continue
+            # the version is the tsfeatures one and a digest of the features names
+            computed_with = partition["feature_set_version"].split("+")[0]
+            if computed_with != version.split("+")[0]:
+                problems.append(f"{frequency} computed with {computed_with}")
+            table, _ = read_export(join(self.directory, partition["file"]))
+            missing = [name for name in columns if name not in table.schema.names]
+            if missing:
+                problems.append(
+                    f"{frequency} misses {len(missing)} features ({', '.join(missing[:5])})"
+                )
+        return problems
+
+    def load(
+        self,
+        periods: Iterable[int],
+        columns: Iterable[str] = None,
+        max_series: int = None,
+    ) -> DataFrame:
+        """
+        Loads the features of the reference series of the partitions matching seasonal
+        periods. The partitions are memory mapped, the columns and the rows left out are
+        never read.
+
+        Args:
+            periods (Iterable[int]): The seasonal periods.
+            columns (Iterable[str], optional): The features kept, the missing ones being
+                left out. Defaults to None (all of them).
+            max_series (int, optional): The number of series read per partition, a uniform
+                sample (see ATLAS_TIERS). Defaults to None (all of them).
+
+        Returns:
+            DataFrame: The features, with the "unique_id" and the "Frequency" of the series.
+        """
+        frames = []
+        for frequency in self.frequencies(periods):
+            table, _ = read_export(
+                join(self.directory, self.manifest["partitions"][frequency]["file"])
+            )
+            if columns is not None:
+                kept = ["unique_id", *columns]
+                table = table.select(
+                    [name for name in kept if name in table.schema.names]
+                )
+            frame = table.slice(0, max_series).to_pandas()
+            frame["Frequency"] = frequency
+            frames.append(frame)
+        if not frames:
+            return DataFrame(columns=["unique_id", "Frequency"])
+        return concat(frames, ignore_index=True)
+
+
+def write_partition(
+    features: DataFrame,
+    frequency: str,
+    directory: str = ATLAS_DIRECTORY,
+    random_state: int = 0,
+) -> str:
+    """
+    Writes the features of the reference series of a frequency as a partition of an atlas,
+    and records it in the manifest. The series are shuffled.
+
+    Args:
+        features (DataFrame): The features, with the "unique_id" column.
+        frequency (str): The M4 frequency (see M4_FREQUENCIES).
+        directory (str, optional): The atlas directory, created if needed. Defaults to
+            ATLAS_DIRECTORY.
+        random_state (int, optional): The seed of the shuffle. Defaults to 0.
+
+    Raises:
+        ValueError: If the frequency is unknown.
+
+    Returns:
+        str: The path of the partition.
+    """
+    if frequency not in M4_FREQUENCIES:
+        raise ValueError(f"Unknown M4 frequency: {frequency}")
+    makedirs(directory, exist_ok=True)
+    manifest = {"version": ATLAS_VERSION, "partitions": {}}
+    if exists(join(directory, MANIFEST)):
+        with open(join(directory, MANIFEST)) as handle:
+            manifest = load(handle)
+
+    order = default_rng(random_state).permutation(len(features))
+    features = features.iloc[order].reset_index(drop=True)
+    names = features.columns.drop("unique_id")
+    file_name = f"{frequency.lower()}.arrow"
+    metadata = export_metadata(
+        "features", period=M4_FREQUENCIES[frequency], features=names
+    )
+    write_table(to_table(features, metadata), join(directory, file_name))
+
+    manifest["partitions"][frequency] = {
+        "file": file_name,
+        "period": M4_FREQUENCIES[frequency],
+        "series": len(features),
+        "feature_set_version": feature_set_version(names),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    # the partitions in the order of the frequencies
+    manifest["partitions"] = {
+        name: manifest["partitions"][name]
+        for name in M4_FREQUENCIES
+        if name in manifest["partitions"]
+    }
+    with open(join(directory, MANIFEST), "w") as handle:
+        dump(manifest, handle, indent=1)
+    return join(directory, file_name)
+
+
+def read_m4_csv(path: str, chunksize: int = 1000) -> Iterator[DataFrame]:
+    """
+    Reads a training file of the M4 competition (e.g. "Hourly-train.csv", one serie per
+    row, padded with missing values) as nixtla panels, by chunks of series.
+
+    Args:
+        path (str): The path of the file.
+        chunksize (int, optional): The number of series of a chunk. Defaults to 1000.
+
+    Yields:
+        Iterator[DataFrame]: The nixtla panels.
+    """
+    for chunk in read_csv(path, index_col=0, chunksize=chunksize):
+        values = chunk.to_numpy(dtype=float)
+        observed = ~isnan(values)
+        yield DataFrame(
+            {
+                "unique_id": repeat(chunk.index.to_numpy(), observed.sum(axis=1)),
+                "ds": observed.nonzero()[1],
+                "y": values[observed],
+            }
+        )
+
+
+def build_partition(
+    path: str,
+    frequency: str,
+    directory: str = ATLAS_DIRECTORY,
+    chunksize: int = 1000,
+    features: Iterable[str] = None,
+    compute: Callable[..., DataFrame] = compute_tsfeatures,
+) -> str:
+    """
+    Computes the features of the series of an M4 training file, offline and by chunks of
+    series, and writes them as a partition of an atlas (see write_partition).
+
+    Args:
+        path (str): The M4 training file of the frequency (see read_m4_csv).
+        frequency (str): The M4 frequency (see M4_FREQUENCIES).
+        directory (str, optional): The atlas directory. Defaults to ATLAS_DIRECTORY.
+        chunksize (int, optional): The number of series computed at once. Defaults to 1000.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run.
+            Defaults to None (all the tsfeatures default functions).
+        compute (Callable[..., DataFrame], optional): The features computation, called with
+            df, freq, fill_value and features. Defaults to compute_tsfeatures.
+
+    Raises:
+        ValueError: If the frequency is unknown.
+
+    Returns:
+        str: The path of the partition.
+    """
+    if frequency not in M4_FREQUENCIES:
+        raise ValueError(f"Unknown M4 frequency: {frequency}")
+    computed = [
+        compute(
+            df=panel,
+            freq=M4_FREQUENCIES[frequency],
+            fill_value=0,
+            features=features,
+        )
+        for panel in read_m4_csv(path, chunksize)
+    ]
+    return write_partition(
+        concat(computed, ignore_index=True).fillna(0), frequency, directory
+    )
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Offline build of the M4 reference atlas.")
+    parser.add_argument("--directory", default=ATLAS_DIRECTORY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "seed", help="Write the Hourly partition from the bundled M4 hourly features."
+    )
+    build = commands.add_parser(
+        "build", help="Compute the partitions from the M4 training files."
+    )
+    build.add_argument("m4", help="The directory of the <Frequency>-train.csv files.")
+    build.add_argument(
+        "--frequencies",
+        nargs="*",
+        choices=M4_FREQUENCIES,
+        default=list(M4_FREQUENCIES),
+    )
+    build.add_argument("--chunksize", type=int, default=1000)
+    arguments = parser.parse_args()
+
+    if arguments.command == "seed":
+        print(write_partition(load_computed_features(), "Hourly", arguments.directory))
+        return
+    for frequency in arguments.frequencies:
+        path = join(arguments.m4, f"{frequency}-train.csv")
+        print(
+            build_partition(path, frequency, arguments.directory, arguments.chunksize),
+            flush=True,
+        )
+    # the threads started by the tsfeatures dependencies can deadlock the shutdown
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
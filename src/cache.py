@@ -0,0 +1,407 @@
+from collections import OrderedDict
+from hashlib import sha256
+from os import environ, makedirs, remove, replace
+from os.path import getsize, join
+from tempfile import gettempdir, mkstemp
+from threading import Lock, RLock
+from typing import Any, Callable, Hashable
+import pickle
+
+from numpy import ndarray, ascontiguousarray
+from pandas import DataFrame, Series
+from pandas.util import hash_pandas_object
+
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+DEFAULT_MAX_SPILL_BYTES = 8 * 1024**3
+
+
+def content_key(namespace: str, *parts: Any) -> str:
+    """
+    Given a namespace and some objects, compute a content-addressed key. Two calls with equal
+    contents (not only equal references) return the same key.
+
+    Args:
+        namespace (str): The kind of object cached (e.g. "dataset", "features", "embedding").
+        *parts (Any): The DataFrames, arrays or plain values the cached object depends on.
+
+    Returns:
+        str: The hexadecimal key.
+    """
+    digest = sha256(namespace.encode())
+    for part in parts:
+        if isinstance(part, (DataFrame, Series)):
+            names = part.columns if isinstance(part, DataFrame) else [part.name]
+            digest.update(str(list(names)).encode())
+            digest.update(hash_pandas_object(part, index=False).values.tobytes())
+        elif isinstance(part, ndarray):
+            digest.update(str((part.dtype, part.shape)).encode())
+            digest.update(ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+def sizeof(value: Any) -> int:
+    """
+    Estimates the memory footprint of a cached value.
+
+    Args:
+        value (Any): The cached value.
+
+    Returns:
+        int: Its size in bytes.
+    """
+    if isinstance(value, DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sum(sizeof(item) for item in value.values())
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    """
+    A thread-safe, size-aware least recently used cache. Entries are evicted, least recently
+    used first, as soon as the total size exceeds the memory budget (if any) or the number of
+    entries exceeds max_entries (if any).
+    """
+
+    def __init__(
+        self, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return f"{type(self).__name__}\nEntries : {len(self)}\nSize : {self.current_bytes}/{self.max_bytes} bytes"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value and marks it as the most recently used one.
+
+        Args:
+            key (Hashable): The key of the value.
+            default (Any, optional): The value returned on a miss. Defaults to None.
+
+        Returns:
+            Any: The cached value, or default if the key is unknown.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores a value, evicting the least recently used entries if the budget is exceeded.
+        A value larger than the whole budget is not kept in memory.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (Any): The value to cache.
+        """
+        size = 0 if self.max_bytes is None else sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+            self._evict()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self._entries[key]
+            self._discard(key)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The hits, misses, evictions, number of entries and memory usage of the cache.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _discard(self, key: Hashable) -> None:
+        del self._entries[key]
+        self.current_bytes -= self._sizes.pop(key)
+
+    def _evict(self) -> None:
+        while self._entries and (
+            (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+            or (self.max_entries is not None and len(self._entries) > self.max_entries)
+        ):
+            key, value = next(iter(self._entries.items()))
+            self._discard(key)
+            self.evictions += 1
+            self._on_evict(key, value)
+
+    def _on_evict(self, key: Hashable, value: Any) -> None:
+        pass
+
+
+class SharedCache(LRUCache):
+    """
+    A process-wide, content-addressed cache shared by all the streamlit sessions. Entries evicted
+    from memory are spilled to disk, outside of the cache lock, and reloaded on the next access.
+    The spilled files are removed, least recently used first, once they exceed the disk budget (if any).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        spill_dir: str = None,
+        max_spill_bytes: int = DEFAULT_MAX_SPILL_BYTES,
+    ) -> None:
+        super().__init__(max_bytes=max_bytes)
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.spill_bytes = 0
+        self.spills = 0
+        self.spill_evictions = 0
+        self.disk_hits = 0
+        # evicted values waiting to be written, and the size of the written ones
+        self._spilling = OrderedDict()
+        self._spilled = OrderedDict()
+        self._writing = set()
+        self._key_locks = {}
+        if spill_dir is not None:
+            makedirs(spill_dir, exist_ok=True)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries or key in self._spilling or key in self._spilled
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                return super().get(key)
+            value = self._spilling.get(key, _MISSING)
+            spilled = key in self._spilled
+        if value is _MISSING and spilled:
+            value = self._load(key)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            if spilled and key in self._spilled:
+                self.disk_hits += 1
+                self._spilled.move_to_end(key)
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        super().put(key, value)
+        self._write_spills()
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            self._key_locks.pop(key, None)
+            return super().pop(key, default)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value, or computes and caches it on a miss. Concurrent sessions asking
+        for the same key wait for a single computation instead of running it again.
+
+        Args:
+            key (str): The content key of the value (see content_key).
+            compute (Callable[[], Any]): The function computing the value.
+
+        Returns:
+            Any: The cached or computed value.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        with key_lock:
+            value = self.get(key, default=_MISSING)
+            if value is _MISSING:
+                try:
+                    value = compute()
+                except BaseException:
+                    with self._lock:
+                        if key not in self._entries:
+                            self._key_locks.pop(key, None)
+                    raise
+                self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            paths = [self._path(key) for key in self._spilled]
+            self._spilling.clear()
+            self._spilled.clear()
+            self._key_locks.clear()
+            self.spill_bytes = 0
+        _remove_files(paths)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = super().stats()
+            stats.update(
+                {
+                    "spills": self.spills,
+                    "spill_evictions": self.spill_evictions,
+                    "disk_hits": self.disk_hits,
+                    "spilled_entries": len(self._spilled),
+                    "spill_bytes": self.spill_bytes,
+                    "max_spill_bytes": self.max_spill_bytes,
+                }
+            )
+            return stats
+
+    def _path(self, key: str) -> str:
+        return join(self.spill_dir, f"{key}.pickle")
+
+    def _load(self, key: str) -> Any:
+        try:
+            with open(self._path(key), "rb") as handle:
+                return pickle.load(handle)
+        except FileNotFoundError:
+            # removed by clear or by the disk budget in the meantime
+            return _MISSING
+
+    def _on_evict(self, key: str, value: Any) -> None:
+        self._key_locks.pop(key, None)
+        if self.spill_dir is None or key in self._spilled or key in self._spilling:
+            return
+        self._spilling[key] = value
+
+    def _write_spills(self) -> None:
+        """
+        Writes the evicted values to the spill directory. Called once the cache lock is
+        released, the pickling of a large value does not block the other sessions.
+        """
+        while True:
+            with self._lock:
+                pending = [key for key in self._spilling if key not in self._writing]
+                if not pending:
+                    return
+                key = pending[0]
+                value = self._spilling[key]
+                self._writing.add(key)
+            handle, temporary = mkstemp(dir=self.spill_dir, suffix=".tmp")
+            try:
+                with open(handle, "wb") as file:
+                    pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+                size = getsize(temporary)
+                replace(temporary, self._path(key))
+            except BaseException:
+                with self._lock:
+                    self._writing.discard(key)
+                    self._spilling.pop(key, None)
+                _remove_files([temporary])
+                raise
+            with self._lock:
+                self._writing.discard(key)
+                if self._spilling.pop(key, _MISSING) is _MISSING:
+                    # cleared while it was written
+                    removed = [self._path(key)]
+                else:
+                    self._spilled[key] = size
+                    self.spill_bytes += size
+                    self.spills += 1
+                    removed = self._trim_spills()
+            _remove_files(removed)
+
+    def _trim_spills(self) -> list:
+        removed = []
+        while self._spilled and (
+            self.max_spill_bytes is not None and self.spill_bytes > self.max_spill_bytes
+        ):
+            key, size = self._spilled.popitem(last=False)
+            self.spill_bytes -= size
+            self.spill_evictions += 1
+            removed.append(self._path(key))
+        return removed
+
+
+def _remove_files(paths: list) -> None:
+    for path in paths:
+        try:
+            remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_MISSING = object()
+_shared_cache = None
+_shared_cache_lock = Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """
+    Returns the process-wide cache, creating it on first use. The memory and disk budgets (in MB)
+    and the spill directory are read from the FBP_CACHE_MAX_MB, FBP_CACHE_MAX_SPILL_MB and
+    FBP_CACHE_SPILL_DIR environment variables.
+
+    Returns:
+        SharedCache: The cache shared by every session of the process.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            max_bytes = int(
+                float(environ.get("FBP_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 1024**2))
+                * 1024**2
+            )
+            max_spill_bytes = int(
+                float(
+                    environ.get(
+                        "FBP_CACHE_MAX_SPILL_MB", DEFAULT_MAX_SPILL_BYTES / 1024**2
+                    )
+                )
+                * 1024**2
+            )
+            spill_dir = environ.get(
+                "FBP_CACHE_SPILL_DIR", join(gettempdir(), "fbp_cache")
+            )
+            _shared_cache = SharedCache(
+                max_bytes=max_bytes,
+                spill_dir=spill_dir,
+                max_spill_bytes=max_spill_bytes,
+            )
+        return _shared_cache
@@ -1,26 +1,211 @@
 from abc import ABC, abstractmethod
-from numpy.typing import ArrayLike
-from numpy import number
+from concurrent.futures import Future, ThreadPoolExecutor
+from inspect import signature
+from threading import RLock
+from typing import Any, Callable, Dict, Iterable
+import pickle
+from numpy.typing import ArrayLike, DTypeLike
+from numpy import (
+    number,
+    arange,
+    asarray,
+    issubdtype,
+    empty,
+    ones,
+    ndarray,
+    float32,
+    where,
+)
+from numpy.random import default_rng
 from sklearn.base import BaseEstimator
 from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
+from sklearn.neighbors import KNeighborsRegressor
 from sklearn.preprocessing import StandardScaler
-from umap import UMAP
+from pandas import DataFrame, Series
+
+from src.cache import content_key, get_shared_cache
+from src.neighbors import KNNGraph, build_knn_graph
+
+
+REDUCTION_ALGORITHMS = ("PCA", "T-SNE", "UMAP")
+# the refinement of a warm started layout, instead of the 1000 t-SNE iterations and the
+# 200 to 500 UMAP epochs of a cold start
+WARM_START_TSNE_ITER = 250
+WARM_START_UMAP_EPOCHS = 50
+# the iterations parameter of TSNE, n_iter before scikit-learn 1.5 (removed in 1.7)
+TSNE_ITERATIONS = "max_iter" if "max_iter" in signature(TSNE).parameters else "n_iter"
+
+
+class WarmStart:
+    """
+    The embedding of a previous run, indexed by unique_id, used to initialize a reductor on a
+    panel sharing most of its series: the kept series start at their previous coordinates and
+    the new ones at the inverse distance weighting of their nearest kept series.
+    """
+
+    def __init__(
+        self,
+        previous: DataFrame,
+        names: Iterable[str],
+        min_overlap: float = 0.5,
+        n_neighbors: int = 10,
+    ) -> None:
+        self.previous = previous
+        self.names = Series(names).reset_index(drop=True)
+        self.min_overlap = min_overlap
+        self.n_neighbors = n_neighbors
+        self.known_ = self.names.isin(previous.index).to_numpy()
+        self.key_ = content_key(
+            "warm_start", previous.reset_index(), self.names, min_overlap, n_neighbors
+        )
+
+    def __repr__(self):
+        # the content key makes the warm start part of the embedding keys
+        return f"WarmStart({self.key_})"
+
+    @property
+    def applies(self) -> bool:
+        return bool(self.known_.any()) and self.known_.mean() >= self.min_overlap
+
+    def subset(self, indices: ArrayLike) -> "WarmStart":
+        return WarmStart(
+            self.previous, self.names.iloc[indices], self.min_overlap, self.n_neighbors
+        )
+
+    def initialization(self, X_scaled: ArrayLike) -> ndarray:
+        """
+        Builds the initial embedding of the series.
+
+        Args:
+            X_scaled (ArrayLike): The scaled features of the series, in the names order.
+
+        Returns:
+            ndarray: The (n_samples, 3) initial embedding.
+        """
+        init = self.previous.reindex(self.names).to_numpy(dtype=float32)
+        if not self.known_.all():
+            init[~self.known_] = interpolate_embedding(
+                X_scaled[self.known_],
+                init[self.known_],
+                X_scaled[~self.known_],
+                n_neighbors=self.n_neighbors,
+            )
+        return init
+
+    def orientation(self, embedding: ArrayLike) -> ndarray:
+        """
+        The signs flipping the axes of an embedding to match the previous one, the sign of a
+        principal component being arbitrary.
+
+        Args:
+            embedding (ArrayLike): The new embedding of the series.
+
+        Returns:
+            ndarray: +1 or -1 per axis.
+        """
+        previous = self.previous.reindex(self.names[self.known_]).to_numpy()
+        current = asarray(embedding)[self.known_]
+        agreement = ((previous - previous.mean(0)) * (current - current.mean(0))).sum(0)
+        return where(agreement < 0, -1, 1)
 
 
 class Reductor(BaseEstimator, ABC):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        dtype: DTypeLike = None,
+        scaler: StandardScaler = None,
+        copy: bool = True,
+        warm_start: WarmStart = None,
+    ) -> None:
+        self.dtype = dtype
+        self.scaler = scaler
+        self.copy = copy
+        self.warm_start = warm_start
         self.reducted_dataset_ = None
+        self.scaler_ = None
+        self.model_ = None
 
     @abstractmethod
     def fit_transform(self, X: ArrayLike) -> ArrayLike:
         ...
 
+    def transform(self, X: ArrayLike) -> ArrayLike:
+        """
+        Project new samples with the fitted reductor.
+
+        Args:
+            X (ArrayLike): The samples, with the features of the fitted dataset.
+
+        Raises:
+            RuntimeError: If the reductor is not fitted.
+            ValueError: If the fitted model cannot project new samples (t-SNE, UMAP fitted
+                on a neighbours graph without a search index).
+
+        Returns:
+            ArrayLike: The projected samples.
+        """
+        if self.reducted_dataset_ is None or self.scaler_ is None:
+            raise RuntimeError(f"{type(self).__name__} is not fitted")
+        # t-SNE keeps no model
+        if not hasattr(self.model_, "transform"):
+            raise ValueError(f"{type(self).__name__} cannot project new samples")
+        X = asarray(X, dtype=self.dtype)
+        self.test_numeric(X)
+        try:
+            return self.model_.transform(self.scaler_.transform(X))
+        except NotImplementedError as error:
+            raise ValueError(
+                f"{type(self).__name__} cannot project new samples: {error}"
+            ) from error
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "Reductor":
+        with open(path, "rb") as handle:
+            return pickle.load(handle)
+
     def standard_scale(self, X: ArrayLike) -> ArrayLike:
-        return StandardScaler().fit_transform(X)
+        """
+        Standard scale the dataset in the reductor dtype. A scaler already fitted on the same
+        features can be shared between reductors (see fit_scaler). If copy is False, the
+        dataset is scaled in place whenever its dtype already matches.
+
+        Args:
+            X (ArrayLike): The dataset to scale.
+
+        Returns:
+            ArrayLike: The scaled dataset.
+        """
+        X_cast = asarray(X, dtype=self.dtype)
+        # the cast already made a private copy, scaling it in place is safe
+        copy = self.copy and X_cast is X
+        if self.scaler is not None:
+            self.scaler_ = self.scaler
+        else:
+            self.scaler_ = StandardScaler().fit(X_cast)
+        return self.scaler_.transform(X_cast, copy=copy)
+
+    def warm_start_init(self, X_scaled: ArrayLike) -> ndarray:
+        """
+        The initial embedding given by the warm start, if any and if the panel shares enough
+        series with the previous one.
+
+        Args:
+            X_scaled (ArrayLike): The scaled dataset.
+
+        Returns:
+            ndarray: The initial embedding, or None for a cold start.
+        """
+        if self.warm_start is None or not self.warm_start.applies:
+            return None
+        return self.warm_start.initialization(X_scaled)
 
     def test_numeric(self, X: ArrayLike) -> bool:
-        if X.dtype != number:
+        if not issubdtype(X.dtype, number):
             raise RuntimeError("Input containing non-numeric values")
 
 
@@ -29,15 +214,24 @@ class PCAReductor(Reductor):
     A dimension reductor using Principal Component Analysis algorithm.
     """
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        svd_solver: str = "auto",
+        dtype: DTypeLike = None,
+        scaler: StandardScaler = None,
+        copy: bool = True,
+        warm_start: WarmStart = None,
+    ) -> None:
+        super().__init__(dtype=dtype, scaler=scaler, copy=copy, warm_start=warm_start)
+        self.svd_solver = svd_solver
 
     def __repr__(self):
         return f"PCAReductor\nReducted dataset available : {self.reducted_dataset_ is not None}"
 
     def fit_transform(self, X: ArrayLike) -> ArrayLike:
         """
-        Fit the PCA object and transform the dataset.
+        Fit the PCA object and transform the dataset. With a warm start, the axes are oriented
+        as the previous embedding ones.
 
         Args:
             X (ArrayLike): The dataset to perform dimension reduction on.
@@ -46,9 +240,13 @@ class PCAReductor(Reductor):
             ndarray: the transformed dataset.
         """
         super().test_numeric(X)
-        self.reducted_dataset_ = PCA(n_components=3).fit_transform(
-            self.standard_scale(X)
-        )
+        # the scaled dataset is owned by the reductor, PCA can center it in place
+        self.model_ = PCA(n_components=3, copy=False, svd_solver=self.svd_solver)
+        self.reducted_dataset_ = self.model_.fit_transform(self.standard_scale(X))
+        if self.warm_start is not None and self.warm_start.applies:
+            signs = self.warm_start.orientation(self.reducted_dataset_)
+            self.model_.components_ *= signs[:, None]
+            self.reducted_dataset_ *= signs
         return self.reducted_dataset_
 
 
@@ -57,16 +255,26 @@ class TSNEReductor(Reductor):
     A dimension reductor using the T-distributed Stochastic Neighbor Embedding method.
     """
 
-    def __init__(self, perplexity: float = 30) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        perplexity: float = 30,
+        knn_graph: KNNGraph = None,
+        dtype: DTypeLike = None,
+        scaler: StandardScaler = None,
+        copy: bool = True,
+        warm_start: WarmStart = None,
+    ) -> None:
+        super().__init__(dtype=dtype, scaler=scaler, copy=copy, warm_start=warm_start)
         self.perplexity = perplexity
+        self.knn_graph = knn_graph
 
     def __repr__(self):
         return f"TSNEReductor\nReducted dataset available : {self.reducted_dataset_ is not None}"
 
     def fit_transform(self, X: ArrayLike) -> ArrayLike:
         """
-        Fit the TSNE object and transform the dataset.
+        Fit the TSNE object and transform the dataset. With a warm start, the previous layout
+        is only refined (no early exaggeration, WARM_START_TSNE_ITER iterations).
 
         Args:
             X (ArrayLike): The dataset to perform dimension reduction on.
@@ -75,9 +283,20 @@ class TSNEReductor(Reductor):
             ndarray: the transformed dataset.
         """
         super().test_numeric(X)
-        self.reducted_dataset_ = TSNE(
-            n_components=3, perplexity=self.perplexity
-        ).fit_transform(self.standard_scale(X))
+        params = {"n_components": 3, "perplexity": self.perplexity}
+        if self.knn_graph is None:
+            scaled = data = self.standard_scale(X)
+        else:
+            # the shared graph replaces the neighbours search, PCA init needs the raw data
+            n_neighbors = min(X.shape[0] - 1, int(3.0 * self.perplexity + 1))
+            data = self.knn_graph.sparse_distances(n_neighbors)
+            params.update(metric="precomputed", init="random")
+            scaled = None if self.warm_start is None else self.standard_scale(X)
+        init = self.warm_start_init(scaled)
+        if init is not None:
+            params.update(init=init, early_exaggeration=1.0)
+            params[TSNE_ITERATIONS] = WARM_START_TSNE_ITER
+        self.reducted_dataset_ = TSNE(**params).fit_transform(data)
         return self.reducted_dataset_
 
 
@@ -86,17 +305,90 @@ class UMAPReductor(Reductor):
     A dimension reductor using the Uniform Manifold Approximation and Projection algorithm.
     """
 
-    def __init__(self, n_neighbors: float = 15, random_state: int = 0) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        n_neighbors: float = 15,
+        random_state: int = 0,
+        knn_graph: KNNGraph = None,
+        dtype: DTypeLike = None,
+        scaler: StandardScaler = None,
+        copy: bool = True,
+        warm_start: WarmStart = None,
+    ) -> None:
+        super().__init__(dtype=dtype, scaler=scaler, copy=copy, warm_start=warm_start)
         self.n_neighbors = n_neighbors
         self.random_state = random_state
+        self.knn_graph = knn_graph
 
     def __repr__(self):
         return f"UMAPReductor\nReducted dataset available : {self.reducted_dataset_ is not None}"
 
     def fit_transform(self, X: ArrayLike) -> ArrayLike:
         """
-        Fit the UMAP object and transform the dataset.
+        Fit the UMAP object and transform the dataset. A random_state of None runs the fast,
+        non-deterministic and multi-threaded version of UMAP. With a warm start, the previous
+        layout is only refined for WARM_START_UMAP_EPOCHS epochs.
+
+        Args:
+            X (ArrayLike): The dataset to perform dimension reduction on.
+
+        Returns:
+            ndarray: the transformed dataset.
+        """
+        super().test_numeric(X)
+        # umap (and its numba compilation) is only loaded on the first UMAP projection
+        from umap import UMAP
+
+        # the other series at most, as UMAP truncates n_neighbors without a graph
+        n_neighbors = min(self.n_neighbors, len(X) - 1)
+        precomputed_knn = (None, None, None)
+        if self.knn_graph is not None:
+            precomputed_knn = (
+                *self.knn_graph.neighbors(n_neighbors),
+                self.knn_graph.search_index,
+            )
+        scaled = self.standard_scale(X)
+        init = self.warm_start_init(scaled)
+        warm_params = {}
+        if init is not None:
+            warm_params = {"init": init, "n_epochs": WARM_START_UMAP_EPOCHS}
+        self.model_ = UMAP(
+            n_components=3,
+            n_neighbors=n_neighbors,
+            random_state=self.random_state,
+            precomputed_knn=precomputed_knn,
+            **warm_params,
+        )
+        self.reducted_dataset_ = self.model_.fit_transform(scaled)
+        return self.reducted_dataset_
+
+
+class SubsampledReductor(Reductor):
+    """
+    Fits a reductor on a random subsample of the series and projects the others out of sample:
+    with the fitted PCA, or for the neighbour embeddings (t-SNE, UMAP) by inverse distance
+    weighting of the embeddings of their nearest fitted series.
+    """
+
+    def __init__(
+        self,
+        reductor: Reductor = None,
+        n_samples: int = 5000,
+        n_neighbors: int = 10,
+        random_state: int = 0,
+    ) -> None:
+        super().__init__()
+        self.reductor = reductor
+        self.n_samples = n_samples
+        self.n_neighbors = n_neighbors
+        self.random_state = random_state
+
+    def __repr__(self):
+        return f"SubsampledReductor\nReductor : {type(self.reductor).__name__}\nSamples : {self.n_samples}"
+
+    def fit_transform(self, X: ArrayLike) -> ArrayLike:
+        """
+        Fit the reductor on the subsample and project the whole dataset.
 
         Args:
             X (ArrayLike): The dataset to perform dimension reduction on.
@@ -104,8 +396,332 @@ class UMAPReductor(Reductor):
         Returns:
             ndarray: the transformed dataset.
         """
+        X = asarray(X)
         super().test_numeric(X)
-        self.reducted_dataset_ = UMAP(
-            n_components=3, n_neighbors=self.n_neighbors, random_state=self.random_state
-        ).fit_transform(self.standard_scale(X))
+        if X.shape[0] <= self.n_samples:
+            self.reducted_dataset_ = self.reductor.fit_transform(X)
+            return self.reducted_dataset_
+
+        indices = sample_indices(X.shape[0], self.n_samples, self.random_state)
+        others = ones(X.shape[0], dtype=bool)
+        others[indices] = False
+        warm_start = self.reductor.warm_start
+        if warm_start is not None:
+            # the fitted reductor only sees the subsample
+            self.reductor.set_params(warm_start=warm_start.subset(indices))
+        try:
+            embedding = self.reductor.fit_transform(X[indices])
+        finally:
+            self.reductor.set_params(warm_start=warm_start)
+        # a t-SNE fitted on a neighbours graph does not scale the dataset itself
+        self.scaler_ = self.reductor.scaler_ or self.reductor.scaler
+        if self.scaler_ is None:
+            self.scaler_ = fit_scaler(X[indices], dtype=self.reductor.dtype)
+        self.reducted_dataset_ = empty((X.shape[0], 3), dtype=embedding.dtype)
+        self.reducted_dataset_[indices] = embedding
+        if isinstance(self.reductor, PCAReductor):
+            self.reducted_dataset_[others] = self.reductor.transform(X[others])
+        else:
+            self.reducted_dataset_[others] = interpolate_embedding(
+                self.scaler_.transform(asarray(X[indices], dtype=self.reductor.dtype)),
+                embedding,
+                self.scaler_.transform(asarray(X[others], dtype=self.reductor.dtype)),
+                n_neighbors=self.n_neighbors,
+            )
         return self.reducted_dataset_
+
+    def transform(self, X: ArrayLike) -> ArrayLike:
+        return self.reductor.transform(X)
+
+
+def sample_indices(n: int, n_samples: int, random_state: int = 0) -> ndarray:
+    """
+    The sorted indices of a random subsample, the same for the same arguments (a neighbours
+    graph can then be built on the subsample a SubsampledReductor will fit).
+
+    Args:
+        n (int): The number of series.
+        n_samples (int): The size of the subsample.
+        random_state (int, optional): The seed. Defaults to 0.
+
+    Returns:
+        ndarray: The indices.
+    """
+    if n_samples >= n:
+        return arange(n)
+    indices = default_rng(random_state).choice(n, size=n_samples, replace=False)
+    indices.sort()
+    return indices
+
+
+def interpolate_embedding(
+    fitted: ArrayLike, embedding: ArrayLike, queries: ArrayLike, n_neighbors: int = 10
+) -> ndarray:
+    """
+    Places new points in an embedding by inverse distance weighting of the embeddings of their
+    nearest fitted points, in the (scaled) features space.
+
+    Args:
+        fitted (ArrayLike): The scaled features of the embedded points.
+        embedding (ArrayLike): Their embedding.
+        queries (ArrayLike): The scaled features of the new points.
+        n_neighbors (int, optional): The number of neighbours. Defaults to 10.
+
+    Returns:
+        ndarray: The embedding of the new points.
+    """
+    regressor = KNeighborsRegressor(
+        n_neighbors=min(n_neighbors, len(fitted)), weights="distance"
+    )
+    return regressor.fit(fitted, embedding).predict(queries).astype(embedding.dtype)
+
+
+def project_samples(
+    reductor: Reductor,
+    X: ArrayLike,
+    embedding: ArrayLike,
+    X_new: ArrayLike,
+    n_neighbors: int = 10,
+    interpolate: bool = False,
+) -> ndarray:
+    """
+    Projects new samples into the embedding of a dataset: through the fitted reductor when it
+    can transform new samples, by interpolation between the embedded samples otherwise (t-SNE,
+    UMAP fitted on a neighbours graph, or a reductor whose embedding was read from the cache).
+
+    Args:
+        reductor (Reductor): The reductor of the embedding.
+        X (ArrayLike): The embedded dataset.
+        embedding (ArrayLike): Its embedding.
+        X_new (ArrayLike): The new samples, with the features of the dataset.
+        n_neighbors (int, optional): The number of neighbours of the interpolation. Defaults to 10.
+        interpolate (bool, optional): Whether to interpolate even with a fitted reductor, the
+            projection then depends only on the embedding, fitted or read from the cache.
+            Defaults to False.
+
+    Returns:
+        ndarray: The embedding of the new samples.
+    """
+    if not interpolate:
+        try:
+            return reductor.transform(X_new)
+        except (RuntimeError, ValueError):
+            pass
+    dtype = getattr(reductor, "dtype", None)
+    scaler = reductor.scaler_ or reductor.scaler or fit_scaler(X, dtype=dtype)
+    return interpolate_embedding(
+        scaler.transform(asarray(X, dtype=dtype)),
+        asarray(embedding),
+        scaler.transform(asarray(X_new, dtype=dtype)),
+        n_neighbors=n_neighbors,
+    )
+
+
+def fit_scaler(X: ArrayLike, dtype: DTypeLike = None) -> StandardScaler:
+    """
+    Fit a standard scaler to be shared by the reductors working on the same features.
+
+    Args:
+        X (ArrayLike): The features matrix.
+        dtype (DTypeLike, optional): The dtype the reductors will work in. Defaults to None.
+
+    Returns:
+        StandardScaler: The fitted scaler.
+    """
+    return StandardScaler().fit(asarray(X, dtype=dtype))
+
+
+def required_neighbors(algorithm: str, parameter: float, n_samples: int) -> int:
+    """
+    The number of neighbours (each point included) of the graph needed by a t-SNE perplexity
+    or a UMAP n_neighbors.
+
+    Args:
+        algorithm (str): "T-SNE" or "UMAP".
+        parameter (float): The perplexity or the n_neighbors.
+        n_samples (int): The number of series to project.
+
+    Returns:
+        int: The number of neighbours of the graph.
+    """
+    if algorithm == "T-SNE":
+        return min(n_samples - 1, int(3.0 * parameter + 1)) + 1
+    return min(n_samples, int(parameter))
+
+
+def build_reductor(
+    algorithm: str,
+    n_samples: int,
+    knn_graph: KNNGraph = None,
+    fast: bool = False,
+    **kwargs,
+) -> Reductor:
+    """
+    Build the reductor of an algorithm with the parameters used by the app.
+
+    Args:
+        algorithm (str): One of "PCA", "T-SNE" or "UMAP".
+        n_samples (int): The number of series to project (bounds the t-SNE perplexity).
+        knn_graph (KNNGraph, optional): A neighbours graph shared by t-SNE and UMAP. Defaults to None.
+        fast (bool, optional): Whether to run UMAP unseeded, multi-threaded. Defaults to False.
+        **kwargs: The common reductor parameters (dtype, scaler, copy, warm_start).
+
+    Raises:
+        ValueError: If the algorithm is unknown.
+
+    Returns:
+        Reductor: The reductor.
+    """
+    match algorithm:
+        case "PCA":
+            return PCAReductor(**kwargs)
+        case "T-SNE":
+            return TSNEReductor(
+                perplexity=min(30, n_samples - 1), knn_graph=knn_graph, **kwargs
+            )
+        case "UMAP":
+            return UMAPReductor(
+                random_state=None if fast else 0, knn_graph=knn_graph, **kwargs
+            )
+        case _:
+            raise ValueError(f"Unknown dimension reduction algorithm: {algorithm}")
+
+
+_executor = None
+_running = {}
+_running_lock = RLock()
+
+
+def launch_projections(
+    X: ArrayLike,
+    reductors: Dict[str, Reductor],
+    keys: Dict[str, str],
+    wrap_task: Callable[[Callable], Callable] = None,
+) -> Dict[str, Future]:
+    """
+    Launch the reductors concurrently in a process-wide worker pool. The embeddings are stored
+    in the shared cache under their key, and a projection already running (for any session)
+    is not launched twice.
+
+    Args:
+        X (ArrayLike): The dataset to perform dimension reduction on.
+        reductors (Dict[str, Reductor]): The reductors per algorithm name.
+        keys (Dict[str, str]): The shared cache key of each algorithm embedding.
+        wrap_task (Callable[[Callable], Callable], optional): Applied to each task submitted
+            to the pool, e.g. to profile it with the rerun. Defaults to None.
+
+    Returns:
+        Dict[str, Future]: The future embedding of each algorithm.
+    """
+    global _executor
+    cache = get_shared_cache()
+    futures = {}
+    with _running_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=len(REDUCTION_ALGORITHMS), thread_name_prefix="reductor"
+            )
+        for algorithm, reductor in reductors.items():
+            key = keys[algorithm]
+            if key in _running:
+                futures[algorithm] = _running[key]
+                continue
+            task = cache.get_or_compute
+            future = _executor.submit(
+                task if wrap_task is None else wrap_task(task),
+                key,
+                lambda r=reductor: r.fit_transform(X),
+            )
+            _running[key] = future
+            future.add_done_callback(lambda _, key=key: _forget(key))
+            futures[algorithm] = future
+    return futures
+
+
+def _forget(key: str) -> None:
+    with _running_lock:
+        _running.pop(key, None)
+
+
+def embedding_key(features_key: str, algorithm: str, reductor: Reductor) -> str:
+    """
+    The shared cache key of an embedding. The scaler and the neighbours graph derive from
+    the features and are left out of the key.
+
+    Args:
+        features_key (str): The content key of the features.
+        algorithm (str): The reduction algorithm.
+        reductor (Reductor): The reductor.
+
+    Returns:
+        str: The key.
+    """
+    return content_key(
+        "embedding", features_key, algorithm, reductor_parameters(reductor)
+    )
+
+
+def reductor_parameters(reductor: Reductor) -> Dict[str, Any]:
+    """
+    The parameters defining the embedding of a reductor: the scaler and the neighbours graph
+    derive from the features and are left out.
+
+    Args:
+        reductor (Reductor): The reductor.
+
+    Returns:
+        Dict[str, Any]: The parameters, the nested reductors (see SubsampledReductor)
+        appearing through their own parameters.
+    """
+    return {
+        name: value
+        for name, value in reductor.get_params().items()
+        if name.rsplit("__", 1)[-1] not in ("scaler", "knn_graph")
+        and not isinstance(value, Reductor)
+    }
+
+
+def sweep(
+    X: ArrayLike,
+    algorithm: str,
+    values: Iterable[float],
+    random_state: int = 0,
+    dtype: DTypeLike = None,
+) -> Dict[float, ArrayLike]:
+    """
+    Compute the embeddings of a grid of t-SNE perplexities or UMAP n_neighbors. The dataset is
+    scaled once and its neighbours graph is built once, at the largest k needed.
+
+    Args:
+        X (ArrayLike): The dataset to perform dimension reduction on.
+        algorithm (str): "T-SNE" or "UMAP".
+        values (Iterable[float]): The perplexities or n_neighbors to try.
+        random_state (int, optional): The UMAP seed, None for the fast multi-threaded mode. Defaults to 0.
+        dtype (DTypeLike, optional): The dtype to work in. Defaults to None.
+
+    Raises:
+        ValueError: If the algorithm has no neighbours parameter.
+
+    Returns:
+        Dict[float, ArrayLike]: The embedding of each value.
+    """
+    if algorithm not in ("T-SNE", "UMAP"):
+        raise ValueError(f"No neighbours parameter to sweep for {algorithm}")
+    values = list(values)
+    X = asarray(X, dtype=dtype)
+    scaler = fit_scaler(X)
+    n_neighbors = max(required_neighbors(algorithm, v, X.shape[0]) for v in values)
+    knn_graph = build_knn_graph(
+        scaler.transform(X), n_neighbors, random_state=random_state
+    )
+    embeddings = {}
+    for value in values:
+        if algorithm == "T-SNE":
+            reductor = TSNEReductor(perplexity=value, knn_graph=knn_graph)
+        else:
+            reductor = UMAPReductor(
+                n_neighbors=value, random_state=random_state, knn_graph=knn_graph
+            )
+        reductor.set_params(scaler=scaler, dtype=dtype)
+        embeddings[value] = reductor.fit_transform(X)
+    return embeddings
@@ -0,0 +1,297 @@
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from json import dumps, loads
+from os import makedirs
+from os.path import join
+from typing import Any, Dict, Iterable, Mapping, Tuple
+
+from pandas import DataFrame, Series
+
+from src.cache import content_key
+
+
+EXPORT_FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+EXPORT_KINDS = ("features", "embedding", "correlations")
+SCHEMA_VERSION = 1
+# the key of the export metadata in the arrow schema metadata
+METADATA_KEY = b"ts_projector"
+
+
+def feature_set_version(columns: Iterable[str]) -> str:
+    """
+    Identifies a set of features: the tsfeatures version and a digest of the features names.
+
+    Args:
+        columns (Iterable[str]): The features names, without the unique_id.
+
+    Returns:
+        str: The feature set version, e.g. "tsfeatures-0.4.5+0123456789ab".
+    """
+    try:
+        tsfeatures_version = version("tsfeatures")
+    except PackageNotFoundError:
+        tsfeatures_version = "unknown"
+    digest = content_key("feature_set", sorted(columns))[:12]
+    return f"tsfeatures-{tsfeatures_version}+{digest}"
+
+
+def export_metadata(
+    kind: str,
+    period: int = None,
+    algorithm: str = None,
+    parameters: Dict[str, Any] = None,
+    features: Iterable[str] = None,
+    periods: Mapping[str, int] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the metadata shared by the exported tables.
+
+    Args:
+        kind (str): The exported table (see EXPORT_KINDS).
+        period (int, optional): The seasonal period of the features. Defaults to None.
+        algorithm (str, optional): The reduction algorithm. Defaults to None.
+        parameters (Dict[str, Any], optional): The reductor parameters, the non json values
+            being kept as their repr. Defaults to None.
+        features (Iterable[str], optional): The features names (see feature_set_version).
+            Defaults to None.
+        periods (Mapping[str, int], optional): The detected seasonal period of each serie,
+            when the features were computed per serie. The period is then their common
+            one, None if they differ. Defaults to None.
+
+    Raises:
+        ValueError: If the kind is unknown.
+
+    Returns:
+        Dict[str, Any]: The metadata.
+    """
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Unknown export kind: {kind}")
+    if periods:
+        periods = {str(name): int(value) for name, value in periods.items()}
+        distinct = set(periods.values())
+        period = distinct.pop() if len(distinct) == 1 else None
+    return {
+        "kind": kind,
+        "schema_version": SCHEMA_VERSION,
+        "period": period,
+        "periods": periods or None,
+        "algorithm": algorithm,
+        "parameters": loads(dumps(parameters or {}, default=repr)),
+        "feature_set_version": (
+            None if features is None else feature_set_version(features)
+        ),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def correlations_frame(top_five: Dict[str, Series]) -> DataFrame:
+    """
+    Flattens the top correlated features of each axis (see get_top_five_correlations).
+
+    Args:
+        top_five (Dict[str, Series]): The correlations of the top features, per axis.
+
+    Returns:
+        DataFrame: The "Axis", "Rank", "Feature" and "Kendall tau" of each correlation.
+    """
+    return DataFrame(
+        [
+            [axis, rank, feature, float(tau)]
+            for axis, correlations in top_five.items()
+            for rank, (feature, tau) in enumerate(correlations.items(), start=1)
+        ],
+        columns=["Axis", "Rank", "Feature", "Kendall tau"],
+    )
+
+
+def correlations_from_frame(frame: DataFrame) -> Dict[str, Series]:
+    """
+    Rebuilds the top correlated features of each axis from their flattened frame (see
+    correlations_frame).
+
+    Args:
+        frame (DataFrame): The flattened correlations.
+
+    Returns:
+        Dict[str, Series]: The correlations of the top features, per axis.
+    """
+    return {
+        axis: Series(
+            group["Kendall tau"].to_numpy(),
+            index=group["Feature"].to_numpy(),
+            name=axis,
+        )
+        for axis, group in frame.sort_values(["Axis", "Rank"]).groupby(
+            "Axis", sort=False
+        )
+    }
+
+
+def to_table(frame: DataFrame, metadata: Dict[str, Any]):
+    """
+    Converts a frame to an arrow table carrying the export metadata in its schema.
+
+    Args:
+        frame (DataFrame): The exported frame.
+        metadata (Dict[str, Any]): The export metadata (see export_metadata).
+
+    Returns:
+        pyarrow.Table: The table.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    return table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), METADATA_KEY: dumps(metadata).encode()}
+    )
+
+
+def write_table(table, sink, format: str = "arrow") -> None:
+    """
+    Writes an arrow table as an Arrow IPC file, memory mappable, or as a Parquet file.
+
+    Args:
+        table (pyarrow.Table): The table.
+        sink (Union[str, pyarrow.NativeFile]): The path or the stream written to.
+        format (str, optional): "arrow" or "parquet". Defaults to "arrow".
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    import pyarrow as pa
+
+    if format == "arrow":
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif format == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, sink)
+    else:
+        raise ValueError(f"Unknown export format: {format}")
+
+
+def export_bytes(
+    frame: DataFrame, metadata: Dict[str, Any], format: str = "arrow"
+) -> bytes:
+    """
+    Serializes a frame and its export metadata (see write_table), e.g. for a download.
+
+    Args:
+        frame (DataFrame): The exported frame.
+        metadata (Dict[str, Any]): The export metadata (see export_metadata).
+        format (str, optional): "arrow" or "parquet". Defaults to "arrow".
+
+    Returns:
+        bytes: The file content.
+    """
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    write_table(to_table(frame, metadata), sink, format)
+    return sink.getvalue().to_pybytes()
+
+
+def export_projection(
+    directory: str,
+    features: DataFrame,
+    embedding: DataFrame,
+    top_five: Dict[str, Series],
+    period: int = None,
+    algorithm: str = None,
+    parameters: Dict[str, Any] = None,
+    format: str = "arrow",
+    periods: Mapping[str, int] = None,
+) -> Dict[str, str]:
+    """
+    Exports the features of the series, their reduced coordinates and the correlations of
+    the axes to the features, with a shared metadata.
+
+    Args:
+        directory (str): The directory of the exported files, created if needed.
+        features (DataFrame): The features of the series, with the unique_id.
+        embedding (DataFrame): The reduced coordinates (see build_reduc_dim_df).
+        top_five (Dict[str, Series]): The top correlated features of each axis (see
+            get_top_five_correlations).
+        period (int, optional): The seasonal period of the features. Defaults to None.
+        algorithm (str, optional): The reduction algorithm. Defaults to None.
+        parameters (Dict[str, Any], optional): The reductor parameters. Defaults to None.
+        format (str, optional): "arrow" or "parquet". Defaults to "arrow".
+        periods (Mapping[str, int], optional): The detected seasonal period of each serie
+            (see export_metadata). Defaults to None.
+
+    Raises:
+        ValueError: If the format is unknown.
+
+    Returns:
+        Dict[str, str]: The path of each exported table.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {format}")
+    makedirs(directory, exist_ok=True)
+    names = features.columns.drop("unique_id", errors="ignore")
+    frames = {
+        "features": features,
+        "embedding": embedding,
+        "correlations": correlations_frame(top_five),
+    }
+    paths = {}
+    for kind, frame in frames.items():
+        metadata = export_metadata(kind, period, algorithm, parameters, names, periods)
+        paths[kind] = join(directory, kind + EXPORT_FORMATS[format])
+        write_table(to_table(frame, metadata), paths[kind], format)
+    return paths
+
+
+def read_export(path: str, memory_map: bool = True) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Reads an exported table. The Arrow IPC files are memory mapped: the columns are views on
+    the file pages, nothing is parsed nor copied.
+
+    Args:
+        path (str): The path of an exported .arrow or .parquet file.
+        memory_map (bool, optional): Whether to memory map the file. Defaults to True.
+
+    Returns:
+        Tuple[pyarrow.Table, Dict[str, Any]]: [The table, its export metadata].
+    """
+    import pyarrow as pa
+
+    if path.endswith(EXPORT_FORMATS["parquet"]):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, memory_map=memory_map)
+    else:
+        source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+        table = pa.ipc.open_file(source).read_all()
+    metadata = loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+    return table, metadata
+
+
+def import_projection(
+    directory: str, format: str = "arrow"
+) -> Tuple[DataFrame, DataFrame, Dict[str, Series], Dict[str, Any]]:
+    """
+    Imports the tables exported by export_projection.
+
+    Args:
+        directory (str): The directory of the exported files.
+        format (str, optional): "arrow" or "parquet". Defaults to "arrow".
+
+    Returns:
+        Tuple[DataFrame, DataFrame, Dict[str, Series], Dict[str, Any]]: [The features, the
+        reduced coordinates, the top correlated features of each axis, the metadata of the
+        features table].
+    """
+    frames, metadata = {}, {}
+    for kind in EXPORT_KINDS:
+        table, metadata[kind] = read_export(
+            join(directory, kind + EXPORT_FORMATS[format])
+        )
+        frames[kind] = table.to_pandas()
+    return (
+        frames["features"],
+        frames["embedding"],
+        correlations_from_frame(frames["correlations"]),
+        metadata["features"],
+    )
@@ -0,0 +1,95 @@
+from typing import Tuple
+
+from numpy import abs as nabs, corrcoef, errstate, fill_diagonal, nan_to_num
+from pandas import DataFrame
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+from src.dimension_reduction import sample_indices
+
+
+DEFAULT_PRUNING_THRESHOLD = 0.95
+
+
+def rank_correlations(
+    features: DataFrame, max_samples: int = 5000, random_state: int = 0
+) -> DataFrame:
+    """
+    Computes the absolute Spearman correlations between the features, on a random subsample
+    of the series if they are more than max_samples. The missing features are filled with 0,
+    as they are projected (see preprocess_features). The constant features are correlated
+    to nothing.
+
+    Args:
+        features (DataFrame): The features of the series, without the unique_id.
+        max_samples (int, optional): The number of series to correlate on. Defaults to 5000.
+        random_state (int, optional): The seed of the subsample. Defaults to 0.
+
+    Returns:
+        DataFrame: The (features, features) absolute rank correlations.
+    """
+    if len(features) > max_samples:
+        features = features.iloc[
+            sample_indices(len(features), max_samples, random_state)
+        ]
+    # the Spearman correlation is the Pearson correlation of the ranks
+    # a NaN rank would make the whole correlation column NaN, then 0
+    ranks = features.fillna(0).rank().to_numpy(dtype=float)
+    with errstate(divide="ignore", invalid="ignore"):
+        correlations = nan_to_num(nabs(corrcoef(ranks, rowvar=False)))
+    constant = ranks.std(axis=0) == 0
+    correlations[constant, :] = 0
+    correlations[:, constant] = 0
+    fill_diagonal(correlations, 1)
+    return DataFrame(correlations, index=features.columns, columns=features.columns)
+
+
+def prune_redundant_features(
+    features: DataFrame,
+    threshold: float = DEFAULT_PRUNING_THRESHOLD,
+    max_samples: int = 5000,
+    random_state: int = 0,
+) -> Tuple[DataFrame, DataFrame]:
+    """
+    Removes the near-duplicate features: the features are clustered (complete linkage) so
+    that any two features of a cluster have an absolute rank correlation of at least
+    threshold, and each cluster is represented by its feature the most correlated to the
+    others. The constant features are dropped, the missing features being filled with 0 as
+    they are projected.
+
+    Args:
+        features (DataFrame): The features space projection dataset (with the unique_id).
+        threshold (float, optional): The absolute Spearman correlation above which features
+            are redundant. Defaults to 0.95.
+        max_samples (int, optional): The number of series to correlate on (see
+            rank_correlations). Defaults to 5000.
+        random_state (int, optional): The seed of the subsample. Defaults to 0.
+
+    Returns:
+        Tuple[DataFrame, DataFrame]: [The pruned features, with the unique_id, the "Dropped"
+        features with their "Kept" representative and their "Rank correlation"].
+    """
+    values = features.drop(columns="unique_id").fillna(0)
+    constant = values.nunique() <= 1
+    values = values.loc[:, ~constant]
+    dropped = [[name, None, None] for name in constant[constant].index]
+
+    if values.shape[1] > 1:
+        correlations = rank_correlations(values, max_samples, random_state)
+        distances = 1 - correlations.to_numpy()
+        clusters = fcluster(
+            linkage(squareform(distances, checks=False), method="complete"),
+            t=1 - threshold,
+            criterion="distance",
+        )
+        for cluster in sorted(set(clusters)):
+            members = correlations.index[clusters == cluster]
+            if len(members) == 1:
+                continue
+            # ties are broken by the columns order
+            kept = correlations.loc[members, members].mean().idxmax()
+            for name in members.drop(kept):
+                dropped.append([name, kept, round(correlations.loc[name, kept], 3)])
+
+    dropped = DataFrame(dropped, columns=["Dropped", "Kept", "Rank correlation"])
+    return features.drop(columns=dropped["Dropped"]), dropped
@@ -0,0 +1,554 @@
+from concurrent.futures import Future, as_completed
+from time import perf_counter
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Tuple,
+    Union,
+)
+
+from numpy import float32, ndarray
+from pandas import DataFrame, concat
+from plotly.graph_objects import Figure
+
+from src.aggregation import aggregate_embedding
+from src.atlas import ATLAS_DIRECTORY, ATLAS_TIERS, ReferenceAtlas
+from src.cache import content_key, get_shared_cache
+from src.dimension_reduction import (
+    WarmStart,
+    embedding_key,
+    fit_scaler,
+    launch_projections,
+    project_samples,
+    reductor_parameters,
+    required_neighbors,
+    sample_indices,
+)
+from src.export import correlations_frame, export_bytes, export_metadata
+from src.feature_pruning import prune_redundant_features
+from src.neighbors import KNNGraph, build_knn_graph
+from src.partitioning import PartitionedDataset, serie_frame
+from src.planner import FEATURE_TIERS, ExecutionPlan, plan_execution
+from src.plotting_tools import (
+    add_reference_series,
+    plot_aggregated_reducted_dim,
+    plot_reducted_dim,
+)
+from src.space_projection import compute_window_tsfeatures
+from src.utils import (
+    build_reduc_dim_df,
+    encoder,
+    get_top_five_correlations,
+    preprocess_features,
+)
+
+
+def reference_atlas(
+    periods: Iterable[int], columns: Iterable[str], directory: str = ATLAS_DIRECTORY
+) -> Tuple[ReferenceAtlas, List[str], List[str]]:
+    """
+    Opens the reference atlas the series of some seasonal periods can be compared to.
+
+    Args:
+        periods (Iterable[int]): The seasonal periods of the series.
+        columns (Iterable[str]): The features of the series.
+        directory (str, optional): The atlas directory. Defaults to ATLAS_DIRECTORY.
+
+    Returns:
+        Tuple[ReferenceAtlas, List[str], List[str]]: [The atlas (None if not built), the
+        frequencies of the periods, the mismatches between the reference features and the
+        ones of the series].
+    """
+    if not ReferenceAtlas.is_atlas(directory):
+        return None, [], []
+    atlas = ReferenceAtlas(directory)
+    frequencies = atlas.frequencies(periods)
+    # the missing reference features would be projected as 0
+    mismatches = atlas.check_features(periods, columns) if frequencies else []
+    return atlas, frequencies, mismatches
+
+
+def followed_panel(
+    dataset: Union[DataFrame, PartitionedDataset], followed_series: Iterable[str]
+) -> DataFrame:
+    """
+    Returns the points of some series of a dataset, read from their partitions if it is
+    partitioned.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset]): The nixtla dataset.
+        followed_series (Iterable[str]): The names of the series.
+
+    Returns:
+        DataFrame: The nixtla panel of the series.
+    """
+    frames = {name: serie_frame(dataset, name) for name in followed_series}
+    return concat([frame[frame["unique_id"] == name] for name, frame in frames.items()])
+
+
+class GlobalAnalysis:
+    """
+    The projections of the features of a panel shown by a rerun of the Global Analysis page:
+    the features prepared once (pruned, scaled), the reductors built following the plan and
+    warm started from the previous embeddings of the session, and the layers drawn over the
+    embeddings. The intermediate results are shared with the other sessions through the
+    shared cache.
+    """
+
+    def __init__(
+        self,
+        features: DataFrame,
+        features_key: str = None,
+        plan: ExecutionPlan = None,
+        budget: Mapping[str, float] = None,
+        pruning_threshold: float = None,
+    ) -> None:
+        self.cache = get_shared_cache()
+        self.features_key = features_key or content_key("features", features)
+        self.dropped = None
+        if pruning_threshold is not None:
+            # the near-duplicate features inflate the reductions and clutter the heatmap
+            self.features_key = content_key(
+                "pruned_features", self.features_key, pruning_threshold
+            )
+            features, self.dropped = self.cache.get_or_compute(
+                self.features_key,
+                lambda: prune_redundant_features(features, pruning_threshold),
+            )
+        # the features the projections are computed on, as exported
+        self.projected_features = features
+        self.names, self.features, self.values = preprocess_features(
+            features=features, dtype=float32
+        )
+        # one scaler shared by the three reductors
+        self.scaler = self.cache.get_or_compute(
+            content_key("scaler", self.features_key), lambda: fit_scaler(self.values)
+        )
+        self.n_samples = self.values.shape[0]
+        # the plan made at loading time, or a plan of the projection steps only
+        self.plan = plan or plan_execution(
+            self.n_samples, n_features=self.values.shape[1], **(budget or {})
+        )
+        self.reductors = {}
+        self.keys = {}
+        self.warm_starts = {}
+        self.futures = {}
+        self._embeddings = {}
+        self._timed = set()
+        self._start = None
+        self._previous_embeddings = {}
+        self._embedding_keys = {}
+
+    def __repr__(self):
+        return f"GlobalAnalysis\nSeries : {self.n_samples}\nProjections : {list(self.futures)}"
+
+    def neighbours_graph(self, algorithm: str) -> KNNGraph:
+        """
+        Builds the neighbours graph of the series the reductor of an algorithm is fitted on,
+        shared when t-SNE and UMAP fit the same series.
+
+        Args:
+            algorithm (str): "T-SNE" or "UMAP".
+
+        Returns:
+            KNNGraph: The neighbours graph.
+        """
+        plan = self.plan
+        indices = sample_indices(
+            self.n_samples, plan.fit_samples.get(algorithm, self.n_samples)
+        )
+        n_fitted = len(indices)
+        return self.cache.get_or_compute(
+            content_key(
+                "knn_graph", self.features_key, n_fitted, plan.approximate_neighbors
+            ),
+            lambda: build_knn_graph(
+                self.scaler.transform(self.values[indices]),
+                max(
+                    required_neighbors("T-SNE", min(30, n_fitted - 1), n_fitted),
+                    required_neighbors("UMAP", 15, n_fitted),
+                ),
+                exact_threshold=0 if plan.approximate_neighbors else n_fitted,
+            ),
+        )
+
+    def warm_start(
+        self, algorithm: str, previous_embeddings: Mapping[str, tuple]
+    ) -> WarmStart:
+        """
+        Returns the warm start of an algorithm from the previous embedding of the session.
+
+        Args:
+            algorithm (str): The algorithm.
+            previous_embeddings (Mapping[str, tuple]): The last embedding of each algorithm,
+                with the key of the features it was computed on and the layout its warm
+                start continued from (None for a cold fit).
+
+        Returns:
+            WarmStart: The warm start, None for a cold fit.
+        """
+        if algorithm not in previous_embeddings:
+            return None
+        previous_key, previous, source = previous_embeddings[algorithm]
+        if previous_key == self.features_key:
+            # the same warm start as the remembered embedding, found under the same key
+            return None if source is None else WarmStart(source, self.names)
+        return WarmStart(previous, self.names)
+
+    def launch(
+        self,
+        algorithms: Iterable[str],
+        previous_embeddings: MutableMapping[str, tuple],
+        embedding_keys: MutableMapping[str, str],
+        keep_layout: bool = True,
+        fast: bool = False,
+        wrap_task: Callable[[Callable], Callable] = None,
+    ) -> Dict[str, Future]:
+        """
+        Launches the projections of some algorithms in the background (see
+        launch_projections). Their embeddings are remembered in previous_embeddings and
+        embedding_keys once collected (see embedding).
+
+        Args:
+            algorithms (Iterable[str]): The algorithms.
+            previous_embeddings (MutableMapping[str, tuple]): The last embedding of each
+                algorithm in the session (see warm_start).
+            embedding_keys (MutableMapping[str, str]): The shared cache key of the last
+                embedding of each algorithm in the session.
+            keep_layout (bool, optional): Whether an updated panel starts from the layout of
+                the previous one. Defaults to True.
+            fast (bool, optional): Whether the reductors can be non-deterministic and
+                multi-threaded. Defaults to False.
+            wrap_task (Callable[[Callable], Callable], optional): Applied to each task
+                submitted to the pool (see launch_projections). Defaults to None.
+
+        Returns:
+            Dict[str, Future]: The future embedding of each algorithm.
+        """
+        self._previous_embeddings = previous_embeddings
+        self._embedding_keys = embedding_keys
+        self.warm_starts = {
+            algorithm: (
+                self.warm_start(algorithm, previous_embeddings) if keep_layout else None
+            )
+            for algorithm in algorithms
+        }
+        self.reductors = {
+            algorithm: self.plan.build_reductor(
+                algorithm,
+                self.n_samples,
+                knn_graph=None
+                if algorithm == "PCA"
+                else self.neighbours_graph(algorithm),
+                fast=fast,
+                dtype=float32,
+                scaler=self.scaler,
+                warm_start=warm_start,
+            )
+            for algorithm, warm_start in self.warm_starts.items()
+        }
+        self.keys = {
+            algorithm: embedding_key(self.features_key, algorithm, reductor)
+            for algorithm, reductor in self.reductors.items()
+        }
+        # only the projections actually computed by this rerun are timed
+        self._timed = {
+            algorithm for algorithm, key in self.keys.items() if key not in self.cache
+        }
+        self._start = perf_counter()
+        self.futures = launch_projections(
+            self.values, self.reductors, self.keys, wrap_task=wrap_task
+        )
+        return self.futures
+
+    def embedding(self, algorithm: str) -> ndarray:
+        """
+        Waits for the embedding of a launched algorithm. The first time, its duration is
+        recorded in the plan if this rerun computed it, and it is remembered as the
+        previous embedding of the session.
+
+        Args:
+            algorithm (str): The algorithm.
+
+        Returns:
+            ndarray: The embedding of the series.
+        """
+        if algorithm not in self._embeddings:
+            embedding = self.futures[algorithm].result()
+            if algorithm in self._timed:
+                self.plan.record(algorithm, perf_counter() - self._start)
+            source = self.warm_starts[algorithm]
+            self._previous_embeddings[algorithm] = (
+                self.features_key,
+                DataFrame(embedding, index=self.names.to_numpy()),
+                None if source is None else source.previous,
+            )
+            self._embedding_keys[algorithm] = self.keys[algorithm]
+            self._embeddings[algorithm] = embedding
+        return self._embeddings[algorithm]
+
+    def completed(self) -> Iterator[Tuple[str, ndarray]]:
+        """
+        Yields the embeddings of the launched algorithms as they complete.
+
+        Yields:
+            Iterator[Tuple[str, ndarray]]: [The algorithm, its embedding].
+        """
+        algorithms = {future: algorithm for algorithm, future in self.futures.items()}
+        for future in as_completed(algorithms):
+            yield algorithms[future], self.embedding(algorithms[future])
+
+    def embedding_frame(
+        self, embedding: ndarray, selected_datasets: Iterable[str] = ()
+    ) -> DataFrame:
+        """
+        Formats an embedding for the plots, the focused datasets being styled.
+
+        Args:
+            embedding (ndarray): The embedding of the series.
+            selected_datasets (Iterable[str], optional): The datasets to focus on.
+                Defaults to ().
+
+        Returns:
+            DataFrame: The coordinates, name and style of each serie.
+        """
+        frame = build_reduc_dim_df(embedding, serie_names=self.names)
+        frame["Style"] = self.names.apply(
+            encoder, selected_datasets=list(selected_datasets)
+        )
+        return frame
+
+    def window_features(
+        self,
+        dataset: Union[DataFrame, PartitionedDataset],
+        followed_series: List[str],
+        window: int,
+        step: int,
+        period: int,
+    ) -> DataFrame:
+        """
+        Computes the features of the rolling windows of the followed series, in one batched
+        tsfeatures call (see compute_window_tsfeatures).
+
+        Args:
+            dataset (Union[DataFrame, PartitionedDataset]): The nixtla dataset.
+            followed_series (List[str]): The names of the followed series.
+            window (int): The number of points of a window.
+            step (int): The number of points between two windows starts.
+            period (int): The seasonal period.
+
+        Returns:
+            DataFrame: The features of the windows, None without followed series.
+        """
+        if not followed_series:
+            return None
+        return self.cache.get_or_compute(
+            content_key(
+                "window_features", self.features_key, followed_series, window, step
+            ),
+            lambda: compute_window_tsfeatures(
+                followed_panel(dataset, followed_series),
+                window,
+                step,
+                freq=period,
+                fill_value=0,
+                features=FEATURE_TIERS[self.plan.feature_tier],
+            ),
+        )
+
+    def reference_series(
+        self, atlas: ReferenceAtlas, periods: List[int], tier: str
+    ) -> DataFrame:
+        """
+        Loads the features of the reference series of the atlas (see ReferenceAtlas.load).
+
+        Args:
+            atlas (ReferenceAtlas): The reference atlas.
+            periods (List[int]): The seasonal periods of the series.
+            tier (str): The number of reference series per frequency (see ATLAS_TIERS).
+
+        Returns:
+            DataFrame: The features of the reference series.
+        """
+        columns = self.features.columns
+        return self.cache.get_or_compute(
+            content_key("atlas", atlas.directory, periods, list(columns), tier),
+            lambda: atlas.load(periods, columns, ATLAS_TIERS[tier]),
+        )
+
+    def trajectories(self, algorithm: str, window_features: DataFrame) -> DataFrame:
+        """
+        Projects the windows of the followed series in the embedding of an algorithm.
+
+        Args:
+            algorithm (str): The algorithm.
+            window_features (DataFrame): The features of the windows (see window_features).
+
+        Returns:
+            DataFrame: The coordinates, name and start of each window, None without windows.
+        """
+        if window_features is None or window_features.empty:
+            return None
+        windows_values = window_features.reindex(
+            columns=self.features.columns
+        ).to_numpy(dtype=float32, na_value=0)
+        trajectories = build_reduc_dim_df(
+            # interpolated, the same path whether the embedding was fitted or cached
+            project_samples(
+                self.reductors[algorithm],
+                self.values,
+                self.embedding(algorithm),
+                windows_values,
+                interpolate=True,
+            ),
+            serie_names=window_features["Name"],
+        )
+        trajectories["Start"] = window_features["Start"]
+        return trajectories
+
+    def references(self, algorithm: str, reference: DataFrame) -> DataFrame:
+        """
+        Projects the reference series in the embedding of an algorithm.
+
+        Args:
+            algorithm (str): The algorithm.
+            reference (DataFrame): The features of the reference series (see
+                reference_series).
+
+        Returns:
+            DataFrame: The coordinates, name and frequency of each reference serie, None
+            without reference series.
+        """
+        if reference is None:
+            return None
+        reference_values = reference.reindex(columns=self.features.columns).to_numpy(
+            dtype=float32, na_value=0
+        )
+        references = build_reduc_dim_df(
+            self.cache.get_or_compute(
+                content_key("atlas_projection", self.keys[algorithm], reference),
+                # interpolated, whether the embedding was fitted or cached (see trajectories)
+                lambda: project_samples(
+                    self.reductors[algorithm],
+                    self.values,
+                    self.embedding(algorithm),
+                    reference_values,
+                    interpolate=True,
+                ),
+            ),
+            serie_names=reference["unique_id"],
+        )
+        references["Frequency"] = reference["Frequency"]
+        return references
+
+    def figure(
+        self,
+        algorithm: str,
+        frame: DataFrame,
+        aggregate: bool = False,
+        region: Mapping[str, Tuple[float, float]] = None,
+        window_features: DataFrame = None,
+        reference: DataFrame = None,
+    ) -> Figure:
+        """
+        Plots the embedding of an algorithm, with the trajectories of the followed series
+        and the reference series.
+
+        Args:
+            algorithm (str): The algorithm.
+            frame (DataFrame): The embedding (see embedding_frame).
+            aggregate (bool, optional): Whether the series are drawn as density cells (see
+                aggregate_embedding). Defaults to False.
+            region (Mapping[str, Tuple[float, float]], optional): The zoomed bounds of each
+                axis of the aggregated embedding. Defaults to None.
+            window_features (DataFrame, optional): The features of the windows of the
+                followed series. Defaults to None.
+            reference (DataFrame, optional): The features of the reference series. Defaults
+                to None.
+
+        Returns:
+            Figure: The plotly figure.
+        """
+        paths = self.trajectories(algorithm, window_features)
+        if not aggregate:
+            fig = plot_reducted_dim(frame, algorithm, paths)
+        else:
+            fig = plot_aggregated_reducted_dim(
+                *aggregate_embedding(frame, region=region), algorithm, paths
+            )
+        references = self.references(algorithm, reference)
+        return fig if references is None else add_reference_series(fig, references)
+
+    def correlations(self, frame: DataFrame) -> dict:
+        """
+        Computes the top five correlations between the dimensions of an embedding and the
+        features, their duration being recorded in the plan.
+
+        Args:
+            frame (DataFrame): The embedding (see embedding_frame).
+
+        Returns:
+            dict: The top five correlations (see get_top_five_correlations).
+        """
+        start = perf_counter()
+        top_five = get_top_five_correlations(
+            frame.iloc[:, :3], self.features, max_samples=self.plan.correlation_samples
+        )
+        self.plan.record("Correlations", perf_counter() - start)
+        return top_five
+
+    def exports(
+        self,
+        algorithm: str,
+        frame: DataFrame,
+        top_five: dict,
+        export_format: str,
+        period: int,
+        periods: Mapping[str, int] = None,
+    ) -> Dict[str, bytes]:
+        """
+        Exports the features, the embedding of an algorithm and its correlations, with a
+        shared metadata (see export_bytes).
+
+        Args:
+            algorithm (str): The algorithm.
+            frame (DataFrame): The embedding (see embedding_frame).
+            top_five (dict): The correlations (see correlations).
+            export_format (str): One of EXPORT_FORMATS.
+            period (int): The seasonal period.
+            periods (Mapping[str, int], optional): The seasonal period of each serie.
+                Defaults to None.
+
+        Returns:
+            Dict[str, bytes]: The exported "features", "embedding" and "correlations".
+        """
+        parameters = reductor_parameters(self.reductors[algorithm])
+        exported = {
+            "features": self.projected_features,
+            # the coordinates only, the style of the focused datasets is the page's
+            "embedding": frame.drop(columns="Style"),
+            "correlations": correlations_frame(top_five),
+        }
+        return {
+            kind: self.cache.get_or_compute(
+                content_key("export", self.keys[algorithm], kind, export_format),
+                lambda: export_bytes(
+                    table,
+                    export_metadata(
+                        kind,
+                        period,
+                        algorithm,
+                        parameters,
+                        self.features.columns,
+                        periods,
+                    ),
+                    export_format,
+                ),
+            )
+            for kind, table in exported.items()
+        }
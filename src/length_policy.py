@@ -0,0 +1,343 @@
+from argparse import ArgumentParser
+from json import dumps
+from typing import Iterable, List, Tuple
+import os
+
+from numpy import concatenate, flatnonzero, repeat, sort, unique
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.random import default_rng
+from pandas import DataFrame, Series, concat, read_csv
+
+from precomputed_ressources.loader import load_hourly_m4_dataset
+from src.space_projection import compute_tsfeatures
+
+
+LENGTH_POLICIES = ("decimate", "aggregate", "windows")
+DEFAULT_MAX_LENGTH = 10_000
+
+
+class LengthPolicy:
+    """
+    Caps the features cost of the long series: the series longer than max_length have their
+    features computed on a reduced version of at most max_length points,
+        - "decimate": one point every k,
+        - "aggregate": the means of blocks of k points,
+        - "windows": n_windows windows sampled along the serie,
+    the seasonal period of the decimated and aggregated series being divided by k. The
+    features are averaged over replicates of the reduction, the windows or two reductions
+    whose blocks start k / 2 points apart, and their standard error estimates the error of
+    the approximation of each serie (see approximations).
+    """
+
+    def __init__(
+        self,
+        method: str = "windows",
+        max_length: int = DEFAULT_MAX_LENGTH,
+        n_windows: int = 8,
+        random_state: int = 0,
+    ) -> None:
+        if method not in LENGTH_POLICIES:
+            raise ValueError(f"Unknown length policy: {method}")
+        self.method = method
+        self.max_length = max_length
+        self.n_windows = n_windows
+        self.random_state = random_state
+        # the approximations of the computed panels, the features being computed by
+        # period in parallel
+        self.approximations_ = []
+
+    def __repr__(self):
+        return f"LengthPolicy({self.method}, {self.max_length}, {self.n_windows}, {self.random_state})"
+
+    def factor(self, length: int) -> int:
+        return -(-length // self.max_length)
+
+    def reduce(
+        self, df: DataFrame, freq: int, phase: float = 0.0
+    ) -> List[Tuple[DataFrame, int]]:
+        """
+        Reduces the series of a panel longer than max_length.
+
+        Args:
+            df (DataFrame): The nixtla panel, each serie sorted by ds.
+            freq (int): The seasonal period of the series.
+            phase (float, optional): The start of the first block of the decimated and
+                aggregated series, as a fraction of the reduction factor. Defaults to 0.
+
+        Returns:
+            List[Tuple[DataFrame, int]]: The reduced panels and their seasonal period, one per
+            reduction factor (a single one for "windows", whose windows are named
+            "<unique_id>@<start>").
+        """
+        df = df.sort_values("unique_id", kind="stable")
+        names, firsts, lengths = unique(
+            df["unique_id"].to_numpy(), return_index=True, return_counts=True
+        )
+        ds, y = df["ds"].to_numpy(), df["y"].to_numpy()
+        long = flatnonzero(lengths > self.max_length)
+        if self.method == "windows":
+            return [(self._windows(names, firsts, lengths, long, ds, y), freq)]
+
+        panels = []
+        factors = Series([self.factor(length) for length in lengths[long]])
+        for factor, members in factors.groupby(factors).groups.items():
+            reduced_ds, reduced_y, reduced_names = [], [], []
+            for i in long[members]:
+                # the blocks of factor points, the incomplete blocks are left out
+                offset = int(phase * factor)
+                n_blocks = (lengths[i] - offset) // factor
+                start = firsts[i] + offset
+                serie = slice(start, start + n_blocks * factor)
+                blocks = y[serie].reshape(n_blocks, factor)
+                reduced_ds.append(ds[serie][::factor])
+                reduced_y.append(
+                    blocks[:, 0] if self.method == "decimate" else blocks.mean(axis=1)
+                )
+                reduced_names.append(repeat(names[i], n_blocks))
+            panel = DataFrame(
+                {
+                    "unique_id": concatenate(reduced_names),
+                    "ds": concatenate(reduced_ds),
+                    "y": concatenate(reduced_y),
+                }
+            )
+            panels.append((panel, max(1, round(freq / factor))))
+        return panels
+
+    def _windows(self, names, firsts, lengths, long, ds, y) -> DataFrame:
+        window = self.max_length // self.n_windows
+        rng = default_rng(self.random_state)
+        windows_ds, windows_y, windows_names = [], [], []
+        for i in long:
+            serie = slice(firsts[i], firsts[i] + lengths[i])
+            views = sliding_window_view(y[serie], window)
+            starts = sort(
+                rng.choice(
+                    len(views), size=min(self.n_windows, len(views)), replace=False
+                )
+            )
+            windows_y.append(views[starts].ravel())
+            windows_ds.append(sliding_window_view(ds[serie], window)[starts].ravel())
+            windows_names.append(
+                repeat([f"{names[i]}@{start}" for start in starts], window)
+            )
+        return DataFrame(
+            {
+                "unique_id": concatenate(windows_names),
+                "ds": concatenate(windows_ds),
+                "y": concatenate(windows_y),
+            }
+        )
+
+    def compute_tsfeatures(
+        self,
+        df: DataFrame,
+        freq: int = None,
+        fill_value: int = 0,
+        features: Iterable[str] = None,
+    ) -> DataFrame:
+        """
+        Computes the tsfeatures of a panel (see compute_tsfeatures), the long series on their
+        reduced version. The series_length feature keeps the length of the full series.
+        The approximated series and their error are recorded (see approximations).
+
+        Args:
+            df (DataFrame): The nixtla panel.
+            freq (int, optional): The seasonal frequency of the series. Defaults to None.
+            fill_value (int, optional): The value to fill the features that cannot be computed. Defaults to 0.
+            features (Iterable[str], optional): The names of the tsfeatures functions to run.
+                Defaults to None (all the tsfeatures default functions).
+
+        Returns:
+            DataFrame: The features of the series, ordered by unique_id.
+        """
+        lengths = df.groupby("unique_id").size()
+        long = lengths.index[lengths > self.max_length]
+        short = df[~df["unique_id"].isin(long)]
+        computed, errors = [], Series(dtype=float)
+        if len(short):
+            computed.append(
+                compute_tsfeatures(
+                    short, freq=freq, fill_value=fill_value, features=features
+                )
+            )
+        if len(long):
+            replicates = self._replicates(
+                df[df["unique_id"].isin(long)], freq, fill_value, features
+            ).groupby("unique_id")
+            computed.append(replicates.mean(numeric_only=True).reset_index())
+            errors = (
+                replicates.sem(numeric_only=True)
+                .drop(columns="series_length", errors="ignore")
+                .median(axis=1)
+            )
+        result = concat(computed, ignore_index=True).fillna(value=fill_value)
+        if "series_length" in result.columns:
+            result["series_length"] = result["unique_id"].map(lengths)
+
+        approximated = lengths.index.isin(long)
+        self.approximations_.append(
+            DataFrame(
+                {
+                    "unique_id": lengths.index,
+                    "Length": lengths.to_numpy(),
+                    "Approximated": approximated,
+                    "Standard error": errors.reindex(lengths.index).where(
+                        approximated, 0.0
+                    ),
+                }
+            )
+        )
+        return result.sort_values("unique_id", ignore_index=True)
+
+    def _replicates(
+        self,
+        df: DataFrame,
+        freq: int,
+        fill_value: int,
+        features: Iterable[str],
+    ) -> DataFrame:
+        # the features of the replicates of the long series, named after their serie
+        panels = self.reduce(df, freq)
+        if self.method != "windows":
+            # the second reduction starts in the middle of the blocks of the first one
+            panels = [
+                (
+                    concat(
+                        [
+                            first.assign(
+                                unique_id=first["unique_id"].astype(str) + "@0"
+                            ),
+                            second.assign(
+                                unique_id=second["unique_id"].astype(str) + "@1"
+                            ),
+                        ],
+                        ignore_index=True,
+                    ),
+                    reduced_freq,
+                )
+                for (first, reduced_freq), (second, _) in zip(
+                    panels, self.reduce(df, freq, phase=0.5)
+                )
+            ]
+        replicates = concat(
+            [
+                compute_tsfeatures(
+                    panel, freq=reduced_freq, fill_value=fill_value, features=features
+                )
+                for panel, reduced_freq in panels
+            ],
+            ignore_index=True,
+        )
+        replicates["unique_id"] = replicates["unique_id"].str.rsplit("@", n=1).str[0]
+        return replicates
+
+    def approximations(self) -> DataFrame:
+        """
+        Returns the approximations of the panels computed by the policy: whether each serie
+        was approximated, and the estimated error of its features, the median over the
+        features of the standard error of their replicates (0 for the exact series, nan
+        for a single window). It measures how much the features vary with the part of the
+        serie kept, not the bias of the features that scale with the length (e.g.
+        crossing_points), measured by policy_errors.
+
+        Returns:
+            DataFrame: The "unique_id", "Length", "Approximated" and "Standard error" of each
+            serie.
+        """
+        if not self.approximations_:
+            return DataFrame(
+                columns=["unique_id", "Length", "Approximated", "Standard error"]
+            )
+        return (
+            concat(self.approximations_, ignore_index=True)
+            .drop_duplicates("unique_id", keep="last")
+            .sort_values("unique_id", ignore_index=True)
+        )
+
+
+def policy_errors(
+    df: DataFrame,
+    freq: int,
+    policy: LengthPolicy,
+    features: Iterable[str] = None,
+) -> DataFrame:
+    """
+    Estimates the error of a length policy against the exact features of the series longer
+    than its max_length.
+
+    Args:
+        df (DataFrame): The nixtla panel.
+        freq (int): The seasonal period of the series.
+        policy (LengthPolicy): The length policy.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run.
+            Defaults to None (all the tsfeatures default functions).
+
+    Returns:
+        DataFrame: Per feature, the median absolute error, the median absolute error relative
+        to the interquartile range of the exact feature across the series, the rank
+        correlation between the exact and the approximated features, and the median
+        standard error of the replicates the policy estimates the error with.
+    """
+    lengths = df.groupby("unique_id").size()
+    df = df[df["unique_id"].isin(lengths.index[lengths > policy.max_length])]
+    exact = compute_tsfeatures(df, freq=freq, features=features)
+    exact = exact.sort_values("unique_id").set_index("unique_id")
+    replicates = policy._replicates(df, freq, 0, features).groupby("unique_id")
+    approximated = replicates.mean(numeric_only=True).loc[exact.index, exact.columns]
+    estimated = replicates.sem(numeric_only=True).loc[exact.index, exact.columns]
+    errors = (approximated - exact).abs()
+    spread = exact.quantile(0.75) - exact.quantile(0.25)
+    return DataFrame(
+        {
+            "Median absolute error": errors.median(),
+            "Relative error": errors.median() / spread.where(spread > 0),
+            "Rank correlation": approximated.corrwith(exact, method="spearman"),
+            "Estimated error": estimated.median(),
+        }
+    ).drop(index="series_length", errors="ignore")
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Error of the length policies against the exact features."
+    )
+    parser.add_argument(
+        "--dataset",
+        default=None,
+        help="A nixtla formatted .csv panel. Defaults to the M4 hourly dataset.",
+    )
+    parser.add_argument(
+        "--method", choices=LENGTH_POLICIES, nargs="*", default=list(LENGTH_POLICIES)
+    )
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--windows", type=int, default=4)
+    parser.add_argument("--freq", type=int, default=24)
+    parser.add_argument("--json", action="store_true", help="Print json records.")
+    arguments = parser.parse_args()
+
+    dataset = (
+        load_hourly_m4_dataset()
+        if arguments.dataset is None
+        else read_csv(arguments.dataset)
+    )
+    report = {
+        method: policy_errors(
+            dataset,
+            arguments.freq,
+            LengthPolicy(method, arguments.max_length, arguments.windows),
+        )
+        for method in arguments.method
+    }
+    for method, errors in report.items():
+        if arguments.json:
+            print(dumps({method: errors.to_dict(orient="index")}), flush=True)
+        else:
+            print(f"{method} (max length {arguments.max_length})")
+            print(errors.round(3).to_string(), flush=True)
+    # the threads started by the tsfeatures dependencies can deadlock the shutdown
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
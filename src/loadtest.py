@@ -0,0 +1,533 @@
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from json import dumps
+from mimetypes import guess_type
+from os import makedirs, sysconf
+from os.path import basename, dirname, getsize, join
+from random import Random
+from tempfile import mkdtemp
+from threading import Event, Thread
+from time import perf_counter, sleep
+from typing import Dict, Iterable, Iterator
+from unittest.mock import MagicMock
+from uuid import uuid4
+import os
+import resource
+
+from numpy import arange, pi, repeat, sin, tile
+from numpy.random import default_rng
+from pandas import DataFrame
+from streamlit.proto.WidgetStates_pb2 import WidgetState, WidgetStates
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import (
+    MemoryCacheStorageManager,
+)
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.uploaded_file_manager import UploadedFileRec
+from streamlit.testing.v1 import AppTest
+import streamlit
+
+from src.service import LatencyRecorder
+
+
+APP_DIRECTORY = dirname(dirname(__file__))
+MAIN_SCRIPT = join(APP_DIRECTORY, "Home_page.py")
+PAGES = {
+    "Dataset Loading": join(APP_DIRECTORY, "pages", "♈ Dataset Loading.py"),
+    "Local Analysis": join(APP_DIRECTORY, "pages", "♒ Local Analysis.py"),
+    "Global Analysis": join(APP_DIRECTORY, "pages", "♓ Global Analysis.py"),
+}
+PERCENTILES = (50, 90, 99, 100)
+# the sessions run on private APIs of streamlit (the script runner of AppTest, the pages of
+# source_util, the runtime singleton), checked on these versions: [first, last excluded)
+STREAMLIT_VERSIONS = ((1, 29), (1, 36))
+STREAMLIT_VERSION = tuple(int(part) for part in streamlit.__version__.split(".")[:2])
+
+if STREAMLIT_VERSIONS[0] <= STREAMLIT_VERSION < STREAMLIT_VERSIONS[1]:
+    from streamlit import source_util
+    from streamlit.runtime.scriptrunner import RerunData
+    from streamlit.testing.v1.element_tree import parse_tree_from_messages
+    from streamlit.testing.v1.local_script_runner import (
+        LocalScriptRunner,
+        require_widgets_deltas,
+    )
+
+
+def check_streamlit() -> None:
+    """
+    Checks that the installed streamlit is one the private APIs the sessions run on were
+    checked against (see STREAMLIT_VERSIONS).
+
+    Raises:
+        RuntimeError: If streamlit is older or newer.
+    """
+    if not STREAMLIT_VERSIONS[0] <= STREAMLIT_VERSION < STREAMLIT_VERSIONS[1]:
+        first, last = (".".join(map(str, version)) for version in STREAMLIT_VERSIONS)
+        raise RuntimeError(
+            f"The load test runs on streamlit >={first},<{last}, "
+            f"not {streamlit.__version__}."
+        )
+
+
+class SessionAppTest(AppTest):
+    """
+    An AppTest of a page of the multipage app, that can run concurrently with the other
+    sessions of the process. The AppTest of streamlit 1.29 runs a single script as the main
+    one and resets process-wide state around each run (the mock runtime and the pages
+    cache), which breaks the runs of the other sessions in flight. Here every session runs
+    the pages of Home_page.py, like the app server does, in a runtime installed once for the
+    whole load test (see installed_runtime). Files can be dropped on the file uploaders,
+    which AppTest does not drive (see upload).
+    """
+
+    def __init__(self, page: str, default_timeout: float = 600) -> None:
+        check_streamlit()
+        super().__init__(MAIN_SCRIPT, default_timeout=default_timeout)
+        self.page = page
+        self._uploaded_files = []
+        self._uploaders = {}
+        pages = source_util.get_pages(MAIN_SCRIPT).values()
+        self.page_script_hash = next(
+            info["page_script_hash"]
+            for info in pages
+            if info["script_path"] == PAGES[page]
+        )
+
+    @classmethod
+    def from_page(
+        cls, page: str, session_state: dict = None, timeout: float = 600
+    ) -> "SessionAppTest":
+        app = cls(page, default_timeout=timeout)
+        for key, value in (session_state or {}).items():
+            app.session_state[key] = value
+        return app
+
+    def upload(self, path: str) -> "SessionAppTest":
+        """
+        Drops a file on the file uploader of the last run, the next runs receive it like
+        the ones of a browser upload.
+
+        Args:
+            path (str): The path of the uploaded file.
+
+        Raises:
+            LookupError: If the last run has no file uploader.
+
+        Returns:
+            SessionAppTest: The app, to be run.
+        """
+        uploaders = self.get("file_uploader")
+        if not uploaders:
+            raise LookupError("No file uploader")
+        with open(path, "rb") as handle:
+            record = UploadedFileRec(
+                file_id=uuid4().hex,
+                name=basename(path),
+                type=guess_type(path)[0] or "application/octet-stream",
+                data=handle.read(),
+            )
+        self._uploaded_files.append(record)
+        state = WidgetState(id=uploaders[0].proto.id)
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.file_id, info.name, info.size = record.file_id, record.name, getsize(path)
+        self._uploaders[state.id] = state
+        return self
+
+    def _run(self, widget_state=None, timeout: float = None) -> "SessionAppTest":
+        script_runner = LocalScriptRunner(self._script_path, self.session_state)
+        # the uploaded files are stored in the upload manager of each run
+        for record in self._uploaded_files:
+            script_runner._uploaded_file_mgr.add_file(script_runner._session_id, record)
+        if self._uploaders:
+            widget_state = widget_state or WidgetStates()
+            widget_state.widgets.extend(self._uploaders.values())
+        script_runner.request_rerun(
+            RerunData(
+                widget_states=widget_state, page_script_hash=self.page_script_hash
+            )
+        )
+        script_runner.start()
+        require_widgets_deltas(script_runner, timeout or self.default_timeout)
+        self._tree = parse_tree_from_messages(script_runner.forward_msgs())
+        self._tree._runner = self
+        return self
+
+    def shared_state(self) -> dict:
+        # the session state is shared by the pages of a streamlit session
+        return dict(self.session_state.filtered_state)
+
+
+@contextmanager
+def data_directories(directory: str) -> Iterator[str]:
+    """
+    Sets the server data directory the out-of-core mode opens the uploads from, and the
+    directory of their partitions, the previous ones being set back on exit.
+
+    Args:
+        directory (str): The directory of the uploads.
+
+    Yields:
+        Iterator[str]: The directory of the uploads.
+    """
+    variables = {
+        "FBP_DATA_DIR": directory,
+        "FBP_PARTITIONS_DIR": join(directory, "partitions"),
+    }
+    previous = {name: os.environ.get(name) for name in variables}
+    os.environ.update(variables)
+    try:
+        yield directory
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def installed_runtime() -> Iterator[Runtime]:
+    """
+    Installs the process-wide mock runtime the page scripts run in (see SessionAppTest),
+    the previous runtime being set back on exit.
+
+    Yields:
+        Iterator[Runtime]: The mock runtime.
+    """
+    check_streamlit()
+    previous = Runtime._instance
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    try:
+        yield runtime
+    finally:
+        Runtime._instance = previous
+
+
+def synthetic_upload(
+    path: str,
+    n_series: int,
+    series_length: int,
+    period: int = 24,
+    random_state: int = 0,
+) -> str:
+    """
+    Writes a nixtla formatted .csv panel of seasonal series with a random level, trend,
+    amplitude and noise.
+
+    Args:
+        path (str): The path of the .csv file.
+        n_series (int): The number of series.
+        series_length (int): The number of points of each serie.
+        period (int, optional): The seasonal period. Defaults to 24.
+        random_state (int, optional): The seed. Defaults to 0.
+
+    Returns:
+        str: The path of the file.
+    """
+    rng = default_rng(random_state)
+    t = arange(series_length)
+    level, trend, amplitude, noise = rng.uniform(
+        [0, -0.05, 0.5, 0.1], [100, 0.05, 10, 3], size=(n_series, 4)
+    ).T
+    y = (
+        level[:, None]
+        + trend[:, None] * t
+        + amplitude[:, None] * sin(2 * pi * t / period)
+        + noise[:, None] * rng.normal(size=(n_series, series_length))
+    )
+    DataFrame(
+        {
+            "unique_id": repeat(
+                [f"U{random_state}_S{i}" for i in range(n_series)], series_length
+            ),
+            "ds": tile(t, n_series),
+            "y": y.ravel(),
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+class MemorySampler(Thread):
+    """
+    Samples the resident memory of the process (the app server) at a fixed interval.
+    """
+
+    def __init__(self, interval: float = 0.2) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stopped = Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.samples.append(resident_memory())
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> Dict[str, float]:
+        """
+        Stops the sampling.
+
+        Returns:
+            Dict[str, float]: The first, mean, last and peak resident memory (MB).
+        """
+        self._stopped.set()
+        self.join()
+        self.samples.append(resident_memory())
+        return {
+            "start (MB)": round(self.samples[0], 1),
+            "mean (MB)": round(sum(self.samples) / len(self.samples), 1),
+            "end (MB)": round(self.samples[-1], 1),
+            # the kernel high-water mark also catches the peaks between two samples
+            "peak (MB)": round(
+                max(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                    *self.samples,
+                ),
+                1,
+            ),
+        }
+
+
+def resident_memory() -> float:
+    with open("/proc/self/statm") as handle:
+        return int(handle.read().split()[1]) * sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class VirtualUser(Thread):
+    """
+    A scripted analyst session: uploads its panel on the Dataset Loading page, with the file
+    uploader or from the server data directory (out_of_core), browses series and views on
+    the Local Analysis page, then switches projections and focuses series on the Global
+    Analysis page. Each interaction (a script rerun) is timed.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        upload: str,
+        recorder: LatencyRecorder,
+        period: int = 24,
+        n_interactions: int = 3,
+        algorithms: Iterable[str] = ("PCA", "UMAP"),
+        think_time: float = 0.0,
+        timeout: float = 600,
+        out_of_core: bool = False,
+    ) -> None:
+        super().__init__(name=f"virtual-user-{user_id}", daemon=True)
+        self.user_id = user_id
+        self.upload = upload
+        self.out_of_core = out_of_core
+        self.recorder = recorder
+        self.period = period
+        self.n_interactions = n_interactions
+        self.algorithms = list(algorithms)
+        self.think_time = think_time
+        self.timeout = timeout
+        self.random = Random(user_id)
+        self.errors = []
+        self.n_interactions_done = 0
+        self.stage = None
+
+    def interact(self, page: str, action: str, app: SessionAppTest) -> SessionAppTest:
+        self.stage = f"{page} / {action}"
+        start = perf_counter()
+        try:
+            app.run()
+        finally:
+            self.recorder.record(self.stage, perf_counter() - start)
+            self.n_interactions_done += 1
+        if app.exception:
+            self.errors.append(f"{self.stage}: {app.exception[0].value}")
+        sleep(self.think_time)
+        return app
+
+    def run(self) -> None:
+        try:
+            state = self.load()
+            self.browse(state)
+            self.project(state)
+        except Exception as error:
+            # a timed out run or a missing widget ends the session, the others go on
+            self.errors.append(f"{self.stage}: {error!r}")
+
+    def load(self) -> dict:
+        app = SessionAppTest.from_page("Dataset Loading", timeout=self.timeout)
+        self.interact("Dataset Loading", "open", app)
+        if self.out_of_core:
+            _widget(app.toggle, "Out-of-core").set_value(True)
+            self.interact("Dataset Loading", "out-of-core mode", app)
+            _widget(app.text_input, "Path").set_value(basename(self.upload))
+            _widget(app.number_input, "Number of partitions").set_value(4)
+            _widget(app.number_input, "seasonal period").set_value(self.period)
+            _widget(app.button, "Partition and compute").click()
+            self.interact("Dataset Loading", "partition and compute", app)
+        else:
+            self.interact("Dataset Loading", "upload", app.upload(self.upload))
+            _widget(app.number_input, "seasonal period").set_value(self.period)
+            _widget(app.button, "Transform and compute").click()
+            self.interact("Dataset Loading", "transform and compute", app)
+        return app.shared_state()
+
+    def browse(self, state: dict) -> None:
+        app = SessionAppTest.from_page("Local Analysis", state, self.timeout)
+        self.interact("Local Analysis", "open", app)
+        series = _widget(app.selectbox, "serie to plot")
+        views = _widget(app.selectbox, "type of plot")
+        for _ in range(self.n_interactions):
+            series.set_value(self.random.choice(series.options))
+            self.interact("Local Analysis", "switch serie", app)
+            views.set_value(self.random.choice(views.options))
+            self.interact("Local Analysis", "switch view", app)
+            series, views = (
+                _widget(app.selectbox, "serie to plot"),
+                _widget(app.selectbox, "type of plot"),
+            )
+        state.update(app.shared_state())
+
+    def project(self, state: dict) -> None:
+        app = SessionAppTest.from_page("Global Analysis", state, self.timeout)
+        self.interact("Global Analysis", "open", app)
+        for algorithm in self.algorithms:
+            _widget(app.selectbox, "Dimension reduction algorithm").set_value(algorithm)
+            self.interact("Global Analysis", f"{algorithm} projection", app)
+            focus = _widget(app.multiselect, "to focus on")
+            focus.set_value(self.random.sample(focus.options, 2))
+            self.interact("Global Analysis", "focus series", app)
+
+
+def _widget(elements, label: str):
+    for element in elements:
+        if label.lower() in element.label.lower():
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def run_load_test(
+    n_users: int = 20,
+    n_series: int = 50,
+    series_length: int = 200,
+    period: int = 24,
+    n_interactions: int = 3,
+    algorithms: Iterable[str] = ("PCA", "UMAP"),
+    ramp_up: float = 0.0,
+    think_time: float = 0.0,
+    directory: str = None,
+    timeout: float = 600,
+) -> Dict[str, object]:
+    """
+    Runs n_users concurrent sessions of the app in this process, headless, each one uploading
+    its own synthetic panel (see VirtualUser). Every other session uploads its panel with the
+    file uploader, the others open it in the out-of-core mode of the Dataset Loading page.
+
+    Args:
+        n_users (int, optional): The number of concurrent sessions. Defaults to 20.
+        n_series (int, optional): The number of series of each upload. Defaults to 50.
+        series_length (int, optional): The length of the uploaded series. Defaults to 200.
+        period (int, optional): The seasonal period. Defaults to 24.
+        n_interactions (int, optional): The number of serie and view switches on the Local
+            Analysis page. Defaults to 3.
+        algorithms (Iterable[str], optional): The projections opened on the Global Analysis
+            page. Defaults to ("PCA", "UMAP").
+        ramp_up (float, optional): The delay between two sessions starts (s). Defaults to 0.
+        think_time (float, optional): The pause after each interaction (s). Defaults to 0.
+        directory (str, optional): The directory of the uploads, the server data directory
+            of the load test. Defaults to a temporary one.
+        timeout (float, optional): The timeout of a script run (s). Defaults to 600.
+
+    Returns:
+        Dict[str, object]: The "latencies" (ms) of each interaction, the "throughput"
+        (interactions/s), the "duration" (s), the server "memory" and the "errors".
+    """
+    directory = directory or mkdtemp(prefix="loadtest-")
+    makedirs(directory, exist_ok=True)
+    uploads = [
+        synthetic_upload(
+            join(directory, f"user-{user}.csv"), n_series, series_length, period, user
+        )
+        for user in range(n_users)
+    ]
+    recorder = LatencyRecorder(window=100_000)
+    users = [
+        VirtualUser(
+            user,
+            upload,
+            recorder,
+            period=period,
+            n_interactions=n_interactions,
+            algorithms=algorithms,
+            think_time=think_time,
+            timeout=timeout,
+            out_of_core=user % 2 == 1,
+        )
+        for user, upload in enumerate(uploads)
+    ]
+    with installed_runtime(), data_directories(directory):
+        sampler = MemorySampler()
+        sampler.start()
+        start = perf_counter()
+        for user in users:
+            user.start()
+            sleep(ramp_up)
+        for user in users:
+            user.join()
+        duration = perf_counter() - start
+        memory = sampler.stop()
+
+    latencies = DataFrame.from_dict(
+        recorder.percentiles(PERCENTILES), orient="index"
+    ).rename(columns={"p100": "max"})
+    latencies.index.name = "Interaction"
+    interactions = sum(user.n_interactions_done for user in users)
+    return {
+        "latencies": latencies,
+        "throughput": round(interactions / duration, 3),
+        "duration": round(duration, 1),
+        "memory": memory,
+        "errors": [error for user in users for error in user.errors],
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Concurrent sessions load test of the pages.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--series", type=int, default=50)
+    parser.add_argument("--length", type=int, default=200)
+    parser.add_argument("--period", type=int, default=24)
+    parser.add_argument("--interactions", type=int, default=3)
+    parser.add_argument("--algorithms", nargs="*", default=["PCA", "UMAP"])
+    parser.add_argument("--ramp-up", type=float, default=0.0)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--directory", default=None)
+    parser.add_argument("--json", action="store_true", help="Print a json report.")
+    arguments = parser.parse_args()
+
+    report = run_load_test(
+        n_users=arguments.users,
+        n_series=arguments.series,
+        series_length=arguments.length,
+        period=arguments.period,
+        n_interactions=arguments.interactions,
+        algorithms=arguments.algorithms,
+        ramp_up=arguments.ramp_up,
+        think_time=arguments.think_time,
+        directory=arguments.directory,
+    )
+    if arguments.json:
+        report["latencies"] = report["latencies"].to_dict(orient="index")
+        print(dumps(report), flush=True)
+    else:
+        print(report["latencies"].to_string())
+        print(f"Throughput: {report['throughput']} interactions/s")
+        print(f"Duration: {report['duration']}s")
+        print(f"Server memory: {report['memory']}")
+        for error in report["errors"]:
+            print(f"Error: {error}")
+        print(flush=True)
+
+
+if __name__ == "__main__":
+    main()
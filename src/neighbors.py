@@ -0,0 +1,270 @@
+from typing import Iterable, Tuple, Union
+import pickle
+
+from numpy import (
+    ndarray,
+    asarray,
+    ascontiguousarray,
+    concatenate,
+    float32,
+    arange,
+    column_stack,
+    cumsum,
+    isin,
+    zeros,
+)
+from pandas import DataFrame, Series
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import KDTree, NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+from precomputed_ressources.loader import load_computed_features
+from src.utils import preprocess_features
+
+
+class FeatureIndex:
+    """
+    A nearest neighbour index over the scaled features space. Small panels are indexed with an
+    exact KD-tree, large ones with an approximate nearest neighbour graph (NN-descent).
+    """
+
+    def __init__(self, exact_threshold: int = 10_000, random_state: int = 0) -> None:
+        self.exact_threshold = exact_threshold
+        self.random_state = random_state
+        self.names_ = None
+        self.sources_ = None
+        self.scaler_ = None
+        self.index_ = None
+        self.exact_ = None
+        self._scaled = None
+
+    def __repr__(self):
+        return f"FeatureIndex\nIndexed series : {0 if self.names_ is None else len(self.names_)}\nExact : {self.exact_}"
+
+    def fit(
+        self,
+        names: Iterable,
+        features_values: ndarray,
+        reference: DataFrame = None,
+        columns: Iterable = None,
+    ) -> "FeatureIndex":
+        """
+        Scale the features and build the index.
+
+        Args:
+            names (Iterable): The names of the series.
+            features_values (ndarray): The features matrix (see preprocess_features).
+            reference (DataFrame, optional): Reference features (e.g. the bundled M4 features)
+                to index alongside the dataset. Defaults to None.
+            columns (Iterable, optional): The features names of features_values, needed to align
+                the reference features. Defaults to None.
+
+        Returns:
+            FeatureIndex: The fitted index.
+        """
+        names = list(names)
+        sources = ["Dataset"] * len(names)
+        values = asarray(features_values, dtype=float32)
+        if reference is not None:
+            ref_names, ref_features, _ = preprocess_features(reference)
+            ref_values = (
+                ref_features.reindex(columns=list(columns))
+                .fillna(0)
+                .to_numpy(dtype=float32)
+            )
+            names += list(ref_names)
+            sources += ["M4 reference"] * len(ref_names)
+            values = concatenate([values, ref_values])
+
+        self.names_ = Series(names)
+        self.sources_ = Series(sources)
+        self.scaler_ = StandardScaler().fit(values)
+        scaled = self.scaler_.transform(values).astype(float32, copy=False)
+        self.exact_ = len(names) <= self.exact_threshold
+        if self.exact_:
+            self.index_ = KDTree(scaled)
+        else:
+            from pynndescent import NNDescent
+
+            self.index_ = NNDescent(scaled, random_state=self.random_state)
+            self.index_.prepare()
+        self._scaled = scaled
+        return self
+
+    def query(self, query: Union[str, ndarray], k: int = 5) -> DataFrame:
+        """
+        Returns the k closest series of a serie of the index or of a features vector.
+
+        Args:
+            query (Union[str, ndarray]): A serie name of the index, or a raw features vector.
+            k (int, optional): The number of neighbours. Defaults to 5.
+
+        Raises:
+            KeyError: If the serie name is not indexed.
+
+        Returns:
+            DataFrame: The neighbours names, sources and distances, closest first.
+        """
+        exclude = []
+        if isinstance(query, str):
+            # a name of the dataset can be a name of the reference too, none of them is kept
+            exclude = self.names_.index[self.names_ == query].to_numpy()
+            if len(exclude) == 0:
+                raise KeyError(f"Unknown serie: {query}")
+            vector = self._scaled[exclude[:1]]
+        else:
+            vector = self.scaler_.transform(
+                asarray(query, dtype=float32).reshape(1, -1)
+            ).astype(float32)
+
+        n_neighbors = min(k + len(exclude), len(self.names_))
+        if self.exact_:
+            distances, indices = self.index_.query(vector, k=n_neighbors)
+        else:
+            indices, distances = self.index_.query(vector, k=n_neighbors)
+        indices, distances = indices[0], distances[0]
+        keep = ~isin(indices, exclude)
+        indices, distances = indices[keep][:k], distances[keep][:k]
+        return DataFrame(
+            {
+                "Name": self.names_.iloc[indices].values,
+                "Source": self.sources_.iloc[indices].values,
+                "Distance": distances,
+            }
+        )
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "FeatureIndex":
+        with open(path, "rb") as handle:
+            return pickle.load(handle)
+
+
+def build_feature_index(
+    features: DataFrame, include_reference: bool = False
+) -> FeatureIndex:
+    """
+    Given the features space projection dataset, build its nearest neighbour index.
+
+    Args:
+        features (DataFrame): The features space projection dataset (with the "unique_id" column).
+        include_reference (bool, optional): Whether to index the bundled M4 features too. Defaults to False.
+
+    Returns:
+        FeatureIndex: The fitted index.
+    """
+    names, features, features_values = preprocess_features(features)
+    return FeatureIndex().fit(
+        names,
+        features_values,
+        reference=load_computed_features() if include_reference else None,
+        columns=features.columns,
+    )
+
+
+class KNNGraph:
+    """
+    A k nearest neighbours graph (each point being its own first neighbour), computed once at
+    the largest k needed and shared by the UMAP and t-SNE runs on the same scaled features.
+    """
+
+    def __init__(
+        self, indices: ndarray, distances: ndarray, search_index: object = None
+    ) -> None:
+        self.indices = indices
+        self.distances = distances
+        self.search_index = search_index
+
+    def __repr__(self):
+        return f"KNNGraph\nPoints : {self.indices.shape[0]}\nNeighbours : {self.n_neighbors}"
+
+    @property
+    def n_neighbors(self) -> int:
+        return self.indices.shape[1]
+
+    def neighbors(self, k: int) -> Tuple[ndarray, ndarray]:
+        """
+        Returns the k nearest neighbours of each point (itself included), as expected by UMAP.
+
+        Args:
+            k (int): The number of neighbours.
+
+        Raises:
+            ValueError: If the graph was built with less neighbours.
+
+        Returns:
+            Tuple[ndarray, ndarray]: [The neighbours indices, their distances].
+        """
+        if k > self.n_neighbors:
+            raise ValueError(
+                f"The graph has {self.n_neighbors} neighbours, {k} were requested"
+            )
+        return (
+            ascontiguousarray(self.indices[:, :k]),
+            ascontiguousarray(self.distances[:, :k]),
+        )
+
+    def sparse_distances(self, k: int) -> csr_matrix:
+        """
+        Returns the sparse graph of the squared distances to the k nearest neighbours, as
+        expected by t-SNE with a precomputed metric (each point stored as its own neighbour,
+        with an explicit zero). A point is told apart from its duplicates by its index, the
+        first neighbour of a duplicated point can be another one.
+
+        Args:
+            k (int): The number of neighbours, itself excluded.
+
+        Returns:
+            csr_matrix: The sparse (n_samples, n_samples) distances graph.
+        """
+        indices, distances = self.neighbors(k + 1)
+        n_samples = indices.shape[0]
+        points = arange(n_samples)
+        # the k first neighbours other than the point, found among the k + 1 first ones
+        others = indices != points[:, None]
+        kept = others & (cumsum(others, axis=1) <= k)
+        indices = column_stack([points, indices[kept].reshape(n_samples, k)])
+        distances = column_stack(
+            [zeros(n_samples, distances.dtype), distances[kept].reshape(n_samples, k)]
+        )
+        return csr_matrix(
+            (
+                distances.ravel() ** 2,
+                indices.ravel(),
+                arange(0, n_samples * (k + 1) + 1, k + 1),
+            ),
+            shape=(n_samples, n_samples),
+        )
+
+
+def build_knn_graph(
+    X: ndarray, n_neighbors: int, random_state: int = None, exact_threshold: int = 4096
+) -> KNNGraph:
+    """
+    Build the k nearest neighbours graph of a (scaled) features matrix. Small matrices get an
+    exact graph, large ones an approximate NN-descent graph.
+
+    Args:
+        X (ndarray): The scaled features matrix.
+        n_neighbors (int): The number of neighbours (each point included).
+        random_state (int, optional): The seed of the approximate graph. Defaults to None.
+        exact_threshold (int, optional): The size above which the graph is approximate. Defaults to 4096.
+
+    Returns:
+        KNNGraph: The graph.
+    """
+    n_neighbors = min(n_neighbors, X.shape[0])
+    if X.shape[0] <= exact_threshold:
+        distances, indices = (
+            NearestNeighbors(n_neighbors=n_neighbors).fit(X).kneighbors(X)
+        )
+        return KNNGraph(indices, distances.astype(float32))
+
+    from pynndescent import NNDescent
+
+    search_index = NNDescent(X, n_neighbors=n_neighbors, random_state=random_state)
+    indices, distances = search_index.neighbor_graph
+    return KNNGraph(indices, distances, search_index)
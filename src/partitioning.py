@@ -0,0 +1,354 @@
+from functools import partial
+from glob import glob
+from hashlib import sha256
+from json import dump, load
+from os import environ, makedirs, remove
+from os.path import commonpath, exists, isdir, isfile, join, realpath
+from typing import Callable, Iterable, Iterator, List, Mapping, Union
+import pickle
+
+from pandas import DataFrame, Series, concat, read_csv
+from pandas.util import hash_pandas_object
+
+from src.cache import LRUCache
+from src.length_policy import LengthPolicy
+from src.seasonality import compute_grouped_tsfeatures, detect_periods
+from src.space_projection import compute_tsfeatures, recompute_tsfeatures
+from src.utils import TOY_SERIES, inject_toy_series
+
+
+TOYS_PARTITION = "toys"
+# the server files the sessions can open in the out-of-core mode, and the partitions the
+# app writes, overridden by the FBP_DATA_DIR and FBP_PARTITIONS_DIR environment variables
+DATA_DIRECTORY = "data"
+PARTITIONS_DIRECTORY = "partitions"
+
+
+class PartitionedDataset:
+    """
+    A nixtla dataset stored on disk as a directory of partitions, each serie (unique_id) living
+    in a single partition. Partitions are loaded one at a time, so the panel never needs to fit
+    in memory.
+    """
+
+    def __init__(self, directory: str, max_loaded_partitions: int = 2) -> None:
+        self.directory = directory
+        with open(join(directory, "manifest.json")) as handle:
+            self.manifest = load(handle)
+        self._loaded = LRUCache(max_bytes=None, max_entries=max_loaded_partitions)
+
+    def __repr__(self):
+        return f"PartitionedDataset\nDirectory : {self.directory}\nSeries : {len(self.manifest['series'])}"
+
+    @staticmethod
+    def is_partitioned(directory: str) -> bool:
+        return isdir(directory) and exists(join(directory, "manifest.json"))
+
+    @classmethod
+    def from_chunks(
+        cls, chunks: Iterator[DataFrame], directory: str, n_partitions: int = 64
+    ) -> "PartitionedDataset":
+        """
+        Partitions a stream of nixtla formatted chunks by unique_id, one chunk in memory at a time.
+
+        Args:
+            chunks (Iterator[DataFrame]): The chunks of the dataset.
+            directory (str): The directory to write the partitions in.
+            n_partitions (int, optional): The number of partitions. Defaults to 64.
+
+        Returns:
+            PartitionedDataset: The partitioned dataset.
+        """
+        makedirs(directory, exist_ok=True)
+        names = [f"part-{partition:05d}" for partition in range(n_partitions)]
+        for path in glob(join(directory, "*", "*.pickle")):
+            remove(path)
+        series = {}
+        for chunk_index, chunk in enumerate(chunks):
+            chunk = chunk.loc[:, ["unique_id", "ds", "y"]].astype({"unique_id": str})
+            partitions = hash_pandas_object(chunk["unique_id"], index=False).values
+            for partition, fragment in chunk.groupby(partitions % n_partitions):
+                _write_fragment(
+                    fragment, join(directory, names[partition]), chunk_index
+                )
+                for uid, length in fragment["unique_id"].value_counts().items():
+                    series.setdefault(uid, [names[partition], 0])[1] += int(length)
+
+        with open(join(directory, "manifest.json"), "w") as handle:
+            dump({"partitions": names, "series": series}, handle)
+        return cls(directory)
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str,
+        directory: str,
+        n_partitions: int = 64,
+        chunksize: int = 1_000_000,
+    ) -> "PartitionedDataset":
+        """
+        Partitions a nixtla formatted csv file, streamed by chunks of rows.
+
+        Args:
+            path (str): The csv file (with the "unique_id", "ds" and "y" columns).
+            directory (str): The directory to write the partitions in.
+            n_partitions (int, optional): The number of partitions. Defaults to 64.
+            chunksize (int, optional): The number of rows read at a time. Defaults to 1_000_000.
+
+        Returns:
+            PartitionedDataset: The partitioned dataset.
+        """
+        return cls.from_chunks(
+            read_csv(path, chunksize=chunksize), directory, n_partitions
+        )
+
+    def serie_names(self) -> List[str]:
+        return list(self.manifest["series"])
+
+    def serie_length(self, serie_name: str) -> int:
+        return self.manifest["series"][serie_name][1]
+
+    def partition(self, name: str) -> DataFrame:
+        """
+        Loads a partition, keeping the last loaded ones in memory.
+
+        Args:
+            name (str): The partition name.
+
+        Returns:
+            DataFrame: The series of the partition, in the nixtla format.
+        """
+        partition = self._loaded.get(name)
+        if partition is None:
+            fragments = []
+            for path in sorted(glob(join(self.directory, name, "*.pickle"))):
+                with open(path, "rb") as handle:
+                    fragments.append(pickle.load(handle))
+            partition = concat(fragments, ignore_index=True)
+            self._loaded.put(name, partition)
+        return partition
+
+    def iter_partitions(self) -> Iterator[DataFrame]:
+        for name in self.manifest["partitions"]:
+            if isdir(join(self.directory, name)):
+                yield self.partition(name)
+
+    def get_serie(self, serie_name: str) -> DataFrame:
+        """
+        Returns a serie in the nixtla format, loading only its partition.
+
+        Args:
+            serie_name (str): The name of the serie.
+
+        Returns:
+            DataFrame: The rows of the serie.
+        """
+        partition = self.partition(self.manifest["series"][serie_name][0])
+        return partition[partition["unique_id"] == serie_name]
+
+    def add_toy_series(self, freq: int = 24) -> None:
+        """
+        Injects the toys series (see inject_toy_series) in their own partition, replacing
+        the ones of a previous period (the ones of the same period are kept as is).
+
+        Args:
+            freq (int, optional): The toys series seasonal frequency. Defaults to 24.
+        """
+        if self.manifest.get("toys_freq") == freq:
+            return
+        toys = inject_toy_series(DataFrame(columns=["unique_id", "ds", "y"]), freq=freq)
+        directory = join(self.directory, TOYS_PARTITION)
+        for path in glob(join(directory, "*.pickle")):
+            remove(path)
+        _write_fragment(toys, directory, 0)
+        self._loaded.pop(TOYS_PARTITION)
+        if TOYS_PARTITION not in self.manifest["partitions"]:
+            self.manifest["partitions"].append(TOYS_PARTITION)
+        for uid, length in toys["unique_id"].value_counts().items():
+            self.manifest["series"][uid] = [TOYS_PARTITION, int(length)]
+        self.manifest["toys_freq"] = freq
+        with open(join(self.directory, "manifest.json"), "w") as handle:
+            dump(self.manifest, handle)
+
+
+def _write_fragment(fragment: DataFrame, directory: str, index: int) -> None:
+    makedirs(directory, exist_ok=True)
+    with open(join(directory, f"frag-{index:06d}.pickle"), "wb") as handle:
+        pickle.dump(fragment, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def open_server_dataset(
+    source: str,
+    n_partitions: int = 64,
+    data_directory: str = None,
+    partitions_directory: str = None,
+) -> PartitionedDataset:
+    """
+    Opens a dataset of the server data directory, given by a session in the out-of-core
+    mode: a partitioned dataset, or a nixtla formatted .csv file partitioned in a directory
+    of the app named after its path.
+
+    Args:
+        source (str): The path of the dataset, relative to the data directory.
+        n_partitions (int, optional): The number of partitions of a .csv file. Defaults
+            to 64.
+        data_directory (str, optional): The data directory. Defaults to None
+            (FBP_DATA_DIR, or DATA_DIRECTORY).
+        partitions_directory (str, optional): The directory of the partitions written by
+            the app. Defaults to None (FBP_PARTITIONS_DIR, or PARTITIONS_DIRECTORY).
+
+    Raises:
+        ValueError: If the source resolves outside of the data directory (an absolute path,
+            a "..", a symbolic link), or is neither a .csv file nor a partitioned dataset.
+
+    Returns:
+        PartitionedDataset: The partitioned dataset.
+    """
+    root = realpath(data_directory or environ.get("FBP_DATA_DIR", DATA_DIRECTORY))
+    path = realpath(join(root, source))
+    if commonpath([root, path]) != root:
+        raise ValueError(f"{source} is outside of the data directory")
+    if PartitionedDataset.is_partitioned(path):
+        return PartitionedDataset(path)
+    if not isfile(path) or not path.endswith(".csv"):
+        raise ValueError(f"{source} is neither a .csv file nor a partitioned dataset")
+    partitions = partitions_directory or environ.get(
+        "FBP_PARTITIONS_DIR", PARTITIONS_DIRECTORY
+    )
+    name = sha256(f"{path}:{n_partitions}".encode()).hexdigest()[:32]
+    return PartitionedDataset.from_csv(path, join(partitions, name), n_partitions)
+
+
+def compute_partitioned_tsfeatures(
+    dataset: PartitionedDataset,
+    freq: int = None,
+    fill_value: int = 0,
+    features: Iterable[str] = None,
+    length_policy: LengthPolicy = None,
+    periods: Mapping[str, int] = None,
+    previous: DataFrame = None,
+    wrap_task: Callable[[Callable], Callable] = None,
+) -> DataFrame:
+    """
+    Computes the tsfeatures of a partitioned dataset partition by partition, only the features
+    being kept in memory.
+
+    Args:
+        dataset (PartitionedDataset): The partitioned dataset.
+        freq (int, optional): The seasonal frequency of the series. Defaults to None.
+        fill_value (int, optional): The value to fill the features that cannot be computed. Defaults to 0.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run.
+            Defaults to None (all the tsfeatures default functions).
+        length_policy (LengthPolicy, optional): The policy capping the features cost of the
+            long series. Defaults to None (the features of all the series are exact).
+        periods (Mapping[str, int], optional): The seasonal period of each serie (see
+            detect_partitioned_periods), the series of each partition being grouped by period.
+            Defaults to None (freq for all the series).
+        previous (DataFrame, optional): The features of the dataset computed with other
+            periods, only their period dependent features are recomputed (see
+            recompute_tsfeatures). Defaults to None.
+        wrap_task (Callable[[Callable], Callable], optional): Applied to each task submitted
+            to the pool of the periods (see compute_grouped_tsfeatures). Defaults to None.
+
+    Returns:
+        DataFrame: The dataframe of the series projected in the features space.
+    """
+    compute = (
+        compute_tsfeatures
+        if length_policy is None
+        else length_policy.compute_tsfeatures
+    )
+    if previous is not None:
+        # the toys series are generated again with the new period
+        compute = partial(
+            recompute_tsfeatures, previous=previous, compute=compute, stale=TOY_SERIES
+        )
+    if periods is not None:
+        return concat(
+            [
+                compute_grouped_tsfeatures(
+                    partition,
+                    periods,
+                    fill_value=fill_value,
+                    features=features,
+                    compute=compute,
+                    wrap_task=wrap_task,
+                )
+                for partition in dataset.iter_partitions()
+            ],
+            ignore_index=True,
+        ).fillna(value=fill_value)
+    return concat(
+        [
+            compute(partition, freq=freq, fill_value=fill_value, features=features)
+            for partition in dataset.iter_partitions()
+        ],
+        ignore_index=True,
+    )
+
+
+def detect_partitioned_periods(dataset: PartitionedDataset, **kwargs) -> Series:
+    """
+    Detects the seasonal period of the series of a partitioned dataset partition by partition
+    (see detect_periods).
+
+    Args:
+        dataset (PartitionedDataset): The partitioned dataset.
+        **kwargs: The detect_periods parameters.
+
+    Returns:
+        Series: The period of each serie, indexed by unique_id.
+    """
+    return concat(
+        [detect_periods(partition, **kwargs) for partition in dataset.iter_partitions()]
+    ).sort_index()
+
+
+def serie_frame(
+    dataset: Union[DataFrame, PartitionedDataset], serie_name: str
+) -> DataFrame:
+    """
+    Returns a nixtla frame containing the serie: the partition rows of a partitioned dataset,
+    or the in-memory dataset itself.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset]): The dataset.
+        serie_name (str): The name of the serie.
+
+    Returns:
+        DataFrame: A nixtla frame containing the serie.
+    """
+    if isinstance(dataset, PartitionedDataset):
+        return dataset.get_serie(serie_name)
+    return dataset
+
+
+def list_series(dataset: Union[DataFrame, PartitionedDataset]) -> List[str]:
+    """
+    Returns the sorted names of the series of a dataset.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset]): The dataset.
+
+    Returns:
+        List[str]: The sorted series names.
+    """
+    if isinstance(dataset, PartitionedDataset):
+        return sorted(dataset.serie_names())
+    return sorted(dataset["unique_id"].unique())
+
+
+def serie_length(dataset: Union[DataFrame, PartitionedDataset], serie_name: str) -> int:
+    """
+    Returns the number of points of a serie of a dataset.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset]): The dataset.
+        serie_name (str): The name of the serie.
+
+    Returns:
+        int: The length of the serie.
+    """
+    if isinstance(dataset, PartitionedDataset):
+        return dataset.serie_length(serie_name)
+    return int((dataset["unique_id"] == serie_name).sum())
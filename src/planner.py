@@ -0,0 +1,261 @@
+from os import cpu_count
+
+from pandas import DataFrame
+
+from src.dimension_reduction import (
+    PCAReductor,
+    Reductor,
+    SubsampledReductor,
+    build_reductor,
+)
+from src.neighbors import KNNGraph
+
+
+# the tsfeatures functions of each tier, the lighter tiers leaving out the costliest ones
+_LIGHT_FEATURES = (
+    "acf_features",
+    "arch_stat",
+    "crossing_points",
+    "entropy",
+    "flat_spots",
+    "heterogeneity",
+    "lumpiness",
+    "nonlinearity",
+    "pacf_features",
+    "stability",
+    "unitroot_kpss",
+    "unitroot_pp",
+    "series_length",
+)
+FEATURE_TIERS = {
+    "full": None,
+    "standard": _LIGHT_FEATURES + ("holt_parameters", "stl_features", "hurst"),
+    "light": _LIGHT_FEATURES,
+}
+FEATURES_PER_TIER = {"full": 42, "standard": 39, "light": 25}
+
+DEFAULT_LATENCY_BUDGET = 60
+DEFAULT_MEMORY_BUDGET = 2048
+MIN_FIT_SAMPLES = 1000
+
+# single core costs (s) measured on synthetic hourly panels, hw_parameters alone taking
+# about 70% of the full tier
+_TIER_COST = {"full": 1.0, "standard": 0.27, "light": 0.12}
+_FEATURES_COST_PER_SERIE = 0.02
+_FEATURES_COST_PER_POINT = 0.00026
+_TSNE_COST_2000 = 26.5
+_TSNE_EXPONENT = 1.85
+_UMAP_COST = (10.0, 0.0015)
+_EXACT_NEIGHBORS_COST = 1.5e-8
+_KENDALL_COST = 0.00025
+
+
+class ExecutionPlan:
+    """
+    The strategies chosen for a panel under a latency and a memory budget, with the reason of
+    each decision and the measured durations of the steps that ran.
+    """
+
+    def __init__(
+        self,
+        latency_budget: float = DEFAULT_LATENCY_BUDGET,
+        memory_budget: float = DEFAULT_MEMORY_BUDGET,
+    ) -> None:
+        self.latency_budget = latency_budget
+        self.memory_budget = memory_budget
+        self.feature_tier = "full"
+        self.fit_samples = {}
+        self.pca_solver = "auto"
+        self.approximate_neighbors = False
+        self.correlation_samples = None
+        self.decisions = []
+        self.measured = {}
+
+    def __repr__(self):
+        return f"ExecutionPlan\nLatency budget : {self.latency_budget}s\nDecisions : {len(self.decisions)}"
+
+    def decide(self, step: str, choice: str, estimate: float, reason: str) -> None:
+        self.decisions.append([step, choice, round(estimate, 1), reason])
+
+    def record(self, step: str, seconds: float) -> None:
+        self.measured[step] = round(seconds, 2)
+
+    def describe(self) -> DataFrame:
+        """
+        Returns the decisions of the plan, for display.
+
+        Returns:
+            DataFrame: The step, the choice, its estimated and measured durations and the reason.
+        """
+        described = DataFrame(
+            self.decisions, columns=["Step", "Choice", "Estimated (s)", "Reason"]
+        )
+        described.insert(3, "Measured (s)", described["Step"].map(self.measured))
+        return described
+
+    def build_reductor(
+        self, algorithm: str, n_samples: int, knn_graph: KNNGraph = None, **kwargs
+    ) -> Reductor:
+        """
+        Build the reductor of an algorithm following the plan (see build_reductor).
+
+        Args:
+            algorithm (str): One of "PCA", "T-SNE" or "UMAP".
+            n_samples (int): The number of series to project.
+            knn_graph (KNNGraph, optional): The neighbours graph of the fitted series. Defaults to None.
+            **kwargs: The other build_reductor parameters.
+
+        Returns:
+            Reductor: The reductor.
+        """
+        fit_samples = min(n_samples, self.fit_samples.get(algorithm) or n_samples)
+        reductor = build_reductor(algorithm, fit_samples, knn_graph=knn_graph, **kwargs)
+        if isinstance(reductor, PCAReductor):
+            reductor.set_params(svd_solver=self.pca_solver)
+        if fit_samples < n_samples:
+            return SubsampledReductor(reductor, n_samples=fit_samples)
+        return reductor
+
+
+def estimate_features_time(
+    n_series: int, series_length: float, tier: str = "full", n_jobs: int = None
+) -> float:
+    """
+    Estimates the duration of the tsfeatures computation of a panel.
+
+    Args:
+        n_series (int): The number of series.
+        series_length (float): The mean length of the series.
+        tier (str, optional): The features tier (see FEATURE_TIERS). Defaults to "full".
+        n_jobs (int, optional): The number of processes. Defaults to the number of cores.
+
+    Returns:
+        float: The estimated duration (s).
+    """
+    per_serie = _FEATURES_COST_PER_SERIE + _FEATURES_COST_PER_POINT * series_length
+    return n_series * per_serie * _TIER_COST[tier] / (n_jobs or cpu_count() or 1)
+
+
+def estimate_projection_time(algorithm: str, n_samples: int) -> float:
+    """
+    Estimates the duration of a projection fitted on n_samples series.
+
+    Args:
+        algorithm (str): One of "PCA", "T-SNE" or "UMAP".
+        n_samples (int): The number of fitted series.
+
+    Returns:
+        float: The estimated duration (s).
+    """
+    match algorithm:
+        case "T-SNE":
+            return _TSNE_COST_2000 * (n_samples / 2000) ** _TSNE_EXPONENT
+        case "UMAP":
+            return _UMAP_COST[0] + _UMAP_COST[1] * n_samples
+        case _:
+            return 1e-6 * n_samples
+
+
+def plan_execution(
+    n_series: int,
+    n_features: int = None,
+    series_length: float = None,
+    latency_budget: float = DEFAULT_LATENCY_BUDGET,
+    memory_budget: float = DEFAULT_MEMORY_BUDGET,
+    n_jobs: int = None,
+) -> ExecutionPlan:
+    """
+    Chooses the features tier, the subsamples of the projections, the PCA solver, the
+    neighbours search and the correlation subsample of a panel, each step having to fit the
+    latency budget (in seconds) and the memory budget (in MB).
+
+    Args:
+        n_series (int): The number of series.
+        n_features (int, optional): The number of features. Defaults to the features tier one.
+        series_length (float, optional): The mean length of the series, None when the features
+            are already computed. Defaults to None.
+        latency_budget (float, optional): The latency budget of each step (s). Defaults to 60.
+        memory_budget (float, optional): The memory budget (MB). Defaults to 2048.
+        n_jobs (int, optional): The number of processes of tsfeatures. Defaults to the number of cores.
+
+    Returns:
+        ExecutionPlan: The plan.
+    """
+    plan = ExecutionPlan(latency_budget, memory_budget)
+    memory_bytes = memory_budget * 2**20
+
+    if series_length is not None:
+        for tier in FEATURE_TIERS:
+            estimate = estimate_features_time(n_series, series_length, tier, n_jobs)
+            if estimate <= latency_budget:
+                break
+        plan.feature_tier = tier
+        if tier == "full":
+            reason = "All the features fit the budget"
+        elif estimate <= latency_budget:
+            reason = f"The full tier would take {estimate_features_time(n_series, series_length, 'full', n_jobs):.0f}s"
+        else:
+            reason = "Even the lightest tier exceeds the budget"
+        # the panel is copied about 3 times by tsfeatures (8 bytes per ds and per y)
+        if 3 * 16 * n_series * series_length > memory_bytes:
+            reason += ", the panel exceeds the memory budget (see the out-of-core mode)"
+        plan.decide("Features", tier, estimate, reason)
+    n_features = n_features or FEATURES_PER_TIER[plan.feature_tier]
+
+    # the features matrix and its scaled copies (float32)
+    max_fit_samples = max(MIN_FIT_SAMPLES, int(memory_bytes // (8 * 4 * n_features)))
+    for algorithm in ("T-SNE", "UMAP"):
+        fit_samples = n_series
+        while (
+            fit_samples > MIN_FIT_SAMPLES
+            and estimate_projection_time(algorithm, fit_samples) > latency_budget
+        ):
+            fit_samples = max(MIN_FIT_SAMPLES, int(fit_samples * 0.8))
+        fit_samples = min(fit_samples, max_fit_samples)
+        estimate = estimate_projection_time(algorithm, fit_samples)
+        if fit_samples < n_series:
+            plan.fit_samples[algorithm] = fit_samples
+            plan.decide(
+                algorithm,
+                f"Fit on {fit_samples} series, out-of-sample projection of the others",
+                estimate,
+                f"A fit on the {n_series} series would take {estimate_projection_time(algorithm, n_series):.0f}s",
+            )
+        else:
+            plan.decide(algorithm, "Fit on all the series", estimate, "Fits the budget")
+
+    # only 3 components of a few dozen features are kept and the warm start only flips
+    # their signs, the components of the solver of scikit-learn are close enough to the
+    # exact ones (1e-6 on the synthetic panels)
+    plan.pca_solver = "auto"
+    plan.decide(
+        "PCA",
+        "SVD solver chosen by scikit-learn",
+        estimate_projection_time("PCA", n_series),
+        "Exact on small panels, randomized or covariance based on the tall ones",
+    )
+
+    n_fitted = max(plan.fit_samples.values(), default=n_series)
+    estimate = _EXACT_NEIGHBORS_COST * n_fitted**2
+    plan.approximate_neighbors = estimate > 0.1 * latency_budget
+    plan.decide(
+        "Neighbours graph",
+        "Approximate (NN-descent)" if plan.approximate_neighbors else "Exact",
+        estimate,
+        f"An exact search over {n_fitted} series takes {estimate:.1f}s",
+    )
+
+    estimate = _KENDALL_COST * n_series
+    if estimate > 0.1 * latency_budget:
+        plan.correlation_samples = int(0.1 * latency_budget / _KENDALL_COST)
+        plan.decide(
+            "Correlations",
+            f"Kendall's τ on {plan.correlation_samples} sampled series",
+            _KENDALL_COST * plan.correlation_samples,
+            f"On all the series it would take {estimate:.0f}s",
+        )
+    else:
+        plan.decide(
+            "Correlations", "Kendall's τ on all the series", estimate, "Fits the budget"
+        )
+    return plan
@@ -1,9 +1,11 @@
-from plotly.graph_objects import Figure, Scatter, Surface, Heatmap
+from plotly.graph_objects import Figure, Scatter, Scatter3d, Surface, Heatmap
 from plotly.figure_factory import create_distplot
 from plotly.express import scatter_3d, colors
 from pandas import DataFrame
 from numpy import abs as nabs, ndarray, arange, meshgrid, log
 
+from src.aggregation import marker_sizes
+
 
 def plot_time_view(data: DataFrame, serie_name: str) -> Figure:
     """
@@ -73,7 +75,11 @@ def plot_fft_view(frequencies: ndarray, fft_result: ndarray, serie_name: str) ->
 
 
 def plot_wavelet_view(
-    widths: ndarray, t: ndarray, cwt_result: ndarray, serie_name: str
+    widths: ndarray,
+    t: ndarray,
+    cwt_result: ndarray,
+    serie_name: str,
+    time_index: ndarray = None,
 ) -> Figure:
     """
     Plots a time serie in the wavelet domain (time/frequency mix).
@@ -83,11 +89,13 @@ def plot_wavelet_view(
         t (ndarray): The time index used to build the meshgrid.
         cwt_result (ndarray): The continuous wavelet transform result (z axis).
         serie_name (str): The name of the serie.
+        time_index (ndarray, optional): The time of each column of cwt_result, for a window
+            or a pooled transform (see WaveletScalogram). Defaults to arange(t).
 
     Returns:
         Figure: The plotly figure object to be plotted.
     """
-    T, S = meshgrid(arange(t), widths)
+    T, S = meshgrid(arange(t) if time_index is None else time_index, widths)
     fig = Figure(
         data=[
             Surface(x=T, y=S, z=nabs(cwt_result), showscale=False, colorscale="Viridis")
@@ -179,13 +187,18 @@ def plot_psd_view(frequencies: ndarray, psd: ndarray, serie_name: str) -> Figure
     return fig
 
 
-def plot_reducted_dim(reducted_df: DataFrame, reduc_dim_algo: str) -> Figure:
+def plot_reducted_dim(
+    reducted_df: DataFrame, reduc_dim_algo: str, trajectories: DataFrame = None
+) -> Figure:
     """
-    Plots a 3 dimensional scatter plot of the reducted features space of the series.
+    Plots a 3 dimensional scatter plot of the reducted features space of the series, and the
+    trajectories of the rolling windows of some series if given.
 
     Args:
         reducted_df (DataFrame): The 3d reducted features space of the series.
         reduc_dim_algo (str): The reduction dimension algorithm used.
+        trajectories (DataFrame, optional): The 3d reducted features space of the windows, with
+            their serie "Name" and their "Start", ordered by start. Defaults to None.
 
     Returns:
         Figure: The plotly object to be plotted.
@@ -212,6 +225,140 @@ def plot_reducted_dim(reducted_df: DataFrame, reduc_dim_algo: str) -> Figure:
 
     fig.update_traces(marker_size=8)
     fig.update_layout(showlegend=True)
+    if trajectories is not None:
+        add_trajectories(fig, trajectories)
+
+    return fig
+
+
+def add_trajectories(fig: Figure, trajectories: DataFrame) -> Figure:
+    """
+    Draws the path of each serie through the features space, one line per serie from its
+    first window to its last one.
+
+    Args:
+        fig (Figure): The 3d scatter plot of the reducted features space.
+        trajectories (DataFrame): The 3d reducted features space of the windows, with their
+            serie "Name" and their "Start", ordered by start.
+
+    Returns:
+        Figure: The figure, with one trace per serie.
+    """
+    palette = colors.qualitative.Dark24
+    for i, (name, path) in enumerate(trajectories.groupby("Name", sort=False)):
+        fig.add_trace(
+            Scatter3d(
+                x=path["fst_dim"],
+                y=path["snd_dim"],
+                z=path["trd_dim"],
+                mode="lines+markers",
+                name=f"{name} (windows)",
+                customdata=path["Start"].astype(str),
+                hovertemplate=f"{name}<br>Start: %{{customdata}}<extra></extra>",
+                line={"color": palette[i % len(palette)], "width": 4},
+                # the path ends on its last window
+                marker={
+                    "size": [3] * (len(path) - 1) + [7],
+                    "color": palette[i % len(palette)],
+                },
+            )
+        )
+    return fig
+
+
+def add_reference_series(fig: Figure, references: DataFrame) -> Figure:
+    """
+    Overlays the reference series on the reducted features space, one trace per frequency
+    drawn with small markers under the series of the dataset.
+
+    Args:
+        fig (Figure): The 3d scatter plot of the reducted features space.
+        references (DataFrame): The 3d reducted features space of the reference series, with
+            their "Name" and their "Frequency".
+
+    Returns:
+        Figure: The figure, with one trace per frequency.
+    """
+    palette = colors.qualitative.Pastel
+    for i, (frequency, series) in enumerate(
+        references.groupby("Frequency", sort=False)
+    ):
+        fig.add_trace(
+            Scatter3d(
+                x=series["fst_dim"],
+                y=series["snd_dim"],
+                z=series["trd_dim"],
+                mode="markers",
+                name=f"M4 {frequency} (reference)",
+                text=series["Name"],
+                hovertemplate="%{text}<extra></extra>",
+                marker={"size": 2, "color": palette[i % len(palette)], "opacity": 0.5},
+            )
+        )
+    return fig
+
+
+def plot_aggregated_reducted_dim(
+    points: DataFrame,
+    voxels: DataFrame,
+    centroids: DataFrame,
+    reduc_dim_algo: str,
+    trajectories: DataFrame = None,
+) -> Figure:
+    """
+    Plots a 3 dimensional density view of a large reducted features space: the voxels sized
+    and colored by their number of series, the clusters centroids, and the points drawn
+    individually (see aggregate_embedding).
+
+    Args:
+        points (DataFrame): The series drawn individually.
+        voxels (DataFrame): The voxels centroids and counts, or None.
+        centroids (DataFrame): The clusters centroids, or None.
+        reduc_dim_algo (str): The reduction dimension algorithm used.
+        trajectories (DataFrame, optional): The windows trajectories (see plot_reducted_dim).
+            Defaults to None.
+
+    Returns:
+        Figure: The plotly object to be plotted.
+    """
+    fig = plot_reducted_dim(points, reduc_dim_algo, trajectories)
+    if voxels is None:
+        return fig
+
+    fig.add_traces(
+        [
+            Scatter3d(
+                x=voxels["fst_dim"],
+                y=voxels["snd_dim"],
+                z=voxels["trd_dim"],
+                mode="markers",
+                name="Density",
+                customdata=voxels["Count"],
+                hovertemplate="%{customdata} series<extra></extra>",
+                marker={
+                    "size": marker_sizes(voxels["Count"]),
+                    "color": log(voxels["Count"]),
+                    "colorscale": "Viridis",
+                    "opacity": 0.5,
+                    "colorbar": {"title": "log(series)", "x": -0.1},
+                },
+            ),
+            Scatter3d(
+                x=centroids["fst_dim"],
+                y=centroids["snd_dim"],
+                z=centroids["trd_dim"],
+                mode="markers+text",
+                name="Clusters centroids",
+                text=centroids["Name"],
+                customdata=centroids["Count"],
+                hovertemplate="%{text}: %{customdata} series<extra></extra>",
+                marker={"size": 6, "symbol": "diamond", "color": "black"},
+            ),
+        ]
+    )
+    fig.update_layout(
+        title=f"{reduc_dim_algo} representation ({voxels['Count'].sum()} series aggregated)"
+    )
 
     return fig
 
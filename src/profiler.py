@@ -0,0 +1,373 @@
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+from glob import glob
+from json import dump, load
+from os import makedirs
+from os.path import join, relpath
+from threading import Event, Thread, enumerate as enumerate_threads, get_ident
+from time import perf_counter
+from typing import Any, Callable, Dict, Mapping, MutableMapping, Tuple, Union
+import sys
+
+from pandas import DataFrame
+
+from src.partitioning import PartitionedDataset
+
+
+PROFILES_DIRECTORY = "profiles"
+PROFILED_PAGES = ("Dataset Loading", "Local Analysis", "Global Analysis")
+SAMPLING_INTERVAL = 0.005
+# a rerun interrupted by a widget change never saves its profile, its sampling ends here
+MAX_DURATION = 600
+TOP_FUNCTIONS = 20
+# the rerun thread each busy worker thread computes for (see owned_task)
+_task_owners = {}
+
+
+class SamplingProfiler(Thread):
+    """
+    A statistical profiler of a script rerun: samples the python call stacks of the thread
+    that created it, and of the worker threads while they run a task it submitted (see
+    owned_task), at a fixed interval. The tasks of the other sessions are left out, a
+    projection shared with another session belongs to the session that launched it.
+    Nothing is traced, the overhead is a stack walk per sample. The tsfeatures functions
+    run in child processes, their time shows as the wait of the pool.
+    """
+
+    def __init__(
+        self, interval: float = SAMPLING_INTERVAL, max_duration: float = MAX_DURATION
+    ) -> None:
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.max_duration = max_duration
+        self.target = get_ident()
+        self.stacks = Counter()
+        self.duration = 0.0
+        self._stopped = Event()
+
+    def run(self) -> None:
+        start = perf_counter()
+        while not self._stopped.wait(self.interval):
+            self.sample()
+            if perf_counter() - start > self.max_duration:
+                break
+        self.duration = perf_counter() - start
+
+    def sample(self) -> None:
+        names = {thread.ident: thread.name for thread in enumerate_threads()}
+        owners = dict(_task_owners)
+        for ident, frame in sys._current_frames().items():
+            if ident != self.target and owners.get(ident) != self.target:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, ""))
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        """
+        Stops the sampling.
+
+        Returns:
+            Counter: The number of samples of each call stack, the thread name first.
+        """
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+def owned_task(function: Callable) -> Callable:
+    """
+    Tags a function submitted to a worker pool with the thread submitting it, the rerun
+    whose profiler samples the worker while it runs the function. A task submitted by a
+    task belongs to the same rerun.
+
+    Args:
+        function (Callable): The submitted function.
+
+    Returns:
+        Callable: The tagged function.
+    """
+    submitter = get_ident()
+    owner = _task_owners.get(submitter, submitter)
+
+    @wraps(function)
+    def task(*args, **kwargs):
+        worker = get_ident()
+        _task_owners[worker] = owner
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _task_owners.pop(worker, None)
+
+    return task
+
+
+def dataset_size(
+    dataset: Union[DataFrame, PartitionedDataset, None]
+) -> Tuple[int, int]:
+    """
+    Returns the size of a dataset, to tag its profiles.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset, None]): The dataset, if loaded.
+
+    Returns:
+        Tuple[int, int]: [The number of series, the number of points].
+    """
+    if isinstance(dataset, PartitionedDataset):
+        lengths = [length for _, length in dataset.manifest["series"].values()]
+        return len(lengths), sum(lengths)
+    if isinstance(dataset, DataFrame):
+        return int(dataset["unique_id"].nunique()), len(dataset)
+    return 0, 0
+
+
+def collapsed_stacks(stacks: Mapping[Tuple[str, ...], int]) -> str:
+    """
+    Formats call stacks in the collapsed format of flamegraph.pl, read as well by speedscope
+    and inferno: one "root;...;leaf count" line per stack.
+
+    Args:
+        stacks (Mapping[Tuple[str, ...], int]): The number of samples of each call stack.
+
+    Returns:
+        str: The collapsed stacks.
+    """
+    return "".join(
+        f"{';'.join(stack)} {count}\n" for stack, count in sorted(stacks.items())
+    )
+
+
+def parse_collapsed_stacks(text: str) -> Counter:
+    """
+    Parses call stacks in the collapsed format (see collapsed_stacks).
+
+    Args:
+        text (str): The collapsed stacks.
+
+    Returns:
+        Counter: The number of samples of each call stack.
+    """
+    stacks = Counter()
+    for line in text.splitlines():
+        if line:
+            stack, count = line.rsplit(" ", 1)
+            stacks[tuple(stack.split(";"))] += int(count)
+    return stacks
+
+
+def hot_functions(
+    stacks: Mapping[Tuple[str, ...], int],
+    interval: float = SAMPLING_INTERVAL,
+    top: int = TOP_FUNCTIONS,
+) -> DataFrame:
+    """
+    Ranks the functions of profiled call stacks by their self time, the time spent in their
+    own code. The total time also counts the functions they call.
+
+    Args:
+        stacks (Mapping[Tuple[str, ...], int]): The number of samples of each call stack,
+            the thread name first.
+        interval (float, optional): The sampling interval (s). Defaults to 5 ms.
+        top (int, optional): The number of functions kept. Defaults to 20.
+
+    Returns:
+        DataFrame: The "Function", "Self (s)", "Self (%)", "Total (s)" and "Total (%)" of
+        the hottest functions.
+    """
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        functions = stack[1:]
+        if functions:
+            own[functions[-1]] += count
+        # a recursive function is counted once per sample
+        for function in set(functions):
+            total[function] += count
+    n_samples = max(sum(stacks.values()), 1)
+    return DataFrame(
+        [
+            [
+                function,
+                round(count * interval, 3),
+                round(100 * count / n_samples, 1),
+                round(total[function] * interval, 3),
+                round(100 * total[function] / n_samples, 1),
+            ]
+            for function, count in own.most_common(top)
+        ],
+        columns=["Function", "Self (s)", "Self (%)", "Total (s)", "Total (%)"],
+    )
+
+
+def save_profile(
+    profiler: SamplingProfiler,
+    page: str,
+    dataset: Union[DataFrame, "PartitionedDataset", None] = None,
+    directory: str = PROFILES_DIRECTORY,
+) -> str:
+    """
+    Saves the call stacks of a stopped profiler as a collapsed stacks file, along with a
+    json file of its tags: the page, the size of the dataset, the duration and the number
+    of samples.
+
+    Args:
+        profiler (SamplingProfiler): The stopped profiler.
+        page (str): The profiled page.
+        dataset (Union[DataFrame, PartitionedDataset, None], optional): The dataset of the
+            session. Defaults to None.
+        directory (str, optional): The directory of the profiles, created if needed.
+            Defaults to PROFILES_DIRECTORY.
+
+    Returns:
+        str: The path of the collapsed stacks file.
+    """
+    makedirs(directory, exist_ok=True)
+    created = datetime.now(timezone.utc)
+    n_series, n_points = dataset_size(dataset)
+    name = "-".join(
+        [
+            created.strftime("%Y%m%dT%H%M%S%f"),
+            page.replace(" ", "_"),
+            f"{n_series}x{n_points}",
+        ]
+    )
+    path = join(directory, f"{name}.collapsed")
+    with open(path, "w") as handle:
+        handle.write(collapsed_stacks(profiler.stacks))
+    metadata = {
+        "page": page,
+        "series": n_series,
+        "points": n_points,
+        "duration": round(profiler.duration, 3),
+        "samples": sum(profiler.stacks.values()),
+        "interval": profiler.interval,
+        "created": created.isoformat(timespec="seconds"),
+    }
+    with open(join(directory, f"{name}.json"), "w") as handle:
+        dump(metadata, handle, indent=1)
+    return path
+
+
+def load_profile(path: str) -> Tuple[Counter, Dict[str, Any]]:
+    """
+    Loads a profile saved by save_profile.
+
+    Args:
+        path (str): The path of the collapsed stacks file.
+
+    Returns:
+        Tuple[Counter, Dict[str, Any]]: [The number of samples of each call stack, the tags
+        of the profile].
+    """
+    with open(path) as handle:
+        stacks = parse_collapsed_stacks(handle.read())
+    with open(path.replace(".collapsed", ".json")) as handle:
+        metadata = load(handle)
+    return stacks, metadata
+
+
+def list_profiles(root: str = PROFILES_DIRECTORY) -> DataFrame:
+    """
+    Lists the profiles saved under a directory, to compare them over time.
+
+    Args:
+        root (str, optional): The directory of the profiles. Defaults to PROFILES_DIRECTORY.
+
+    Returns:
+        DataFrame: The "Created" date, "Page", "Series", "Points", "Duration (s)",
+        "Samples" and "Path" of each profile, the most recent first.
+    """
+    profiles = []
+    for path in glob(join(root, "*.collapsed")):
+        with open(path.replace(".collapsed", ".json")) as handle:
+            metadata = load(handle)
+        profiles.append(
+            [
+                metadata["created"],
+                metadata["page"],
+                metadata["series"],
+                metadata["points"],
+                metadata["duration"],
+                metadata["samples"],
+                path,
+            ]
+        )
+    columns = ["Created", "Page", "Series", "Points", "Duration (s)", "Samples", "Path"]
+    return DataFrame(profiles, columns=columns).sort_values(
+        ["Created", "Path"], ascending=False, ignore_index=True
+    )
+
+
+def start_profiler(page: str, state: MutableMapping[str, Any]) -> SamplingProfiler:
+    """
+    Starts the profiling of the current rerun of a page, if the session profiles it (its
+    "profiled_pages"). The profiler of a rerun interrupted before saving its profile is
+    stopped.
+
+    Args:
+        page (str): The page (see PROFILED_PAGES).
+        state (MutableMapping[str, Any]): The session state.
+
+    Returns:
+        SamplingProfiler: The started profiler, None if the page is not profiled.
+    """
+    interrupted = state.pop("profiler", None)
+    if interrupted is not None:
+        interrupted.stop()
+    if page not in state.get("profiled_pages", ()):
+        return None
+    profiler = SamplingProfiler()
+    profiler.start()
+    state["profiler"] = profiler
+    return profiler
+
+
+def stop_profiler(
+    profiler: SamplingProfiler,
+    page: str,
+    state: MutableMapping[str, Any],
+    directory: str = PROFILES_DIRECTORY,
+) -> str:
+    """
+    Stops the profiling of a rerun (see start_profiler) and saves its profile, tagged with
+    the dataset of the session.
+
+    Args:
+        profiler (SamplingProfiler): The profiler of the rerun.
+        page (str): The page.
+        state (MutableMapping[str, Any]): The session state.
+        directory (str, optional): The directory of the profiles. Defaults to
+            PROFILES_DIRECTORY.
+
+    Returns:
+        str: The path of the collapsed stacks file.
+    """
+    state.pop("profiler", None)
+    profiler.stop()
+    return save_profile(profiler, page, state.get("dataset"), directory)
+
+
+_labels = {}
+
+
+def _frame_label(code) -> str:
+    # a function is identified by its first line, the samples of its lines add up
+    label = _labels.get(code)
+    if label is None:
+        label = (
+            f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        )
+        _labels[code] = label.replace(";", ",")
+    return _labels[code]
+
+
+def _short_path(path: str) -> str:
+    # relative to the longest sys.path entry holding it: the package or the app path
+    for root in sorted(filter(None, sys.path), key=len, reverse=True):
+        if path.startswith(root.rstrip("/") + "/"):
+            return relpath(path, root)
+    return path
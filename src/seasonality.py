@@ -0,0 +1,258 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Mapping, Tuple
+
+from numpy import (
+    arange,
+    argmax,
+    asarray,
+    bincount,
+    concatenate,
+    errstate,
+    frexp,
+    full,
+    inf,
+    isin,
+    isnan,
+    maximum,
+    minimum,
+    ndarray,
+    sqrt,
+    where,
+    zeros,
+)
+from numpy.fft import irfft, rfft
+from pandas import DataFrame, Index, Series, concat
+
+from src.space_projection import compute_tsfeatures
+
+
+MIN_CORRELATION = 0.3
+# the multiples of a period peak about as high as the period itself
+HARMONIC_TOLERANCE = 0.2
+MIN_CYCLES = 3
+HARMONICS = 3
+# the autocorrelation of a period, in standard errors of the white noise autocorrelation
+SIGNIFICANCE = 4
+# the number of (series, fft points) values transformed at once
+CHUNK_SIZE = 2**23
+
+
+def padded_matrix(df: DataFrame) -> Tuple[ndarray, ndarray, ndarray]:
+    """
+    Stacks the series of a nixtla panel in a matrix, one row per serie, padded with nan.
+
+    Args:
+        df (DataFrame): The nixtla panel, each serie sorted by ds.
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: [The sorted series names, the (series, max length)
+        values, the length of each serie].
+    """
+    codes, names = df["unique_id"].factorize(sort=True)
+    positions = df.groupby(codes).cumcount().to_numpy()
+    lengths = bincount(codes, minlength=len(names))
+    values = full((len(names), lengths.max(initial=0)), float("nan"))
+    values[codes, positions] = df["y"].to_numpy(dtype=float)
+    return asarray(names), values, lengths
+
+
+def autocorrelations(values: ndarray, max_lag: int) -> ndarray:
+    """
+    Computes the autocorrelations of the linearly detrended rows of a padded matrix, by
+    chunks of rows through their power spectrum. Each lag is averaged over its observed
+    pairs, the missing values contribute nothing.
+
+    Args:
+        values (ndarray): The (series, length) values, padded with nan.
+        max_lag (int): The last lag.
+
+    Returns:
+        ndarray: The (series, max_lag + 1) autocorrelations, 1 at lag 0 (0 for the constant
+        series).
+    """
+    # the fft is long enough for the lags up to max_lag not to wrap around
+    n_fft = 1 << int(values.shape[1] + max_lag).bit_length()
+    acf = zeros((len(values), max_lag + 1))
+    step = max(1, CHUNK_SIZE // n_fft)
+    for start in range(0, len(values), step):
+        rows = slice(start, start + step)
+        residuals, observed = _detrended(values[rows])
+        # the lagged products are averaged over the observed pairs, unbiased
+        covariances, pairs = (
+            irfft(spectrum.real**2 + spectrum.imag**2, n_fft, axis=1)[
+                :, : max_lag + 1
+            ]
+            for spectrum in (
+                rfft(residuals, n_fft, axis=1),
+                rfft(observed, n_fft, axis=1),
+            )
+        )
+        with errstate(divide="ignore", invalid="ignore"):
+            acf[rows] = where(pairs > 0.5, covariances / pairs, 0)
+    with errstate(divide="ignore", invalid="ignore"):
+        acf = where(acf[:, :1] > 0, acf / acf[:, :1], 0)
+    return acf
+
+
+def detect_periods(
+    df: DataFrame,
+    max_period: int = None,
+    min_correlation: float = MIN_CORRELATION,
+    candidates: Iterable[int] = None,
+) -> Series:
+    """
+    Detects the seasonal period of each serie of a panel from its autocorrelation. A period
+    has a significant autocorrelation of at least min_correlation, rising by at least min_correlation
+    above the autocorrelation at the shorter lags (which leaves out the slow decays of the
+    trends and the autoregressions), and is seen at least MIN_CYCLES times. The periods are
+    scored by the mean autocorrelation at their first HARMONICS multiples, sharper than the
+    autocorrelation alone, and the shortest period scoring about as high as the best one is
+    kept (its multiples score as high). The series are padded to the longest one of their
+    bucket of lengths (the same power of 2), a long serie never pads the short ones.
+
+    Args:
+        df (DataFrame): The nixtla panel, each serie sorted by ds.
+        max_period (int, optional): The longest period searched. Defaults to None (a third
+            of the length of each serie).
+        min_correlation (float, optional): The autocorrelation of a period. Defaults to 0.3.
+        candidates (Iterable[int], optional): The only periods searched. Defaults to None
+            (all the lags).
+
+    Returns:
+        Series: The period of each serie, 1 for the non seasonal series, indexed by unique_id.
+    """
+    lengths = df.groupby("unique_id", sort=False).size()
+    buckets = Series(frexp(lengths.to_numpy())[1], index=lengths.index)
+    detected = [
+        _detect_bucket_periods(bucket, max_period, min_correlation, candidates)
+        for _, bucket in df.groupby(df["unique_id"].map(buckets), sort=False)
+    ]
+    if not detected:
+        return Series(1, index=Index([], name="unique_id"), name="period", dtype=int)
+    return concat(detected).sort_index()
+
+
+def compute_grouped_tsfeatures(
+    df: DataFrame,
+    periods: Mapping[str, int],
+    fill_value: int = 0,
+    features: Iterable[str] = None,
+    compute: Callable[..., DataFrame] = compute_tsfeatures,
+    max_workers: int = None,
+    wrap_task: Callable[[Callable], Callable] = None,
+) -> DataFrame:
+    """
+    Computes the tsfeatures of a panel whose series have different seasonal periods: one
+    features computation per period, the periods computed in parallel, their features merged.
+    The features a period does not have (the seasonal ones of the non seasonal series) are
+    filled.
+
+    Args:
+        df (DataFrame): The nixtla panel.
+        periods (Mapping[str, int]): The seasonal period of each serie (see detect_periods),
+            1 for the missing series.
+        fill_value (int, optional): The value to fill the features that cannot be computed. Defaults to 0.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run.
+            Defaults to None (all the tsfeatures default functions).
+        compute (Callable[..., DataFrame], optional): The features computation of a single
+            period, called with df, freq, fill_value and features. Defaults to
+            compute_tsfeatures.
+        max_workers (int, optional): The number of periods computed at once. Defaults to None
+            (all of them).
+        wrap_task (Callable[[Callable], Callable], optional): Applied to each task submitted
+            to the pool, e.g. to profile it with the rerun. Defaults to None.
+
+    Returns:
+        DataFrame: The features of the series, ordered by unique_id.
+    """
+    groups = df.groupby(
+        df["unique_id"].map(Series(periods)).fillna(1).astype(int), sort=True
+    )
+    with ThreadPoolExecutor(
+        max_workers=max_workers or max(1, groups.ngroups),
+        thread_name_prefix="features",
+    ) as executor:
+        task = compute if wrap_task is None else wrap_task(compute)
+        futures = [
+            executor.submit(
+                task,
+                df=group,
+                freq=period,
+                fill_value=fill_value,
+                features=features,
+            )
+            for period, group in groups
+        ]
+        computed = [future.result() for future in futures]
+    return (
+        concat(computed, ignore_index=True)
+        .fillna(value=fill_value)
+        .sort_values("unique_id", ignore_index=True)
+    )
+
+
+def _detrended(values: ndarray) -> Tuple[ndarray, ndarray]:
+    # the residuals of the least squares line of each row, 0 on the missing values
+    observed = ~isnan(values)
+    t = arange(values.shape[1])
+    n = observed.sum(axis=1)
+    sum_t = (observed * t).sum(axis=1)
+    sum_tt = (observed * t**2).sum(axis=1)
+    y = where(observed, values, 0)
+    sum_y, sum_ty = y.sum(axis=1), (y * t).sum(axis=1)
+    with errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sum_ty - sum_t * sum_y) / (n * sum_tt - sum_t**2)
+        slope = where(isnan(slope), 0, slope)
+        intercept = where(n > 0, (sum_y - slope * sum_t) / n, 0)
+    return where(observed, y - intercept[:, None] - slope[:, None] * t, 0), observed
+
+
+def _detect_bucket_periods(
+    df: DataFrame,
+    max_period: int,
+    min_correlation: float,
+    candidates: Iterable[int],
+) -> Series:
+    # the periods of series of similar lengths, stacked in one padded matrix
+    names, values, lengths = padded_matrix(df)
+    limits = lengths // MIN_CYCLES
+    if max_period is not None:
+        limits = minimum(limits, max_period)
+    periods = Series(1, index=Index(names, name="unique_id"), name="period")
+    max_lag = int(limits.max(initial=0))
+    if max_lag < 2:
+        return periods
+
+    # the autocorrelations are reliable up to half the length of the series
+    halves = lengths // 2
+    acf = autocorrelations(values, int(halves.max()))
+    lags = arange(1, max_lag + 2)
+    scores, counts = zeros((len(acf), len(lags))), zeros((len(acf), len(lags)))
+    for multiple in range(1, HARMONICS + 1):
+        harmonics = multiple * lags
+        seen = harmonics <= halves[:, None]
+        scores += where(seen, acf[:, minimum(harmonics, acf.shape[1] - 1)], 0)
+        counts += seen
+    with errstate(divide="ignore", invalid="ignore"):
+        scores = where(counts > 0, scores / counts, -inf)
+
+    correlations = acf[:, lags]
+    rise = correlations - minimum.accumulate(correlations, axis=1)
+    valid = (
+        (scores > concatenate([full((len(acf), 1), inf), scores[:, :-1]], axis=1))
+        & (scores >= concatenate([scores[:, 1:], full((len(acf), 1), -inf)], axis=1))
+        & (lags >= 2)
+        & (lags <= limits[:, None])
+        & (correlations >= min_correlation)
+        # the short series need a stronger autocorrelation
+        & (correlations >= SIGNIFICANCE / sqrt(maximum(lengths[:, None] - lags, 1)))
+        & (rise >= min_correlation)
+    )
+    if candidates is not None:
+        valid &= isin(lags, list(candidates))
+    scores = where(valid, scores, -inf)
+    highest = scores.max(axis=1)
+    best = argmax(scores >= (highest * (1 - HARMONIC_TOLERANCE))[:, None], axis=1)
+    found = highest > -inf
+    periods[found] = lags[best[found]]
+    return periods
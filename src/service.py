@@ -0,0 +1,473 @@
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import monotonic, perf_counter
+from typing import Dict, Iterable, List, Tuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import pickle
+
+from numpy import arange, asarray, float64, ndarray, percentile, float32
+from pandas import DataFrame, Series, concat, read_pickle
+
+from src.cache import LRUCache, content_key
+from src.dimension_reduction import build_reductor
+from src.space_projection import compute_tsfeatures
+from src.utils import build_reduc_dim_df, get_top_five_correlations, preprocess_features
+
+
+PROJECTABLE_ALGORITHMS = ("PCA", "UMAP")
+
+
+class ProjectionModel:
+    """
+    A projection fitted once on a reference features dataset and persisted, so that new series
+    are projected without refitting. It keeps the features columns, the fitted reductor and
+    the top correlated features of each axis.
+    """
+
+    def __init__(self, algorithm: str = "PCA", freq: int = 24) -> None:
+        self.algorithm = algorithm
+        self.freq = freq
+        self.columns_ = None
+        self.reductor_ = None
+        self.correlations_ = None
+
+    def __repr__(self):
+        return f"ProjectionModel\nAlgorithm : {self.algorithm}\nFitted : {self.reductor_ is not None}"
+
+    def fit(self, features: DataFrame) -> "ProjectionModel":
+        """
+        Fit the reductor on a features space projection dataset.
+
+        Args:
+            features (DataFrame): The features space projection dataset (with the "unique_id" column).
+
+        Raises:
+            ValueError: If the algorithm cannot project new series.
+
+        Returns:
+            ProjectionModel: The fitted model.
+        """
+        if self.algorithm not in PROJECTABLE_ALGORITHMS:
+            raise ValueError(f"{self.algorithm} cannot project new series")
+        names, features, features_values = preprocess_features(features, dtype=float32)
+        self.columns_ = list(features.columns)
+        self.reductor_ = build_reductor(self.algorithm, len(names), dtype=float32)
+        embedding = self.reductor_.fit_transform(features_values)
+        reducted_df = build_reduc_dim_df(embedding, serie_names=names)
+        self.correlations_ = get_top_five_correlations(
+            reducted_df.iloc[:, :3], features
+        )
+        return self
+
+    def transform(self, features: DataFrame) -> ndarray:
+        """
+        Project the features of new series, the missing features being filled with 0.
+
+        Args:
+            features (DataFrame): The features of the series (one row per serie).
+
+        Returns:
+            ndarray: The 3d coordinates of the series.
+        """
+        values = features.reindex(columns=self.columns_).to_numpy(
+            dtype=float32, na_value=0
+        )
+        return self.reductor_.transform(values)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "ProjectionModel":
+        with open(path, "rb") as handle:
+            return pickle.load(handle)
+
+
+class FeatureBatcher:
+    """
+    Micro-batches the features computations of concurrent requests: the series submitted
+    within max_wait seconds (up to max_batch series) go through a single tsfeatures call,
+    and identical series (in flight or recently computed) are only computed once.
+    """
+
+    def __init__(
+        self,
+        freq: int = 24,
+        fill_value: int = 0,
+        max_batch: int = 64,
+        max_wait: float = 0.01,
+        n_workers: int = 2,
+        max_entries: int = 1024,
+    ) -> None:
+        self.freq = freq
+        self.fill_value = fill_value
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.results_ = LRUCache(max_bytes=None, max_entries=max_entries)
+        self.batches = 0
+        self.computed = 0
+        self.deduplicated = 0
+        self._pending = {}
+        self._lock = Lock()
+        self._queue = Queue()
+        self._workers = [
+            Thread(target=self._work, daemon=True, name=f"batcher-{index}")
+            for index in range(n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, values: Iterable[float]) -> Future:
+        """
+        Submit a serie to the next batch.
+
+        Args:
+            values (Iterable[float]): The values of the serie.
+
+        Returns:
+            Future: The future features of the serie (a Series).
+        """
+        values = asarray(values, dtype=float64)
+        key = content_key("serie_features", values, self.freq, self.fill_value)
+        with self._lock:
+            if key in self._pending:
+                self.deduplicated += 1
+                return self._pending[key]
+            future = Future()
+            features = self.results_.get(key)
+            if features is not None:
+                self.deduplicated += 1
+                future.set_result(features)
+                return future
+            self._pending[key] = future
+        self._queue.put((key, values))
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "computed": self.computed,
+            "deduplicated": self.deduplicated,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self) -> None:
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self) -> None:
+        while (item := self._queue.get()) is not None:
+            batch = [item]
+            deadline = monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - monotonic()))
+                except Empty:
+                    break
+                if item is None:
+                    # the stop signal belongs to the worker loop, hand it back
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._compute(batch)
+
+    def _compute(self, batch: List[Tuple[str, ndarray]]) -> None:
+        # the content keys are the unique_ids, the results are split back by key
+        frame = concat(
+            [
+                DataFrame({"unique_id": key, "ds": arange(len(values)), "y": values})
+                for key, values in batch
+            ],
+            ignore_index=True,
+        )
+        try:
+            features = compute_tsfeatures(
+                frame, freq=self.freq, fill_value=self.fill_value
+            ).set_index("unique_id")
+        except Exception as error:
+            if len(batch) > 1:
+                # a bad serie fails its batch, each serie is retried on its own
+                for item in batch:
+                    self._compute([item])
+                return
+            with self._lock:
+                self._pending.pop(batch[0][0]).set_exception(error)
+            return
+        with self._lock:
+            self.batches += 1
+            for key, _ in batch:
+                future = self._pending.pop(key)
+                if key not in features.index:
+                    # an empty serie has no row
+                    future.set_exception(ValueError("The serie has no values"))
+                    continue
+                self.computed += 1
+                self.results_.put(key, features.loc[key])
+                future.set_result(features.loc[key])
+
+
+class LatencyRecorder:
+    """
+    Keeps the last latencies of each endpoint and reports their percentiles.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self._samples = {}
+        self._lock = Lock()
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(
+                seconds
+            )
+
+    def percentiles(self, quantiles: Iterable[int] = (50, 90, 99)) -> Dict[str, dict]:
+        """
+        Returns the latency percentiles of each endpoint, in milliseconds.
+
+        Args:
+            quantiles (Iterable[int], optional): The percentiles. Defaults to (50, 90, 99).
+
+        Returns:
+            Dict[str, dict]: The number of requests and the percentiles of each endpoint.
+        """
+        quantiles = list(quantiles)
+        with self._lock:
+            samples = {
+                endpoint: list(values) for endpoint, values in self._samples.items()
+            }
+        report = {}
+        for endpoint, values in samples.items():
+            report[endpoint] = {"count": len(values)}
+            for quantile, value in zip(quantiles, percentile(values, quantiles)):
+                report[endpoint][f"p{quantile}"] = round(1000 * float(value), 3)
+        return report
+
+
+class ProjectionService:
+    """
+    A local HTTP service computing the features and the projection of series with a persisted
+    ProjectionModel.
+
+    Endpoints:
+        GET /health, /stats (latency percentiles and batching counters), /correlations.
+        POST /features and /project, with a {"series": {name: [values]}} payload.
+    """
+
+    def __init__(
+        self,
+        model: ProjectionModel,
+        host: str = "127.0.0.1",
+        port: int = 8600,
+        **batcher_kwargs,
+    ) -> None:
+        self.model = model
+        self.host = host
+        self.port = port
+        self.batcher = FeatureBatcher(freq=model.freq, **batcher_kwargs)
+        self.latencies = LatencyRecorder()
+        self.server_ = None
+        self._thread = None
+
+    def handle(self, method: str, path: str, payload: dict = None) -> Tuple[int, dict]:
+        """
+        Route a request, recording its latency.
+
+        Args:
+            method (str): "GET" or "POST".
+            path (str): The endpoint.
+            payload (dict, optional): The decoded json body. Defaults to None.
+
+        Returns:
+            Tuple[int, dict]: [The HTTP status, the json response].
+        """
+        start = perf_counter()
+        try:
+            match method, path:
+                case "GET", "/health":
+                    response = {"status": "ok", "algorithm": self.model.algorithm}
+                case "GET", "/stats":
+                    response = {
+                        "latencies_ms": self.latencies.percentiles(),
+                        "batching": self.batcher.stats(),
+                    }
+                case "GET", "/correlations":
+                    response = {"correlations": _correlations_json(self.model)}
+                case "POST", "/features":
+                    response = {"features": _records(self._features(payload))}
+                case "POST", "/project":
+                    features = self._features(payload)
+                    coordinates = self.model.transform(features)
+                    response = {
+                        "features": _records(features),
+                        "coordinates": dict(
+                            zip(features.index, coordinates.astype(float).tolist())
+                        ),
+                    }
+                case _:
+                    return 404, {"error": f"Unknown endpoint: {method} {path}"}
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        self.latencies.record(path, perf_counter() - start)
+        return 200, response
+
+    def start(self) -> Tuple[str, int]:
+        """
+        Serve in a background thread (a port of 0 picks a free port).
+
+        Returns:
+            Tuple[str, int]: The address the service listens on.
+        """
+        self.server_ = ThreadingHTTPServer((self.host, self.port), _handler(self))
+        self.server_.daemon_threads = True
+        self._thread = Thread(target=self.server_.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server_.server_address[:2]
+
+    def stop(self) -> None:
+        if self.server_ is not None:
+            self.server_.shutdown()
+            self.server_.server_close()
+            self._thread.join()
+            self.server_ = None
+        self.batcher.close()
+
+    def _features(self, payload: dict) -> DataFrame:
+        series = payload["series"]
+        if not isinstance(series, dict) or not series:
+            raise ValueError(
+                'The payload must map the series names to their values in "series"'
+            )
+        futures = {name: self.batcher.submit(values) for name, values in series.items()}
+        return DataFrame({name: future.result() for name, future in futures.items()}).T
+
+
+class ServiceClient:
+    """
+    A minimal client of the ProjectionService.
+    """
+
+    def __init__(self, url: str, timeout: float = 60) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def features(self, series: Dict[str, Iterable[float]]) -> DataFrame:
+        response = self._request("/features", {"series": _serializable(series)})
+        return DataFrame(response["features"]).T
+
+    def project(self, series: Dict[str, Iterable[float]]) -> DataFrame:
+        response = self._request("/project", {"series": _serializable(series)})
+        return DataFrame(
+            response["coordinates"], index=["fst_dim", "snd_dim", "trd_dim"]
+        ).T
+
+    def correlations(self) -> Dict[str, Series]:
+        response = self._request("/correlations")
+        return {axis: Series(top) for axis, top in response["correlations"].items()}
+
+    def stats(self) -> dict:
+        return self._request("/stats")
+
+    def _request(self, path: str, payload: dict = None) -> dict:
+        data = None if payload is None else dumps(payload).encode()
+        request = Request(
+            self.url + path, data=data, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return loads(response.read())
+        except HTTPError as error:
+            raise RuntimeError(loads(error.read())["error"]) from error
+
+
+def _handler(service: ProjectionService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._respond(*service.handle("GET", self.path))
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = loads(self.rfile.read(length))
+            except ValueError as error:
+                self._respond(400, {"error": f"Invalid json payload: {error}"})
+                return
+            self._respond(*service.handle("POST", self.path, payload))
+
+        def _respond(self, status: int, response: dict) -> None:
+            body = dumps(response).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def _records(features: DataFrame) -> dict:
+    return {name: row.astype(float).to_dict() for name, row in features.iterrows()}
+
+
+def _correlations_json(model: ProjectionModel) -> dict:
+    return {
+        axis: top.astype(float).to_dict() for axis, top in model.correlations_.items()
+    }
+
+
+def _serializable(series: Dict[str, Iterable[float]]) -> dict:
+    return {
+        name: asarray(values, dtype=float).tolist() for name, values in series.items()
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Local features and projection service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit = commands.add_parser("fit", help="Fit and persist a projection model.")
+    fit.add_argument("features", help="A pickled features dataset (with unique_id).")
+    fit.add_argument("model", help="The path of the persisted model.")
+    fit.add_argument("--algorithm", choices=PROJECTABLE_ALGORITHMS, default="PCA")
+    fit.add_argument("--freq", type=int, default=24)
+    serve = commands.add_parser("serve", help="Serve a persisted projection model.")
+    serve.add_argument("model", help="The path of the persisted model.")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8600)
+    serve.add_argument("--workers", type=int, default=2)
+    arguments = parser.parse_args()
+
+    if arguments.command == "fit":
+        model = ProjectionModel(arguments.algorithm, arguments.freq)
+        model.fit(read_pickle(arguments.features)).save(arguments.model)
+        return
+    service = ProjectionService(
+        ProjectionModel.load(arguments.model),
+        host=arguments.host,
+        port=arguments.port,
+        n_workers=arguments.workers,
+    )
+    host, port = service.start()
+    print(f"Serving {service.model.algorithm} projections on http://{host}:{port}")
+    try:
+        service._thread.join()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
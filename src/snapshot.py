@@ -0,0 +1,373 @@
+from datetime import datetime, timezone
+from glob import glob
+from hashlib import sha256
+from hmac import compare_digest, new as hmac
+from json import dump, dumps, load
+from os import O_CREAT, O_EXCL, O_WRONLY, environ, makedirs, open as open_file, replace
+from os.path import basename, commonpath, dirname, exists, join, realpath
+from re import fullmatch
+from secrets import token_bytes
+from shutil import rmtree
+from tempfile import mkdtemp
+from typing import Any, Dict, List, Mapping, Tuple
+import pickle
+
+from numpy import load as load_array, ndarray, save as save_array
+from pandas import DataFrame, RangeIndex
+
+from src.export import read_export, to_table, write_table
+from src.partitioning import PartitionedDataset
+
+
+SNAPSHOTS_DIRECTORY = "snapshots"
+SNAPSHOT_VERSION = 1
+MANIFEST = "manifest.json"
+# the names of the snapshots and of their owners, a path component each
+SNAPSHOT_NAME = r"[A-Za-z0-9_-]+"
+# the key the manifests are signed with, read from FBP_SNAPSHOT_KEY or from this file of
+# the snapshots directory, created on first use
+KEY_FILE = ".signing_key"
+# the frames of the session state, stored as memory mappable arrow files
+SNAPSHOT_TABLES = ("dataset", "features", "summary", "approximations")
+# the small values of the session state, pickled together
+SNAPSHOT_VALUES = (
+    "period",
+    "periods",
+    "features_key",
+    "features_source",
+    "budget",
+    "plan",
+    "embedding_keys",
+    "selection",
+)
+
+
+def file_checksum(path: str, chunk_size: int = 2**20) -> str:
+    """
+    Computes the sha256 of a file, read by chunks.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int, optional): The bytes read at once. Defaults to 1 MB.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = sha256()
+    with open(path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def signing_key(root: str = SNAPSHOTS_DIRECTORY) -> bytes:
+    """
+    Returns the secret key of the server the manifests are signed with: the hexadecimal
+    FBP_SNAPSHOT_KEY environment variable, or a random key kept in the snapshots directory.
+
+    Args:
+        root (str, optional): The snapshots directory. Defaults to SNAPSHOTS_DIRECTORY.
+
+    Returns:
+        bytes: The key.
+    """
+    if "FBP_SNAPSHOT_KEY" in environ:
+        return bytes.fromhex(environ["FBP_SNAPSHOT_KEY"])
+    makedirs(root, exist_ok=True)
+    path = join(root, KEY_FILE)
+    try:
+        # readable by the server user only, never overwritten by a concurrent session
+        with open(open_file(path, O_CREAT | O_EXCL | O_WRONLY, 0o600), "wb") as handle:
+            handle.write(token_bytes(32))
+    except FileExistsError:
+        pass
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+def owner_directory(owner_key: str) -> str:
+    """
+    The directory name of the snapshots of an owner: the digest of their secret key, the
+    sessions that do not know it cannot list nor restore them.
+
+    Args:
+        owner_key (str): The secret key of the owner.
+
+    Returns:
+        str: The directory name.
+    """
+    return sha256(owner_key.encode()).hexdigest()[:32]
+
+
+def snapshot_directory(owner: str, name: str, root: str = SNAPSHOTS_DIRECTORY) -> str:
+    """
+    Resolves the bundle directory of a snapshot of an owner, under the snapshots directory.
+
+    Args:
+        owner (str): The owner directory (see owner_directory).
+        name (str): The snapshot name, letters, digits, "_" and "-" only.
+        root (str, optional): The snapshots directory. Defaults to SNAPSHOTS_DIRECTORY.
+
+    Raises:
+        ValueError: If the owner or the name is not a plain name, or if the directory
+            resolves outside of the snapshots directory (a symbolic link).
+
+    Returns:
+        str: The bundle directory.
+    """
+    for value in (owner, name):
+        if not isinstance(value, str) or not fullmatch(SNAPSHOT_NAME, value):
+            raise ValueError(
+                f"Invalid snapshot name {value!r}: letters, digits, _ and - only"
+            )
+    root = realpath(root)
+    directory = realpath(join(root, owner, name))
+    if commonpath([root, directory]) != root:
+        raise ValueError(f"The snapshot {name} is outside of the snapshots directory")
+    return directory
+
+
+def save_snapshot(
+    state: Mapping[str, Any],
+    directory: str,
+    embeddings: Mapping[str, ndarray] = None,
+    key: bytes = None,
+) -> str:
+    """
+    Saves the analysis state of a session in a bundle directory: the frames as Arrow IPC
+    files, the embeddings as .npy arrays, the small values pickled, all of them checksummed
+    in the manifest, itself signed with the key of the server. A partitioned dataset is
+    referenced by its directory. The bundle is written aside and moved in place, the files
+    of a snapshot of the same name, memory mapped by a session that restored it, are
+    unlinked and never rewritten.
+
+    Args:
+        state (Mapping[str, Any]): The session state (SNAPSHOT_TABLES, SNAPSHOT_VALUES and
+            "previous_embeddings", the missing entries being left out).
+        directory (str): The bundle directory, replaced if it exists (see
+            snapshot_directory).
+        embeddings (Mapping[str, ndarray], optional): The embeddings by shared cache key
+            (see embedding_key). Defaults to None.
+        key (bytes, optional): The signing key. Defaults to None (see signing_key).
+
+    Returns:
+        str: The path of the manifest.
+    """
+    parent = dirname(realpath(directory))
+    makedirs(parent, exist_ok=True)
+    staging = mkdtemp(prefix=f".{basename(directory)}-", dir=parent)
+    try:
+        _write_snapshot(state, staging, embeddings, key)
+    except BaseException:
+        rmtree(staging, ignore_errors=True)
+        raise
+    _replace_directory(staging, directory)
+    return join(directory, MANIFEST)
+
+
+def load_snapshot(
+    directory: str, verify: bool = True, key: bytes = None
+) -> Tuple[Dict[str, Any], Dict[str, ndarray]]:
+    """
+    Loads a bundle saved by save_snapshot. The manifest signature is checked before anything
+    is read, the pickled values are only loaded from a bundle written by this server. The
+    numeric columns of the tables and the embeddings are read only views on the memory
+    mapped files, the other columns (names, dates) are converted.
+
+    Args:
+        directory (str): The bundle directory (see snapshot_directory).
+        verify (bool, optional): Whether to check the checksums of the files, the pickled
+            values being always checked. Defaults to True.
+        key (bytes, optional): The signing key. Defaults to None (see signing_key).
+
+    Raises:
+        ValueError: If the bundle is not a snapshot, of another version, not signed by the
+            key, if a file is missing or corrupted, or if its partitioned dataset was
+            removed.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, ndarray]]: [The session state, the embeddings by
+        shared cache key].
+    """
+    manifest_path = join(directory, MANIFEST)
+    if not exists(manifest_path):
+        raise ValueError(f"{directory} is not a snapshot")
+    with open(manifest_path) as handle:
+        manifest = load(handle)
+    signature = manifest.pop("signature", "")
+    if not compare_digest(signature, _signature(manifest, key or signing_key())):
+        raise ValueError(f"{directory} was not saved by this server")
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest['version']}")
+    for file_name, checksum in manifest["files"].items():
+        path = join(directory, file_name)
+        if not exists(path):
+            raise ValueError(f"Missing snapshot file: {file_name}")
+        if (verify or file_name == "values.pickle") and file_checksum(path) != checksum:
+            raise ValueError(f"Corrupted snapshot file: {file_name}")
+
+    with open(join(directory, "values.pickle"), "rb") as handle:
+        state = pickle.load(handle)
+    for name, index in manifest["tables"].items():
+        state[name] = _read_frame(join(directory, name), index)
+    if manifest["partitioned_dataset"] is not None:
+        if not PartitionedDataset.is_partitioned(manifest["partitioned_dataset"]):
+            raise ValueError(
+                f"The partitioned dataset {manifest['partitioned_dataset']} was removed"
+            )
+        state["dataset"] = PartitionedDataset(manifest["partitioned_dataset"])
+
+    state["previous_embeddings"] = {}
+    for algorithm, previous in manifest["previous_embeddings"].items():
+        source = None
+        if previous["source"]:
+            source = _read_layout(join(directory, f"source_{algorithm}"))
+        state["previous_embeddings"][algorithm] = (
+            previous["features_key"],
+            _read_layout(join(directory, f"previous_{algorithm}")),
+            source,
+        )
+    embeddings = {
+        key: load_array(join(directory, file_name), mmap_mode="r")
+        for key, file_name in manifest["embeddings"].items()
+    }
+    return state, embeddings
+
+
+def list_snapshots(owner: str, root: str = SNAPSHOTS_DIRECTORY) -> DataFrame:
+    """
+    Lists the snapshots of an owner.
+
+    Args:
+        owner (str): The owner directory (see owner_directory).
+        root (str, optional): The snapshots directory. Defaults to SNAPSHOTS_DIRECTORY.
+
+    Returns:
+        DataFrame: The "Snapshot" name, "Created" date and "Path" of each bundle, the most
+        recent first.
+    """
+    snapshots = []
+    for manifest_path in glob(join(root, owner, "*", MANIFEST)):
+        with open(manifest_path) as handle:
+            created = load(handle)["created"]
+        directory = dirname(manifest_path)
+        snapshots.append([basename(directory), created, directory])
+    return DataFrame(snapshots, columns=["Snapshot", "Created", "Path"]).sort_values(
+        "Created", ascending=False, ignore_index=True
+    )
+
+
+def _write_snapshot(
+    state: Mapping[str, Any],
+    directory: str,
+    embeddings: Mapping[str, ndarray],
+    key: bytes,
+) -> None:
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "tables": {},
+        "embeddings": {},
+        "previous_embeddings": {},
+        "partitioned_dataset": None,
+        "files": {},
+    }
+    written = ["values.pickle"]
+
+    for name in SNAPSHOT_TABLES:
+        frame = state.get(name)
+        if isinstance(frame, PartitionedDataset):
+            manifest["partitioned_dataset"] = frame.directory
+        elif isinstance(frame, DataFrame):
+            manifest["tables"][name] = _write_frame(frame, join(directory, name))
+            written.append(f"{name}.arrow")
+
+    # the layouts the warm starts continue from, with the key of their features and the
+    # layout their own warm start continued from
+    for algorithm, (features_key, frame, source) in state.get(
+        "previous_embeddings", {}
+    ).items():
+        written += _write_layout(frame, join(directory, f"previous_{algorithm}"))
+        if source is not None:
+            written += _write_layout(source, join(directory, f"source_{algorithm}"))
+        manifest["previous_embeddings"][algorithm] = {
+            "features_key": features_key,
+            "source": source is not None,
+        }
+
+    for i, (cache_key, embedding) in enumerate((embeddings or {}).items()):
+        file_name = f"embedding_{i}.npy"
+        save_array(join(directory, file_name), embedding)
+        manifest["embeddings"][cache_key] = file_name
+        written.append(file_name)
+
+    values = {name: state[name] for name in SNAPSHOT_VALUES if name in state}
+    with open(join(directory, "values.pickle"), "wb") as handle:
+        pickle.dump(values, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    manifest["files"] = {
+        file_name: file_checksum(join(directory, file_name))
+        for file_name in sorted(written)
+    }
+    manifest["signature"] = _signature(manifest, key or signing_key())
+    with open(join(directory, MANIFEST), "w") as handle:
+        dump(manifest, handle, indent=1)
+
+
+def _replace_directory(staging: str, directory: str) -> None:
+    # a directory is only renamed over an empty one, the old bundle is moved aside first
+    if not exists(directory):
+        replace(staging, directory)
+        return
+    replaced = mkdtemp(
+        prefix=f".{basename(directory)}-", dir=dirname(realpath(directory))
+    )
+    replace(directory, replaced)
+    replace(staging, directory)
+    rmtree(replaced)
+
+
+def _signature(manifest: Mapping[str, Any], key: bytes) -> str:
+    # the checksums of the files are part of the signed manifest
+    return hmac(key, dumps(manifest, sort_keys=True).encode(), sha256).hexdigest()
+
+
+def _write_frame(frame: DataFrame, path: str) -> Any:
+    # the index is kept as columns, its names recorded to set it back
+    index = None
+    if not isinstance(frame.index, RangeIndex):
+        index = [name or "index" for name in frame.index.names]
+        frame = frame.reset_index(names=index)
+    write_table(to_table(frame, {"kind": basename(path)}), f"{path}.arrow")
+    return index
+
+
+def _write_layout(frame: DataFrame, path: str) -> List[str]:
+    # the coordinates as a .npy array, the names of the series as an arrow file
+    save_array(f"{path}.npy", frame.to_numpy())
+    _write_frame(DataFrame({"Name": frame.index}), path)
+    return [f"{basename(path)}.npy", f"{basename(path)}.arrow"]
+
+
+def _read_layout(path: str) -> DataFrame:
+    names = _read_frame(path, None)["Name"]
+    values = load_array(f"{path}.npy", mmap_mode="r")
+    return DataFrame(values, index=names.to_numpy())
+
+
+def _read_frame(path: str, index: Any) -> DataFrame:
+    from pyarrow.types import is_floating, is_integer
+
+    table, _ = read_export(f"{path}.arrow")
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        numeric = is_integer(column.type) or is_floating(column.type)
+        if numeric and column.num_chunks == 1 and column.null_count == 0:
+            columns[name] = column.chunk(0).to_numpy(zero_copy_only=True)
+        else:
+            columns[name] = column.to_pandas()
+    frame = DataFrame(columns, copy=False)
+    if index is not None:
+        # inplace, set_index would copy the mapped columns otherwise
+        frame.set_index(index, inplace=True)
+    return frame
@@ -1,12 +1,29 @@
 from sklearn.neighbors import KernelDensity
-from pandas import DataFrame
-from numpy import linspace, exp, ndarray, diff, arange
+from pandas import DataFrame, concat
+from numpy import (
+    linspace,
+    repeat,
+    unique,
+    exp,
+    ndarray,
+    diff,
+    arange,
+    abs as nabs,
+    zeros,
+    concatenate,
+    flatnonzero,
+    maximum,
+)
 from numpy.fft import fftfreq
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.fft import fft
 from scipy.signal import welch, cwt, ricker
-from tsfeatures import tsfeatures
-from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+from inspect import signature
+from multiprocessing import get_context
+from typing import Callable, Iterable, List, Tuple
 
+from src.cache import LRUCache
 from src.utils import compute_differenciated_serie
 
 
@@ -81,8 +98,116 @@ def compute_wavelets(
     return widths, wavelet, cwt(time_series, wavelet, widths)
 
 
+class WaveletScalogram:
+    """
+    A tiled, multi-resolution continuous wavelet transform (ricker) of a serie. Full resolution
+    tiles are only computed for the requested time windows and cached, wider windows are
+    max-pooled down to a bounded number of points.
+    """
+
+    def __init__(
+        self,
+        serie: DataFrame,
+        frequency: int = 24,
+        tile_size: int = 4096,
+        max_points: int = 2048,
+        max_tiles: int = 64,
+    ) -> None:
+        self.time_series = compute_differenciated_serie(serie)
+        self.widths = arange(1, frequency + 10)
+        self.max_points = max_points
+        # the tiles overlap by a full kernel so that they match the transform of the whole serie
+        self.margin = 10 * int(self.widths.max())
+        self.tile_size = max(tile_size, self.margin)
+        self.tiles_ = LRUCache(max_bytes=None, max_entries=max_tiles)
+        self.overview_ = None
+
+    def __repr__(self):
+        return f"WaveletScalogram\nLength : {self.n}\nCached tiles : {len(self.tiles_)}"
+
+    @property
+    def n(self) -> int:
+        return len(self.time_series)
+
+    def tile(self, index: int) -> ndarray:
+        """
+        Returns the full resolution magnitude of the transform on a tile.
+
+        Args:
+            index (int): The tile index, covering [index * tile_size, (index + 1) * tile_size).
+
+        Returns:
+            ndarray: The (widths, tile length) magnitude of the transform.
+        """
+        result = self.tiles_.get(index)
+        if result is None:
+            start = index * self.tile_size
+            stop = min(start + self.tile_size, self.n)
+            if self.n <= self.tile_size + 2 * self.margin:
+                lower, upper = 0, self.n
+            else:
+                lower = max(0, start - self.margin)
+                upper = min(self.n, stop + self.margin)
+            transform = cwt(self.time_series[lower:upper], ricker, self.widths)
+            result = nabs(transform[:, start - lower : stop - lower])
+            self.tiles_.put(index, result)
+        return result
+
+    def window(self, start: int = 0, stop: int = None) -> Tuple[ndarray, ndarray]:
+        """
+        Returns the magnitude of the transform on a time window, at full resolution if the
+        window fits in max_points, max-pooled down to max_points otherwise.
+
+        Args:
+            start (int, optional): The first time index. Defaults to 0.
+            stop (int, optional): The last time index (excluded). Defaults to the serie length.
+
+        Returns:
+            Tuple[ndarray, ndarray]: [The time index of each column, the (widths, points) magnitude].
+        """
+        stop = self.n if stop is None else min(stop, self.n)
+        overview = start == 0 and stop == self.n
+        if overview and self.overview_ is not None:
+            return self.overview_
+
+        factor = max(1, -(-(stop - start) // self.max_points))
+        n_bins = -(-(stop - start) // factor)
+        magnitude = zeros((len(self.widths), n_bins))
+        for index in range(start // self.tile_size, -(-stop // self.tile_size)):
+            offset = index * self.tile_size
+            lower = max(start, offset)
+            segment = self.tile(index)[:, lower - offset : stop - offset]
+            # each tile is pooled into bins aligned on the window start, bins
+            # straddling two tiles keep the max of both parts
+            bins = (arange(lower, lower + segment.shape[1]) - start) // factor
+            firsts = concatenate([[0], flatnonzero(diff(bins)) + 1])
+            pooled = maximum.reduceat(segment, firsts, axis=1)
+            magnitude[:, bins[firsts]] = maximum(magnitude[:, bins[firsts]], pooled)
+        time_index = arange(start, stop, factor)
+
+        if overview:
+            self.overview_ = (time_index, magnitude)
+        return time_index, magnitude
+
+
+# the tsfeatures functions whose outputs depend on the seasonal period
+PERIOD_DEPENDENT_FEATURES = (
+    "acf_features",
+    "pacf_features",
+    "lumpiness",
+    "stability",
+    "stl_features",
+    "hw_parameters",
+)
+# the outputs of the period dependent functions only computed for the seasonal series
+SEASONAL_COLUMNS = ("seas_acf1", "seas_pacf", "seasonal_strength", "peak", "trough")
+
+
 def compute_tsfeatures(
-    df: DataFrame, freq: int = None, fill_value: int = 0
+    df: DataFrame,
+    freq: int = None,
+    fill_value: int = 0,
+    features: Iterable[str] = None,
 ) -> DataFrame:
     """
     Given a dataset of time series and their seasonal frequency computes the Hyndman's tsfeatures of each serie.
@@ -91,9 +216,187 @@ def compute_tsfeatures(
         df (DataFrame): The dataset containing the time series to project in the feature space.
         freq (int, optional): The seasonal frequency of the series. Defaults to None.
         fill_value (int, optional): The value to fill the features that cannot be computed. Defaults to 0.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run (see
+            FEATURE_TIERS). Defaults to None (all the tsfeatures default functions).
 
     Returns:
         DataFrame: The dataframe of the series projected in the features space.
     """
-    features = tsfeatures(df, freq=freq)
+    import tsfeatures as ts
+
+    functions = {}
+    if features is not None:
+        functions["features"] = [getattr(ts, name) for name in features]
+    # tsfeatures forks its pool, and a fork of a process whose numba threads (UMAP,
+    # NN-descent) hold a lock deadlocks the children: it runs in a process started by a
+    # forkserver, free of those threads
+    context = get_context("forkserver")
+    context.set_forkserver_preload(["tsfeatures"])
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        features = executor.submit(ts.tsfeatures, df, freq=freq, **functions).result()
     return features.fillna(value=fill_value)
+
+
+def recompute_tsfeatures(
+    df: DataFrame,
+    previous: DataFrame,
+    freq: int = None,
+    fill_value: int = 0,
+    features: Iterable[str] = None,
+    compute: Callable[..., DataFrame] = compute_tsfeatures,
+    stale: Iterable[str] = (),
+) -> DataFrame:
+    """
+    Recomputes the tsfeatures of a panel after a change of its seasonal period: only the
+    period dependent functions (PERIOD_DEPENDENT_FEATURES) are run again, the other features
+    are taken from the previous features. The series missing from the previous features, or
+    whose values changed (stale), are fully computed.
+
+    Args:
+        df (DataFrame): The nixtla panel.
+        previous (DataFrame): The features of the panel computed with another period, and
+            the same functions.
+        freq (int, optional): The new seasonal frequency of the series. Defaults to None.
+        fill_value (int, optional): The value to fill the features that cannot be computed. Defaults to 0.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run.
+            Defaults to None (all the tsfeatures default functions).
+        compute (Callable[..., DataFrame], optional): The features computation, called with
+            df, freq, fill_value and features. Defaults to compute_tsfeatures.
+        stale (Iterable[str], optional): The series to fully compute. Defaults to ().
+
+    Returns:
+        DataFrame: The features of the series ordered by unique_id, the columns in the order
+        of the previous features.
+    """
+    if features is None:
+        import tsfeatures as ts
+
+        defaults = signature(ts.tsfeatures).parameters["features"].default
+        features = [function.__name__ for function in defaults]
+    dependent = [name for name in features if name in PERIOD_DEPENDENT_FEATURES]
+    previous = previous[~previous["unique_id"].isin(stale)].set_index("unique_id")
+    reused = df["unique_id"].isin(previous.index)
+
+    computed = []
+    if not reused.all():
+        computed.append(
+            compute(df[~reused], freq=freq, fill_value=fill_value, features=features)
+        )
+    if reused.any():
+        names = df.loc[reused, "unique_id"].unique()
+        updated = DataFrame(index=names)
+        if dependent:
+            updated = compute(
+                df[reused], freq=freq, fill_value=fill_value, features=dependent
+            ).set_index("unique_id")
+        kept = previous.loc[names].drop(
+            columns=[
+                column
+                for column in previous.columns
+                if column in updated.columns or column in SEASONAL_COLUMNS
+            ]
+        )
+        computed.append(kept.join(updated).rename_axis("unique_id").reset_index())
+
+    result = concat(computed, ignore_index=True).fillna(value=fill_value)
+    columns = ["unique_id", *previous.columns]
+    order = [column for column in columns if column in result.columns]
+    order += [column for column in result.columns if column not in order]
+    return result[order].sort_values("unique_id", ignore_index=True)
+
+
+def window_panel(
+    df: DataFrame, window: int, step: int = 1
+) -> Tuple[DataFrame, DataFrame]:
+    """
+    Cuts each serie of a nixtla panel into sliding windows of window points, every step
+    points. The windows are strided views over the values of each serie, only the windows
+    kept are copied, once, into the panel of windows. The series shorter than a window are
+    left out.
+
+    Args:
+        df (DataFrame): The nixtla panel (unique_id, ds, y), each serie sorted by ds.
+        window (int): The number of points of a window.
+        step (int, optional): The number of points between two window starts. Defaults to 1.
+
+    Raises:
+        ValueError: If the window or the step is not positive.
+
+    Returns:
+        Tuple[DataFrame, DataFrame]: [The nixtla panel of the windows, one unique_id per
+        window, the "unique_id", "Name" (of the serie) and "Start" (ds) of each window].
+    """
+    if window < 1 or step < 1:
+        raise ValueError("The window and the step must be positive")
+    # a stable sort keeps the order of the points of each serie
+    df = df.sort_values("unique_id", kind="stable")
+    names, firsts, lengths = unique(
+        df["unique_id"].to_numpy(), return_index=True, return_counts=True
+    )
+    ds, y = df["ds"].to_numpy(), df["y"].to_numpy()
+    kept, ds_windows, y_windows = [], [], []
+    for name, first, length in zip(names, firsts, lengths):
+        if length < window:
+            continue
+        serie = slice(first, first + length)
+        kept.append(name)
+        ds_windows.append(sliding_window_view(ds[serie], window)[::step])
+        y_windows.append(sliding_window_view(y[serie], window)[::step])
+    if not kept:
+        return DataFrame(columns=["unique_id", "ds", "y"]), DataFrame(
+            columns=["unique_id", "Name", "Start"]
+        )
+    counts = [len(view) for view in y_windows]
+    # the only copy of the values, window by window
+    ds_windows, y_windows = concatenate(ds_windows), concatenate(y_windows)
+    windows = DataFrame({"Name": repeat(kept, counts), "Start": ds_windows[:, 0]})
+    windows.insert(
+        0,
+        "unique_id",
+        [f"{name}@{start}" for name, start in zip(windows["Name"], windows["Start"])],
+    )
+    panel = DataFrame(
+        {
+            "unique_id": repeat(windows["unique_id"].to_numpy(), window),
+            "ds": ds_windows.ravel(),
+            "y": y_windows.ravel(),
+        }
+    )
+    return panel, windows
+
+
+def compute_window_tsfeatures(
+    df: DataFrame,
+    window: int,
+    step: int = 1,
+    freq: int = None,
+    fill_value: int = 0,
+    features: Iterable[str] = None,
+) -> DataFrame:
+    """
+    Computes the tsfeatures of the sliding windows of each serie (see window_panel), all the
+    windows of the panel in a single batched tsfeatures call.
+
+    Args:
+        df (DataFrame): The nixtla panel of the series.
+        window (int): The number of points of a window.
+        step (int, optional): The number of points between two window starts. Defaults to 1.
+        freq (int, optional): The seasonal frequency of the series. Defaults to None.
+        fill_value (int, optional): The value to fill the features that cannot be computed. Defaults to 0.
+        features (Iterable[str], optional): The names of the tsfeatures functions to run.
+            Defaults to None (all the tsfeatures default functions).
+
+    Returns:
+        DataFrame: The "Name" and "Start" of each window, followed by its features, ordered by
+        serie and start.
+    """
+    panel, windows = window_panel(df, window, step)
+    if windows.empty:
+        return windows.drop(columns="unique_id")
+    features = compute_tsfeatures(
+        panel, freq=freq, fill_value=fill_value, features=features
+    )
+    windows = windows.merge(features, on="unique_id", how="left")
+    return windows.drop(columns="unique_id").sort_values(
+        ["Name", "Start"], ignore_index=True
+    )
@@ -0,0 +1,150 @@
+from argparse import ArgumentParser
+from json import dumps
+from subprocess import run
+from time import perf_counter
+from typing import Dict, Iterable
+import os
+import sys
+
+from pandas import DataFrame
+
+
+# the modules imported by the pages, and the heavy dependencies they must only load on use
+APP_MODULES = (
+    "src.cache",
+    "src.utils",
+    "src.plotting_tools",
+    "src.space_projection",
+    "src.dimension_reduction",
+    "src.neighbors",
+    "src.views",
+    "src.partitioning",
+)
+HEAVY_MODULES = ("umap", "pynndescent", "tsfeatures", "statsforecast", "numba")
+
+
+def import_time(module: str) -> Dict[str, float]:
+    """
+    Measures the cold import of a module in a fresh interpreter, with python -X importtime.
+
+    Args:
+        module (str): The module to import.
+
+    Raises:
+        ImportError: If the module cannot be imported.
+
+    Returns:
+        Dict[str, float]: The module, its cumulative import time (ms), the whole interpreter
+        run time (ms) and the heavy modules it loads.
+    """
+    start = perf_counter()
+    process = run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    wall_time = perf_counter() - start
+    if process.returncode != 0:
+        raise ImportError(process.stderr.strip().splitlines()[-1])
+
+    cumulative, loaded = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        name = name.strip()
+        if name in HEAVY_MODULES:
+            loaded.add(name)
+        if name == module:
+            cumulative = int(cumulative_us)
+    return {
+        "Module": module,
+        "Import time (ms)": round(cumulative / 1000, 1),
+        "Interpreter time (ms)": round(1000 * wall_time, 1),
+        "Heavy modules loaded": ", ".join(sorted(loaded)),
+    }
+
+
+def import_times(modules: Iterable[str] = APP_MODULES) -> DataFrame:
+    """
+    Measures the cold import of each module (see import_time).
+
+    Args:
+        modules (Iterable[str], optional): The modules. Defaults to APP_MODULES.
+
+    Returns:
+        DataFrame: One row per module.
+    """
+    return DataFrame([import_time(module) for module in modules])
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Runs the numba-compiled code paths (UMAP, NN-descent and tsfeatures) once on a small
+    synthetic panel, so that the functions compiled with cache=True are written to numba's
+    on-disk cache (NUMBA_CACHE_DIR). Meant to run at image build time.
+
+    Returns:
+        Dict[str, float]: The duration (s) of each step.
+    """
+    from numpy import arange, float32, repeat, tile
+    from numpy.random import default_rng
+
+    from src.dimension_reduction import UMAPReductor
+    from src.neighbors import build_knn_graph
+    from src.space_projection import compute_tsfeatures
+    from src.utils import inject_toy_series
+
+    rng = default_rng(0)
+    durations = {}
+
+    start = perf_counter()
+    X = rng.normal(size=(300, 10)).astype(float32)
+    graph = build_knn_graph(X, 16, random_state=0, exact_threshold=0)
+    durations["NN-descent"] = perf_counter() - start
+
+    # the seeded and the fast (multi-threaded) UMAP compile different functions
+    start = perf_counter()
+    for random_state in (0, None):
+        UMAPReductor(random_state=random_state, knn_graph=graph).fit_transform(X)
+    durations["UMAP"] = perf_counter() - start
+
+    start = perf_counter()
+    panel = DataFrame(
+        {
+            "unique_id": repeat(["A", "B"], 200),
+            "ds": tile(arange(200), 2),
+            "y": rng.normal(size=400).cumsum(),
+        }
+    )
+    compute_tsfeatures(inject_toy_series(panel), freq=24)
+    durations["tsfeatures"] = perf_counter() - start
+    return durations
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Cold start tooling.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("warmup", help="Populate the numba on-disk cache.")
+    benchmark = commands.add_parser(
+        "benchmark", help="Measure the modules import time."
+    )
+    benchmark.add_argument("modules", nargs="*", default=list(APP_MODULES))
+    benchmark.add_argument("--json", action="store_true", help="Print json records.")
+    arguments = parser.parse_args()
+
+    if arguments.command == "warmup":
+        for step, duration in warm_up().items():
+            print(f"{step}: {duration:.1f}s", flush=True)
+        # the caches are written at compilation time, and the threads started by the
+        # tsfeatures dependencies can deadlock the interpreter shutdown of an image build
+        os._exit(0)
+    times = import_times(arguments.modules)
+    if arguments.json:
+        print(dumps(times.to_dict(orient="records")))
+    else:
+        print(times.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+from typing import Iterable, Union
+
+from numpy import (
+    arange,
+    argsort,
+    bincount,
+    concatenate,
+    cumsum,
+    errstate,
+    flatnonzero,
+    floor,
+    lexsort,
+    nan,
+    ndarray,
+    sqrt,
+)
+from numpy.random import default_rng
+from pandas import DataFrame, Series, concat
+
+from src.partitioning import PartitionedDataset
+
+
+QUANTILES = (0.25, 0.5, 0.75)
+SUMMARY_COLUMNS = [
+    "count",
+    "mean",
+    "std",
+    "min",
+    "25%",
+    "50%",
+    "75%",
+    "max",
+    "skew",
+    "kurt",
+]
+# the series longer than this have their quantiles estimated on a sketch
+EXACT_QUANTILES_THRESHOLD = 100_000
+SKETCH_SIZE = 8192
+
+
+def summarize_panel(
+    df: DataFrame,
+    exact_threshold: int = EXACT_QUANTILES_THRESHOLD,
+    sketch_size: int = SKETCH_SIZE,
+    random_state: int = 0,
+) -> DataFrame:
+    """
+    Computes the statistics of advanced_describe (count, mean, std, quartiles, min, max, skew
+    and kurtosis) of every serie of a panel at once, with grouped sums over the whole panel
+    instead of one pandas call per serie. The quartiles of the series longer than
+    exact_threshold are estimated on a uniform sample of sketch_size points (a rank error of
+    about 1/sqrt(sketch_size)).
+
+    Args:
+        df (DataFrame): The nixtla panel (unique_id, ds, y).
+        exact_threshold (int, optional): The length above which the quartiles are estimated.
+            Defaults to 100000.
+        sketch_size (int, optional): The number of points of a quartiles sketch. Defaults to 8192.
+        random_state (int, optional): The seed of the sketches. Defaults to 0.
+
+    Returns:
+        DataFrame: One row per serie (indexed by unique_id), the SUMMARY_COLUMNS and whether
+        its quartiles are "approximate".
+    """
+    df = df.loc[df["y"].notna(), ["unique_id", "y"]]
+    codes, names = df["unique_id"].factorize(sort=True)
+    y = df["y"].to_numpy(dtype=float)
+    n_series = len(names)
+
+    count = bincount(codes, minlength=n_series).astype(float)
+    mean = bincount(codes, weights=y, minlength=n_series) / count
+    centered = y - mean[codes]
+    squares = centered**2
+    m2 = bincount(codes, weights=squares, minlength=n_series)
+    m3 = bincount(codes, weights=squares * centered, minlength=n_series)
+    m4 = bincount(codes, weights=squares**2, minlength=n_series)
+
+    summary = DataFrame(index=names.rename("unique_id"), columns=SUMMARY_COLUMNS)
+    summary["count"] = count.astype(int)
+    summary["mean"] = mean
+    with errstate(divide="ignore", invalid="ignore"):
+        summary["std"] = sqrt(m2 / (count - 1))
+        # the bias corrected estimators of pandas skew and kurtosis
+        summary["skew"] = count * sqrt(count - 1) / (count - 2) * m3 / m2**1.5
+        summary["kurt"] = (count + 1) * count * (count - 1) / (
+            (count - 2) * (count - 3)
+        ) * m4 / m2**2 - 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+    summary.loc[count < 3, "skew"] = nan
+    summary.loc[count < 4, "kurt"] = nan
+    summary.loc[m2 == 0, ["skew", "kurt"]] = 0.0
+
+    extremes = Series(y).groupby(codes).agg(["min", "max"])
+    summary["min"], summary["max"] = extremes["min"].values, extremes["max"].values
+
+    approximate = count > exact_threshold
+    sketched = _sketch(codes, approximate, sketch_size, random_state)
+    order = lexsort((y[sketched], codes[sketched]))
+    values, sizes = y[sketched][order], bincount(codes[sketched], minlength=n_series)
+    firsts = concatenate([[0], cumsum(sizes)[:-1]])
+    for q, column in zip(QUANTILES, ["25%", "50%", "75%"]):
+        summary[column] = _sorted_quantile(values, firsts, sizes, q)
+    summary["approximate"] = approximate
+    return summary.astype({column: float for column in SUMMARY_COLUMNS[1:]})
+
+
+def summarize_dataset(
+    dataset: Union[DataFrame, PartitionedDataset], **kwargs
+) -> DataFrame:
+    """
+    Summarizes every serie of a dataset (see summarize_panel), one partition at a time for a
+    partitioned dataset.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset]): The dataset.
+        **kwargs: The summarize_panel parameters.
+
+    Returns:
+        DataFrame: One row per serie.
+    """
+    if isinstance(dataset, PartitionedDataset):
+        return concat(
+            [
+                summarize_panel(partition, **kwargs)
+                for partition in dataset.iter_partitions()
+            ]
+        ).sort_index()
+    return summarize_panel(dataset, **kwargs)
+
+
+def outlier_statistics(
+    summary: DataFrame,
+    threshold: float = 3.5,
+    columns: Iterable[str] = ("mean", "std", "skew", "kurt"),
+) -> Series:
+    """
+    Flags the series whose statistics are outlying among the panel, with the robust z-score
+    |x - median| / (1.4826 * MAD) of each statistic.
+
+    Args:
+        summary (DataFrame): The panel summary (see summarize_panel).
+        threshold (float, optional): The robust z-score above which a statistic is outlying.
+            Defaults to 3.5.
+        columns (Iterable[str], optional): The statistics to check. Defaults to the moments.
+
+    Returns:
+        Series: The outlying statistics of each serie, comma separated ("" if none).
+    """
+    columns = list(columns)
+    statistics = summary.loc[:, columns]
+    deviations = (statistics - statistics.median()).abs()
+    mad = 1.4826 * deviations.median()
+    scores = deviations / mad.where(mad > 0)
+    outlying = scores.gt(threshold)
+    return outlying.apply(
+        lambda row: ", ".join(column for column in columns if row[column]), axis=1
+    )
+
+
+def _sketch(
+    codes: ndarray,
+    approximate: ndarray,
+    sketch_size: int,
+    random_state: int,
+) -> ndarray:
+    # the positions kept for the quartiles: all the points of the exact series, a uniform
+    # sample of the long ones
+    if not approximate.any():
+        return arange(len(codes))
+    rng = default_rng(random_state)
+    long = approximate[codes]
+    kept = [flatnonzero(~long)]
+    # the positions of the long series grouped by serie once, by a stable sort
+    positions = flatnonzero(long)
+    positions = positions[argsort(codes[positions], kind="stable")]
+    sizes = bincount(codes, minlength=len(approximate))[approximate]
+    for start, size in zip(cumsum(sizes) - sizes, sizes):
+        group = positions[start : start + size]
+        kept.append(rng.choice(group, size=sketch_size, replace=False))
+    return concatenate(kept)
+
+
+def _sorted_quantile(
+    values: ndarray, firsts: ndarray, sizes: ndarray, q: float
+) -> ndarray:
+    # the linear interpolation of pandas quantile, on each sorted group
+    position = q * (sizes - 1)
+    lower = floor(position).astype(int)
+    upper = lower + (position > lower)
+    fraction = position - lower
+    return (1 - fraction) * values[firsts + lower] + fraction * values[firsts + upper]
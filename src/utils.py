@@ -3,6 +3,7 @@ from streamlit import dataframe, file_uploader, write
 from sklearn.preprocessing import LabelEncoder
 from numpy import diff, ndarray, zeros, arange, pi, sin, array
 from numpy.random import randn
+from numpy.typing import DTypeLike
 from typing import Iterable, Tuple
 
 
@@ -58,7 +59,12 @@ def compute_differenciated_serie(serie: DataFrame) -> ndarray:
     return diff(serie.iloc[:, -1].values)
 
 
-def get_top_five_correlations(reducted_dims: DataFrame, features: DataFrame) -> dict:
+def get_top_five_correlations(
+    reducted_dims: DataFrame,
+    features: DataFrame,
+    max_samples: int = None,
+    random_state: int = 0,
+) -> dict:
     """
     Given the 3d reducted projection of the datasets and the original projection of the datasets
     in the features space, compute the correlations between each 3d axis and the original features,
@@ -67,12 +73,17 @@ def get_top_five_correlations(reducted_dims: DataFrame, features: DataFrame) ->
     Args:
         reducted_dims (DataFrame): 3d reducted projection of the datasets in the feature space.
         features (DataFrame): The original feature space.
+        max_samples (int, optional): The number of series above which the correlations are
+            estimated on a random subsample of this size. Defaults to None (all the series).
+        random_state (int, optional): The seed of the subsample. Defaults to 0.
 
     Returns:
         dict: top 5 correlated features (using kendall's Tau) per axis,
         where the axis names are the keys of the dict.
     """
     merged_df = concat([reducted_dims, features], axis=1)
+    if max_samples is not None and len(merged_df) > max_samples:
+        merged_df = merged_df.sample(n=max_samples, random_state=random_state)
     correlations = merged_df.corr(method="kendall").iloc[:3, 3:].T
     top_five = {}
     for reduc_axis in correlations.columns:
@@ -112,9 +123,8 @@ def print_ts_features(features: DataFrame, serie_name: str) -> None:
         "unique_id", axis=1
     )
     values.index = [serie_name]
-
-    for iteration in range(0, values.shape[1], 6):
-        dataframe(values.iloc[:, iteration : iteration + 6], width=1000)
+    # a single table, one row per feature
+    dataframe(values.T, use_container_width=True)
 
 
 def encoder(x: str, selected_datasets: list) -> str:
@@ -142,20 +152,25 @@ def encoder(x: str, selected_datasets: list) -> str:
         return "Base"
 
 
-def preprocess_features(features: DataFrame) -> Tuple[Series, DataFrame, ndarray]:
+def preprocess_features(
+    features: DataFrame, dtype: DTypeLike = None
+) -> Tuple[Series, DataFrame, ndarray]:
     """
     Preprocess the features space projection dataset by removing the "unique_id"
     and filling the NaNs if needed.
 
     Args:
         features (DataFrame): The features space projection dataset
+        dtype (DTypeLike, optional): The dtype of the features matrix (e.g. float32 to halve
+            its memory footprint). Defaults to None.
 
     Returns:
         Tuple[Series, DataFrame, ndarray]: [The names of the series, the features dataset, the features matrix].
     """
     names = features.loc[:, "unique_id"]
     features = features.drop("unique_id", axis=1)
-    features_values = features.fillna(0).values
+    # a single copy, cast and filled on the fly
+    features_values = features.to_numpy(dtype=dtype, na_value=0)
     return names, features, features_values
 
 
@@ -274,6 +289,16 @@ def __generate_autocorrelated_data(n: int, rho: float) -> ndarray:
     return array(data)
 
 
+# the names of the series injected by inject_toy_series
+TOY_SERIES = (
+    "Autoregression (φ=0.9)",
+    "White noise",
+    "Seasonality",
+    "Seasonal/trend",
+    "Trend",
+)
+
+
 def inject_toy_series(dataframe: DataFrame, freq: int = 24) -> DataFrame:
     """
     Given a dataset of time series, inject to it toys series.
@@ -0,0 +1,203 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Iterable, Tuple, Union
+
+from pandas import DataFrame
+from plotly.graph_objects import Figure
+
+from src.cache import LRUCache
+from src.partitioning import PartitionedDataset, serie_frame
+from src.space_projection import compute_fft, compute_freq_and_psd, WaveletScalogram
+from src.utils import transform_nixtla_format, advanced_describe
+from src.plotting_tools import (
+    plot_time_view,
+    plot_fft_view,
+    plot_wavelet_view,
+    plot_density_view,
+    plot_psd_view,
+)
+
+
+VIEWS = (
+    "Time view",
+    "Density view",
+    "Frequentist (FFT) view",
+    "Frequentist (PSD) view",
+    "Wavelets (ricker) view",
+)
+WAVELET_MAX_POINTS = 2048
+
+
+def build_view(
+    dataset: Union[DataFrame, PartitionedDataset],
+    serie_name: str,
+    plot_name: str,
+    period: int = 24,
+    window: Tuple[int, int] = None,
+    scalogram: WaveletScalogram = None,
+) -> Tuple[Figure, DataFrame]:
+    """
+    Given a dataset in the nixtla format, a serie name and a type of plot, computes the figure
+    and the base statistics of the serie.
+
+    Args:
+        dataset (Union[DataFrame, PartitionedDataset]): The nixtla dataset.
+        serie_name (str): The name of the serie.
+        plot_name (str): The type of plot (one of VIEWS).
+        period (int, optional): The seasonal period of the serie. Defaults to 24.
+        window (Tuple[int, int], optional): The visible time window of the wavelets view.
+            Defaults to None (the whole serie).
+        scalogram (WaveletScalogram, optional): The tiled wavelet transform of the serie, to
+            reuse its cached tiles. Defaults to None.
+
+    Raises:
+        ValueError: If the type of plot is unknown.
+
+    Returns:
+        Tuple[Figure, DataFrame]: [The plotly figure, the advanced describe of the serie].
+    """
+    data = transform_nixtla_format(serie_frame(dataset, serie_name), serie_name)
+
+    match plot_name:
+        case "Time view":
+            fig = plot_time_view(data, serie_name)
+        case "Density view":
+            fig = plot_density_view(data, serie_name)
+        case "Frequentist (FFT) view":
+            fig = plot_fft_view(*compute_fft(data.loc[:, serie_name]), serie_name)
+        case "Frequentist (PSD) view":
+            frequencies, psd = compute_freq_and_psd(data, frequency=period)
+            fig = plot_psd_view(frequencies, psd, serie_name)
+        case "Wavelets (ricker) view":
+            if scalogram is None:
+                scalogram = WaveletScalogram(
+                    data, frequency=period, max_points=WAVELET_MAX_POINTS
+                )
+            time_index, magnitude = scalogram.window(*(window or (0, None)))
+            fig = plot_wavelet_view(
+                scalogram.widths,
+                len(time_index),
+                magnitude,
+                serie_name,
+                time_index=time_index,
+            )
+        case _:
+            raise ValueError("Unknown type of plot")
+
+    return fig, DataFrame(advanced_describe(data.loc[:, serie_name])).T
+
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+class ViewCache(LRUCache):
+    """
+    A per-session cache of the Local Analysis views, keyed by (serie, view, period, window).
+    The views of the neighbouring series can be prefetched in the background.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        super().__init__(max_bytes=None, max_entries=max_entries)
+        self.scalograms_ = LRUCache(max_bytes=None, max_entries=4)
+        self._pending = {}
+        self._pending_lock = Lock()
+
+    def get_view(
+        self,
+        dataset: DataFrame,
+        serie_name: str,
+        plot_name: str,
+        period: int,
+        window: Tuple[int, int] = None,
+    ) -> Tuple[Figure, DataFrame]:
+        """
+        Returns the cached view, waits for it if it is being prefetched, or computes it.
+
+        Args:
+            dataset (DataFrame): The nixtla dataset.
+            serie_name (str): The name of the serie.
+            plot_name (str): The type of plot.
+            period (int): The seasonal period.
+            window (Tuple[int, int], optional): The visible time window of the wavelets view.
+                Defaults to None.
+
+        Returns:
+            Tuple[Figure, DataFrame]: [The plotly figure, the advanced describe of the serie].
+        """
+        key = (serie_name, plot_name, period, window)
+        view = self.get(key)
+        if view is not None:
+            return view
+        return self._submit(dataset, key).result()
+
+    def prefetch(
+        self,
+        dataset: DataFrame,
+        serie_names: Iterable[str],
+        plot_name: str,
+        period: int,
+    ) -> None:
+        """
+        Computes the views of some series in the background.
+
+        Args:
+            dataset (DataFrame): The nixtla dataset.
+            serie_names (Iterable[str]): The series to prefetch.
+            plot_name (str): The type of plot.
+            period (int): The seasonal period.
+        """
+        for serie_name in serie_names:
+            key = (serie_name, plot_name, period, None)
+            if key not in self:
+                self._submit(dataset, key)
+
+    def _submit(self, dataset: DataFrame, key: tuple) -> Future:
+        with self._pending_lock:
+            if key not in self._pending:
+                future = _prefetch_executor.submit(self._compute, dataset, key)
+                self._pending[key] = future
+            return self._pending[key]
+
+    def _compute(self, dataset: DataFrame, key: tuple) -> Tuple[Figure, DataFrame]:
+        serie_name, plot_name, period, window = key
+        try:
+            scalogram = None
+            if plot_name == "Wavelets (ricker) view":
+                # the windows of a serie share the tiles of a single scalogram
+                scalogram = self.scalograms_.get((serie_name, period))
+                if scalogram is None:
+                    scalogram = WaveletScalogram(
+                        transform_nixtla_format(
+                            serie_frame(dataset, serie_name), serie_name
+                        ),
+                        frequency=period,
+                        max_points=WAVELET_MAX_POINTS,
+                    )
+                    self.scalograms_.put((serie_name, period), scalogram)
+            view = build_view(dataset, *key, scalogram=scalogram)
+            self.put(key, view)
+            return view
+        finally:
+            with self._pending_lock:
+                self._pending.pop(key, None)
+
+
+def neighbouring_series(options: list, serie_name: str, width: int = 1) -> list:
+    """
+    Returns the series surrounding a serie in the ordered list of the selectbox options.
+
+    Args:
+        options (list): The ordered series names.
+        serie_name (str): The current serie.
+        width (int, optional): The number of series on each side. Defaults to 1.
+
+    Returns:
+        list: The neighbouring series, closest first.
+    """
+    position = options.index(serie_name)
+    neighbours = []
+    for offset in range(1, width + 1):
+        for index in (position + offset, position - offset):
+            if 0 <= index < len(options):
+                neighbours.append(options[index])
+    return neighbours
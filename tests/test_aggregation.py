@@ -0,0 +1,53 @@
+import pytest
+from numpy.random import rand, seed
+from pandas import DataFrame
+
+from src.aggregation import (
+    aggregate_embedding,
+    cluster_centroids,
+    in_region,
+    voxelize,
+)
+from src.plotting_tools import plot_aggregated_reducted_dim
+
+
+@pytest.fixture
+def reducted_df() -> DataFrame:
+    seed(0)
+    n = 20_000
+    reducted_df = DataFrame(rand(n, 3), columns=["fst_dim", "snd_dim", "trd_dim"])
+    reducted_df["Name"] = [f"S{i}" for i in range(n)]
+    reducted_df["Style"] = "Base"
+    reducted_df.loc[:2, "Style"] = "Selected"
+    reducted_df.loc[3, "Style"] = "Added"
+    return reducted_df
+
+
+def test_voxelize(reducted_df: DataFrame):
+    voxels = voxelize(reducted_df, bins=10)
+    assert len(voxels) <= 1000
+    assert voxels["Count"].sum() == len(reducted_df)
+    assert voxels["fst_dim"].between(0, 1).all()
+
+
+def test_cluster_centroids(reducted_df: DataFrame):
+    voxels = voxelize(reducted_df, bins=10)
+    centroids = cluster_centroids(voxels, n_clusters=4)
+    assert len(centroids) == 4
+    assert centroids["Count"].sum() == len(reducted_df)
+
+
+def test_aggregation_keeps_highlighted_series(reducted_df: DataFrame):
+    points, voxels, centroids = aggregate_embedding(reducted_df, max_points=1000)
+    assert set(points["Style"]) == {"Selected", "Added"} and len(points) == 4
+    assert voxels["Count"].sum() == len(reducted_df) - 4
+    fig = plot_aggregated_reducted_dim(points, voxels, centroids, "PCA")
+    assert sum(len(trace.x) for trace in fig.data) <= 4 + 20**3 + 8
+
+
+def test_zoom_drills_down(reducted_df: DataFrame):
+    region = {"fst_dim": (0, 0.1), "snd_dim": (0, 0.1), "trd_dim": (0, 1)}
+    points, voxels, _ = aggregate_embedding(reducted_df, region=region, max_points=1000)
+    assert voxels is None
+    inside = in_region(reducted_df, region)
+    assert len(points) == (inside | (reducted_df["Style"] != "Base")).sum()
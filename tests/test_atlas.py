@@ -0,0 +1,126 @@
+import pytest
+from numpy import nan, sin, pi, arange
+from numpy.random import default_rng
+from pandas import DataFrame
+
+from src.atlas import (
+    ATLAS_DIRECTORY,
+    ReferenceAtlas,
+    build_partition,
+    read_m4_csv,
+    write_partition,
+)
+
+
+def reference_features(prefix: str, n_series: int, columns=("trend", "x_acf1")):
+    rng = default_rng(0)
+    features = DataFrame(rng.normal(size=(n_series, len(columns))), columns=columns)
+    features.insert(0, "unique_id", [f"{prefix}{i}" for i in range(n_series)])
+    return features
+
+
+@pytest.fixture
+def atlas(tmp_path):
+    write_partition(reference_features("H", 40), "Hourly", str(tmp_path))
+    write_partition(
+        reference_features("Y", 30, ("trend", "x_acf1", "hurst")),
+        "Yearly",
+        str(tmp_path),
+    )
+    write_partition(reference_features("D", 20), "Daily", str(tmp_path))
+    return ReferenceAtlas(str(tmp_path))
+
+
+def test_manifest(atlas):
+    # the partitions are kept in the order of the frequencies
+    assert atlas.series() == {"Yearly": 30, "Daily": 20, "Hourly": 40}
+    assert atlas.frequencies([1]) == ["Yearly", "Daily"]
+    assert atlas.frequencies([24, 12]) == ["Hourly"]
+    assert atlas.frequencies([7]) == []
+
+
+def test_load(atlas):
+    features = atlas.load([1])
+    assert len(features) == 50
+    assert set(features["Frequency"]) == {"Yearly", "Daily"}
+    # the series are shuffled, the features stay with their serie
+    expected = reference_features("Y", 30, ("trend", "x_acf1", "hurst"))
+    yearly = features[features["Frequency"] == "Yearly"].set_index("unique_id")
+    assert list(yearly.index) != list(expected["unique_id"])
+    assert yearly["trend"].equals(
+        expected.set_index("unique_id")["trend"][yearly.index]
+    )
+
+
+def test_load_columns_and_tiers(atlas):
+    features = atlas.load([1, 24], columns=["hurst", "trend"], max_series=10)
+    assert list(features.columns) == ["unique_id", "hurst", "trend", "Frequency"]
+    assert features.groupby("Frequency").size().to_dict() == {
+        "Yearly": 10,
+        "Daily": 10,
+        "Hourly": 10,
+    }
+    # the missing features are left out of the partitions
+    assert features["hurst"].isna().sum() == 20
+    assert atlas.load([7]).empty
+
+
+def test_check_features(atlas):
+    assert atlas.check_features([1, 24], ["trend", "x_acf1"]) == []
+    # the hurst exponent is only in the yearly partition
+    assert atlas.check_features([1, 24], ["hurst", "trend"]) == [
+        "Daily misses 1 features (hurst)",
+        "Hourly misses 1 features (hurst)",
+    ]
+    assert atlas.check_features([7], ["entropy"]) == []
+
+
+def test_other_tsfeatures_version(atlas):
+    partition = atlas.manifest["partitions"]["Daily"]
+    partition["feature_set_version"] = "tsfeatures-0.1.0+0123456789ab"
+    assert atlas.check_features([1], ["trend"]) == [
+        "Daily computed with tsfeatures-0.1.0"
+    ]
+
+
+def test_unknown_frequency(tmp_path):
+    with pytest.raises(ValueError):
+        write_partition(reference_features("H", 5), "Minutely", str(tmp_path))
+
+
+def test_read_m4_csv(tmp_path):
+    path = tmp_path / "Quarterly-train.csv"
+    DataFrame(
+        [["Q1", 1.0, 2.0, 3.0], ["Q2", 4.0, 5.0, nan]], columns=["V1", "V2", "V3", "V4"]
+    ).to_csv(path, index=False)
+    panels = list(read_m4_csv(str(path), chunksize=1))
+    assert len(panels) == 2
+    assert panels[1].to_dict(orient="list") == {
+        "unique_id": ["Q2", "Q2"],
+        "ds": [0, 1],
+        "y": [4.0, 5.0],
+    }
+
+
+def test_build_partition(tmp_path):
+    t = arange(48)
+    rows = [[f"Q{i}", *(sin(2 * pi * t / 4) * (i + 1) + 0.1 * t)] for i in range(6)]
+    path = tmp_path / "Quarterly-train.csv"
+    DataFrame(rows, columns=[f"V{i}" for i in range(1, 50)]).to_csv(path, index=False)
+    build_partition(
+        str(path),
+        "Quarterly",
+        str(tmp_path / "atlas"),
+        chunksize=4,
+        features=["acf_features"],
+    )
+    features = ReferenceAtlas(str(tmp_path / "atlas")).load([4])
+    assert sorted(features["unique_id"]) == [f"Q{i}" for i in range(6)]
+    assert "seas_acf1" in features.columns
+
+
+def test_bundled_atlas():
+    # the hourly partition is seeded from the bundled M4 hourly features
+    atlas = ReferenceAtlas(ATLAS_DIRECTORY)
+    assert atlas.series()["Hourly"] == 418
+    assert atlas.load([24], columns=["hurst"], max_series=100).shape == (100, 3)
@@ -0,0 +1,137 @@
+from threading import Thread
+
+import pytest
+from numpy import zeros, arange
+from pandas import DataFrame
+
+from src.cache import LRUCache, SharedCache, content_key, sizeof
+
+
+def test_content_key_is_content_addressed():
+    df = DataFrame({"unique_id": ["H1"] * 3, "y": [1.0, 2.0, 3.0]})
+    assert content_key("dataset", df, 24) == content_key("dataset", df.copy(), 24)
+    assert content_key("dataset", df, 24) != content_key("dataset", df, 12)
+    assert content_key("dataset", df, 24) != content_key("features", df, 24)
+    assert content_key("embedding", arange(3)) != content_key("embedding", arange(4))
+
+
+def test_sizeof():
+    assert sizeof(zeros(100)) == 800
+    assert sizeof((zeros(10), zeros(10))) == 160
+
+
+class Unlocked:
+    """
+    A value recording, when pickled, whether another thread could take the cache lock.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.unlocked = []
+
+    def __reduce__(self):
+        def acquire():
+            if self.cache._lock.acquire(blocking=False):
+                self.cache._lock.release()
+                self.unlocked.append(True)
+            else:
+                self.unlocked.append(False)
+
+        thread = Thread(target=acquire)
+        thread.start()
+        thread.join()
+        return (int, (0,))
+
+
+class TestLRUCache:
+    def test_lru_eviction(self):
+        cache = LRUCache(max_bytes=2400)
+        cache.put("a", zeros(100))
+        cache.put("b", zeros(100))
+        cache.get("a")
+        cache.put("c", zeros(100))
+        cache.put("d", zeros(100))
+        assert "a" in cache and "b" not in cache
+        assert cache.stats()["evictions"] == 1
+
+    def test_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        for key in range(3):
+            cache.put(key, key)
+        assert len(cache) == 2 and 0 not in cache
+
+    def test_counters(self):
+        cache = LRUCache()
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("b")
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+class TestSharedCache:
+    def test_spill_to_disk(self, tmp_path):
+        cache = SharedCache(max_bytes=1000, spill_dir=str(tmp_path))
+        cache.put("a", zeros(100))
+        cache.put("b", zeros(100))
+        assert cache.stats()["spills"] == 1
+        assert (cache.get("a") == zeros(100)).all()
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_get_or_compute_computes_once(self, tmp_path):
+        cache = SharedCache(spill_dir=str(tmp_path))
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 42
+
+        assert cache.get_or_compute("key", compute) == 42
+        assert cache.get_or_compute("key", compute) == 42
+        assert len(calls) == 1
+
+    def test_clear_removes_spilled_files(self, tmp_path):
+        cache = SharedCache(max_bytes=0, spill_dir=str(tmp_path))
+        cache.put("a", zeros(10))
+        cache.clear()
+        assert list(tmp_path.iterdir()) == []
+        assert cache.get("a") is None
+
+    def test_contains_spilled_keys(self, tmp_path):
+        cache = SharedCache(max_bytes=1000, spill_dir=str(tmp_path))
+        cache.put("a", zeros(100))
+        cache.put("b", zeros(100))
+        assert "a" in cache and "b" in cache and "c" not in cache
+        assert "a" not in SharedCache(max_bytes=1000)
+
+    def test_spill_outside_the_lock(self, tmp_path):
+        cache = SharedCache(max_bytes=0, spill_dir=str(tmp_path))
+        value = Unlocked(cache)
+        cache.put("a", value)
+        # pickled by sizeof and by the spill, never while the lock is held
+        assert value.unlocked and all(value.unlocked)
+        assert cache.get("a") == 0
+
+    def test_spill_budget(self, tmp_path):
+        cache = SharedCache(max_bytes=0, spill_dir=str(tmp_path), max_spill_bytes=2500)
+        for key in "abc":
+            cache.put(key, zeros(100))
+        # the oldest spilled file is removed once the disk budget is exceeded
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "b.pickle",
+            "c.pickle",
+        ]
+        stats = cache.stats()
+        assert stats["spill_evictions"] == 1 and stats["spill_bytes"] <= 2500
+        assert "a" not in cache and cache.get("a") is None
+
+    def test_key_locks_are_pruned(self, tmp_path):
+        cache = SharedCache(max_bytes=1000, spill_dir=str(tmp_path))
+        cache.get_or_compute("a", lambda: zeros(100))
+        cache.get_or_compute("b", lambda: zeros(100))
+        assert set(cache._key_locks) == {"b"}
+        with pytest.raises(ValueError):
+            cache.get_or_compute("c", lambda: int("c"))
+        assert set(cache._key_locks) == {"b"}
+        cache.clear()
+        assert cache._key_locks == {}
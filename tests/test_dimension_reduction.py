@@ -3,9 +3,26 @@ from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
 from sklearn.preprocessing import StandardScaler
 from umap import UMAP
-from src.dimension_reduction import PCAReductor, TSNEReductor, UMAPReductor
+from src.dimension_reduction import (
+    PCAReductor,
+    TSNEReductor,
+    UMAPReductor,
+    SubsampledReductor,
+    WarmStart,
+    build_reductor,
+    embedding_key,
+    fit_scaler,
+    interpolate_embedding,
+    launch_projections,
+    project_samples,
+    required_neighbors,
+    sample_indices,
+    sweep,
+)
+from src.neighbors import build_knn_graph
 from numpy.random import rand, seed
-from numpy import isclose, ndarray, chararray
+from numpy import corrcoef, isclose, isfinite, ndarray, chararray, float32
+from pandas import DataFrame
 
 
 @pytest.fixture
@@ -23,6 +40,24 @@ class TestPCA:
         transformed_sklearn = PCA(n_components=3).fit_transform(fake_data)
         assert isclose(transformed_reductor, transformed_sklearn).all()
 
+    def test_pca_float32(self, fake_data: ndarray):
+        original = fake_data.copy()
+        transformed_reductor = PCAReductor(dtype=float32).fit_transform(fake_data)
+        assert transformed_reductor.dtype == float32
+        assert (fake_data == original).all()
+        assert PCAReductor().fit_transform(fake_data.astype(float32)).dtype == float32
+
+    def test_shared_scaler(self, fake_data: ndarray):
+        scaler = fit_scaler(fake_data)
+        reductor = PCAReductor(scaler=scaler)
+        reductor.fit_transform(fake_data)
+        assert reductor.scaler_ is scaler
+
+    def test_in_place_scaling(self):
+        data = rand(100, 10) + 5
+        PCAReductor(copy=False).fit_transform(data)
+        assert isclose(data.mean(axis=0), 0).all()
+
 
 class TestTSNE:
     def test_non_numeric_error(self):
@@ -49,3 +84,223 @@ class TestUMAP:
             n_components=3, n_neighbors=50, random_state=0
         ).fit_transform(fake_data)
         assert isclose(transformed_reductor, transformed_UMAP).all()
+
+
+class TestConcurrentProjections:
+    def test_build_reductor(self):
+        assert isinstance(build_reductor("PCA", 10), PCAReductor)
+        assert build_reductor("T-SNE", 10).perplexity == 9
+        with pytest.raises(ValueError, match="Unknown dimension reduction algorithm"):
+            build_reductor("LDA", 10)
+
+    def test_launch_projections(self, fake_data: ndarray):
+        reductors = {"PCA": PCAReductor(), "T-SNE": TSNEReductor()}
+        keys = {"PCA": "test_pca_key", "T-SNE": "test_tsne_key"}
+        wrapped = []
+
+        def wrap_task(task):
+            wrapped.append(task)
+            return task
+
+        futures = launch_projections(fake_data, reductors, keys, wrap_task=wrap_task)
+        assert futures["PCA"].result().shape == (100, 3)
+        assert futures["T-SNE"].result().shape == (100, 3)
+        assert isclose(
+            futures["PCA"].result(), PCAReductor().fit_transform(fake_data)
+        ).all()
+        # the tasks are tagged by the caller, e.g. with the rerun profiling them
+        assert len(wrapped) == 2
+
+
+class TestKNNGraphReuse:
+    def test_required_neighbors(self):
+        assert required_neighbors("T-SNE", 30, 1000) == 92
+        assert required_neighbors("T-SNE", 30, 50) == 50
+        assert required_neighbors("UMAP", 15, 1000) == 15
+
+    def test_umap_with_graph(self, fake_data: ndarray):
+        graph = build_knn_graph(StandardScaler().fit_transform(fake_data), 30)
+        transformed = UMAPReductor(n_neighbors=10, knn_graph=graph).fit_transform(
+            fake_data
+        )
+        assert transformed.shape == (100, 3)
+
+    def test_umap_with_graph_of_a_small_panel(self, fake_data: ndarray):
+        X = fake_data[:11]
+        graph = build_knn_graph(
+            StandardScaler().fit_transform(X), required_neighbors("UMAP", 15, 11)
+        )
+        # like UMAP without a graph, the neighbours are capped to the other series
+        assert UMAPReductor(knn_graph=graph).fit_transform(X).shape == (11, 3)
+
+    def test_tsne_with_graph(self, fake_data: ndarray):
+        graph = build_knn_graph(StandardScaler().fit_transform(fake_data), 50)
+        transformed = TSNEReductor(perplexity=10, knn_graph=graph).fit_transform(
+            fake_data
+        )
+        assert transformed.shape == (100, 3)
+
+    def test_sweep(self, fake_data: ndarray):
+        embeddings = sweep(fake_data, "T-SNE", [5, 10])
+        assert set(embeddings) == {5, 10}
+        assert all(embedding.shape == (100, 3) for embedding in embeddings.values())
+        with pytest.raises(ValueError, match="No neighbours parameter"):
+            sweep(fake_data, "PCA", [1])
+
+
+class TestOutOfSampleProjection:
+    def test_pca_transform(self, fake_data: ndarray):
+        reductor = PCAReductor()
+        embedding = reductor.fit_transform(fake_data)
+        assert isclose(reductor.transform(fake_data), embedding).all()
+
+    def test_tsne_cannot_transform(self, fake_data: ndarray):
+        reductor = TSNEReductor()
+        reductor.fit_transform(fake_data)
+        with pytest.raises(ValueError, match="cannot project new samples"):
+            reductor.transform(fake_data)
+
+    def test_unfitted_transform(self, fake_data: ndarray):
+        with pytest.raises(RuntimeError, match="PCAReductor is not fitted"):
+            PCAReductor().transform(fake_data)
+
+    def test_persistence(self, fake_data: ndarray, tmp_path):
+        reductor = PCAReductor(dtype=float32)
+        reductor.fit_transform(fake_data)
+        reductor.save(str(tmp_path / "reductor.pickle"))
+        loaded = PCAReductor.load(str(tmp_path / "reductor.pickle"))
+        assert isclose(loaded.transform(fake_data), reductor.transform(fake_data)).all()
+
+
+class TestSubsampledProjection:
+    def test_sample_indices(self):
+        assert (sample_indices(100, 10) == sample_indices(100, 10)).all()
+        assert len(set(sample_indices(100, 10))) == 10
+        assert (sample_indices(5, 10) == range(5)).all()
+
+    def test_subsampled_pca(self, fake_data: ndarray):
+        reductor = SubsampledReductor(PCAReductor(), n_samples=50)
+        embedding = reductor.fit_transform(fake_data)
+        indices = sample_indices(100, 50)
+        assert embedding.shape == (100, 3)
+        assert isclose(embedding[indices], reductor.reductor.reducted_dataset_).all()
+        assert isclose(embedding, reductor.reductor.transform(fake_data)).all()
+
+    def test_subsampled_tsne(self, fake_data: ndarray):
+        reductor = SubsampledReductor(TSNEReductor(perplexity=10), n_samples=50)
+        embedding = reductor.fit_transform(fake_data)
+        assert embedding.shape == (100, 3)
+        assert isfinite(embedding).all()
+
+    def test_subsampled_tsne_with_graph(self, fake_data: ndarray):
+        scaler = fit_scaler(fake_data)
+        indices = sample_indices(100, 50)
+        graph = build_knn_graph(scaler.transform(fake_data[indices]), 32)
+        tsne = TSNEReductor(perplexity=10, knn_graph=graph, scaler=scaler)
+        embedding = SubsampledReductor(tsne, n_samples=50).fit_transform(fake_data)
+        assert embedding.shape == (100, 3) and isfinite(embedding).all()
+
+    def test_interpolate_embedding(self, fake_data: ndarray):
+        embedding = rand(100, 3)
+        interpolated = interpolate_embedding(fake_data, embedding, fake_data[:5])
+        assert isclose(interpolated, embedding[:5]).all()
+
+    def test_embedding_key_is_stable(self, fake_data: ndarray):
+        reductor = SubsampledReductor(TSNEReductor(perplexity=10), n_samples=50)
+        key = embedding_key("features", "T-SNE", reductor)
+        reductor.fit_transform(fake_data)
+        assert embedding_key("features", "T-SNE", reductor) == key
+        assert key != embedding_key(
+            "features", "T-SNE", SubsampledReductor(TSNEReductor(perplexity=10))
+        )
+
+
+class TestWarmStart:
+    @pytest.fixture
+    def previous(self) -> DataFrame:
+        return DataFrame(rand(90, 3), index=[f"S{i}" for i in range(90)])
+
+    def test_initialization(self, fake_data: ndarray, previous: DataFrame):
+        names = [f"S{i}" for i in range(100)]
+        warm_start = WarmStart(previous, names)
+        init = warm_start.initialization(fake_data)
+        assert warm_start.applies
+        assert isclose(init[:90], previous.to_numpy()).all()
+        assert isfinite(init[90:]).all()
+
+    def test_min_overlap(self, previous: DataFrame):
+        names = [f"S{i}" for i in range(80, 200)]
+        assert not WarmStart(previous, names).applies
+        assert (
+            TSNEReductor(warm_start=WarmStart(previous, names)).warm_start_init(
+                rand(120, 10)
+            )
+            is None
+        )
+
+    def test_pca_orientation(self, fake_data: ndarray):
+        names = [f"S{i}" for i in range(100)]
+        embedding = PCAReductor().fit_transform(fake_data)
+        previous = DataFrame(-embedding, index=names)
+        warm = PCAReductor(warm_start=WarmStart(previous, names))
+        assert isclose(warm.fit_transform(fake_data), -embedding, atol=1e-6).all()
+        assert isclose(warm.transform(fake_data), -embedding, atol=1e-6).all()
+
+    def test_tsne_keeps_layout(self, fake_data: ndarray):
+        names = [f"S{i}" for i in range(100)]
+        embedding = TSNEReductor(perplexity=10).fit_transform(fake_data)
+        previous = DataFrame(embedding[:90], index=names[:90])
+        reductor = TSNEReductor(perplexity=10, warm_start=WarmStart(previous, names))
+        refined = reductor.fit_transform(fake_data)
+        for axis in range(3):
+            assert corrcoef(refined[:90, axis], embedding[:90, axis])[0, 1] > 0.9
+
+    def test_subsampled_warm_start(self, fake_data: ndarray):
+        names = [f"S{i}" for i in range(100)]
+        previous = DataFrame(rand(100, 3), index=names)
+        warm_start = WarmStart(previous, names)
+        reductor = SubsampledReductor(
+            TSNEReductor(perplexity=10, warm_start=warm_start), n_samples=50
+        )
+        assert reductor.fit_transform(fake_data).shape == (100, 3)
+        assert reductor.reductor.warm_start is warm_start
+
+    def test_embedding_key(self, previous: DataFrame):
+        names = [f"S{i}" for i in range(100)]
+        key = embedding_key(
+            "features", "UMAP", UMAPReductor(warm_start=WarmStart(previous, names))
+        )
+        assert key == embedding_key(
+            "features", "UMAP", UMAPReductor(warm_start=WarmStart(previous, names))
+        )
+        assert key != embedding_key("features", "UMAP", UMAPReductor())
+
+
+class TestProjectSamples:
+    def test_fitted_pca(self, fake_data: ndarray):
+        reductor = PCAReductor()
+        embedding = reductor.fit_transform(fake_data)
+        projected = project_samples(reductor, fake_data, embedding, fake_data[:5])
+        assert isclose(projected, embedding[:5]).all()
+
+    def test_interpolation(self, fake_data: ndarray):
+        reductor = TSNEReductor(perplexity=10)
+        embedding = reductor.fit_transform(fake_data)
+        projected = project_samples(reductor, fake_data, embedding, fake_data[:5])
+        assert isclose(projected, embedding[:5]).all()
+
+    def test_interpolation_of_fitted_reductor(self, fake_data: ndarray):
+        reductor = PCAReductor()
+        embedding = reductor.fit_transform(fake_data)
+        # the same projection as with the embedding read from the cache
+        projected = project_samples(
+            reductor, fake_data, embedding, fake_data[:5], interpolate=True
+        )
+        cached = project_samples(PCAReductor(), fake_data, embedding, fake_data[:5])
+        assert (projected == cached).all()
+
+    def test_unfitted_reductor(self, fake_data: ndarray):
+        # an embedding read from the cache, the reductor was never fitted
+        embedding = rand(100, 3)
+        projected = project_samples(PCAReductor(), fake_data, embedding, fake_data[:5])
+        assert isclose(projected, embedding[:5]).all()
@@ -0,0 +1,103 @@
+import pytest
+from numpy import allclose
+from numpy.random import default_rng
+from pandas import DataFrame
+
+from src.export import (
+    correlations_frame,
+    correlations_from_frame,
+    export_bytes,
+    export_metadata,
+    export_projection,
+    feature_set_version,
+    import_projection,
+    read_export,
+)
+from src.utils import build_reduc_dim_df, get_top_five_correlations
+
+
+@pytest.fixture
+def projection():
+    rng = default_rng(0)
+    names = [f"S{i}" for i in range(50)]
+    features = DataFrame(rng.normal(size=(50, 8)), columns=[f"f{i}" for i in range(8)])
+    embedding = build_reduc_dim_df(rng.normal(size=(50, 3)), serie_names=names)
+    top_five = get_top_five_correlations(embedding.iloc[:, :3], features)
+    features.insert(0, "unique_id", names)
+    return features, embedding, top_five
+
+
+def test_feature_set_version():
+    assert feature_set_version(["a", "b"]) == feature_set_version(["b", "a"])
+    assert feature_set_version(["a", "b"]) != feature_set_version(["a", "c"])
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        export_metadata("plots")
+
+
+def test_correlations_round_trip(projection):
+    _, _, top_five = projection
+    frame = correlations_frame(top_five)
+    assert len(frame) == 15
+    rebuilt = correlations_from_frame(frame)
+    for axis, correlations in top_five.items():
+        assert list(rebuilt[axis].index) == list(correlations.index)
+        assert allclose(rebuilt[axis], correlations)
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+def test_projection_round_trip(projection, tmp_path, format: str):
+    features, embedding, top_five = projection
+    paths = export_projection(
+        str(tmp_path),
+        features,
+        embedding,
+        top_five,
+        period=24,
+        algorithm="UMAP",
+        parameters={"n_neighbors": 15, "init": object()},
+        format=format,
+    )
+    assert set(paths) == {"features", "embedding", "correlations"}
+    imported, imported_embedding, imported_top_five, metadata = import_projection(
+        str(tmp_path), format
+    )
+    assert imported.equals(features)
+    assert imported_embedding.equals(embedding)
+    assert list(imported_top_five) == list(top_five)
+    assert metadata["period"] == 24 and metadata["algorithm"] == "UMAP"
+    assert metadata["parameters"]["n_neighbors"] == 15
+    assert metadata["feature_set_version"] == feature_set_version(features.columns[1:])
+    # the metadata is shared by the three tables
+    _, embedding_metadata = read_export(paths["embedding"])
+    assert embedding_metadata["feature_set_version"] == metadata["feature_set_version"]
+    assert embedding_metadata["kind"] == "embedding"
+
+
+def test_mixed_periods_metadata():
+    metadata = export_metadata("features", period=24, periods={"A": 24, "B": 12})
+    assert metadata["period"] is None
+    assert metadata["periods"] == {"A": 24, "B": 12}
+    assert export_metadata("features", 24, periods={"A": 12})["period"] == 12
+    assert export_metadata("features", 24)["periods"] is None
+
+
+def test_memory_mapped_read(projection, tmp_path):
+    features, _, _ = projection
+    path = tmp_path / "features.arrow"
+    path.write_bytes(export_bytes(features, export_metadata("features")))
+    table, metadata = read_export(str(path))
+    assert metadata["kind"] == "features"
+    # the columns are zero-copy views on the mapped file
+    column = table.column("f0").chunk(0).to_numpy(zero_copy_only=True)
+    assert allclose(column, features["f0"])
+
+
+def test_unknown_format(projection, tmp_path):
+    features, embedding, top_five = projection
+    with pytest.raises(ValueError):
+        export_projection(str(tmp_path), features, embedding, top_five, format="csv")
+    with pytest.raises(ValueError):
+        export_bytes(features, export_metadata("features"), format="csv")
@@ -0,0 +1,63 @@
+import pytest
+from numpy import exp, isclose
+from numpy.random import default_rng
+from pandas import DataFrame
+
+from src.feature_pruning import prune_redundant_features, rank_correlations
+
+
+@pytest.fixture
+def features() -> DataFrame:
+    rng = default_rng(0)
+    x, y = rng.normal(size=(2, 200))
+    return DataFrame(
+        {
+            "unique_id": [f"S{i}" for i in range(200)],
+            "x": x,
+            # a monotonic transform of x, rank-identical
+            "exp_x": exp(x),
+            "noisy_x": x + 0.05 * rng.normal(size=200),
+            "y": y,
+            "constant": 1.0,
+        }
+    )
+
+
+def test_rank_correlations(features: DataFrame):
+    correlations = rank_correlations(features.drop(columns="unique_id"))
+    assert isclose(correlations.loc["x", "exp_x"], 1)
+    assert correlations.loc["x", "y"] < 0.3
+    assert correlations.loc["constant", "x"] == 0
+    assert (correlations.to_numpy().diagonal() == 1).all()
+
+
+def test_missing_features(features: DataFrame):
+    features["partial_x"] = features["x"].abs().where(features.index % 10 > 0)
+    features["flag"] = features["constant"].where(features.index % 2 > 0)
+    correlations = rank_correlations(features.drop(columns="unique_id"))
+    # the missing values are ranked as 0, not spread to the whole column
+    assert correlations.loc["partial_x", "exp_x"] > 0
+    _, dropped = prune_redundant_features(features, threshold=0.95)
+    # NaN or 1 varies once filled, it is not dropped as constant
+    assert "flag" not in dropped["Dropped"].values
+
+
+def test_subsampled_rank_correlations(features: DataFrame):
+    correlations = rank_correlations(features.drop(columns="unique_id"), max_samples=50)
+    assert isclose(correlations.loc["x", "exp_x"], 1)
+
+
+def test_prune_redundant_features(features: DataFrame):
+    pruned, dropped = prune_redundant_features(features, threshold=0.95)
+    assert list(pruned.columns) == ["unique_id", "x", "y"]
+    assert set(dropped["Dropped"]) == {"exp_x", "noisy_x", "constant"}
+    kept = dropped.set_index("Dropped")["Kept"]
+    assert kept["exp_x"] == "x" and kept["noisy_x"] == "x"
+    assert (dropped.dropna()["Rank correlation"] >= 0.95).all()
+
+
+def test_threshold(features: DataFrame):
+    pruned, dropped = prune_redundant_features(features, threshold=1.0)
+    # only the exact rank duplicates and the constant feature are dropped
+    assert "noisy_x" in pruned.columns
+    assert set(dropped["Dropped"]) == {"exp_x", "constant"}
@@ -0,0 +1,118 @@
+import pytest
+from numpy import arange, repeat, tile
+from numpy.random import default_rng
+from pandas import DataFrame
+from plotly.graph_objects import Figure
+
+from src.dimension_reduction import WarmStart
+from src.global_analysis import GlobalAnalysis, followed_panel, reference_atlas
+
+
+@pytest.fixture
+def features() -> DataFrame:
+    rng = default_rng(0)
+    values = rng.normal(size=(60, 5))
+    features = DataFrame(values, columns=["a", "b", "c", "d", "e"])
+    # a near-duplicate feature
+    features["f"] = 2 * features["a"] + 0.001 * rng.normal(size=60)
+    features.insert(0, "unique_id", [f"S{i}" for i in range(60)])
+    return features
+
+
+@pytest.fixture
+def analysis(features: DataFrame) -> GlobalAnalysis:
+    return GlobalAnalysis(features, "features-key")
+
+
+def test_pruned_features(features: DataFrame):
+    analysis = GlobalAnalysis(features, "features-key", pruning_threshold=0.95)
+    assert len(analysis.dropped) == 1
+    assert analysis.features.shape[1] == 5
+    assert analysis.features_key != "features-key"
+    assert GlobalAnalysis(features).dropped is None
+
+
+def test_plan(analysis: GlobalAnalysis):
+    assert analysis.n_samples == 60
+    assert analysis.plan.feature_tier == "full"
+    plan = analysis.plan
+    assert GlobalAnalysis(analysis.projected_features, plan=plan).plan is plan
+
+
+def test_launch(analysis: GlobalAnalysis):
+    previous_embeddings, embedding_keys = {}, {}
+    futures = analysis.launch(["PCA"], previous_embeddings, embedding_keys)
+    assert list(futures) == ["PCA"]
+    embedding = analysis.embedding("PCA")
+    assert embedding.shape == (60, 3)
+    # computed by this rerun, the projection is timed
+    assert "PCA" in analysis.plan.measured
+    # the embedding is remembered for the warm starts and the snapshots
+    features_key, previous, source = previous_embeddings["PCA"]
+    assert features_key == "features-key" and source is None
+    assert list(previous.index) == list(analysis.names)
+    assert embedding_keys == {"PCA": analysis.keys["PCA"]}
+    assert [algorithm for algorithm, _ in analysis.completed()] == ["PCA"]
+
+
+def test_warm_start(analysis: GlobalAnalysis):
+    previous = DataFrame(
+        default_rng(1).normal(size=(60, 3)), index=analysis.names.to_numpy()
+    )
+    assert analysis.warm_start("UMAP", {}) is None
+    # a layout computed on other features is continued
+    warm_start = analysis.warm_start("UMAP", {"UMAP": ("other-key", previous, None)})
+    assert isinstance(warm_start, WarmStart) and warm_start.previous is previous
+    # the same features, the remembered embedding was a cold fit
+    assert (
+        analysis.warm_start("UMAP", {"UMAP": ("features-key", previous, None)}) is None
+    )
+    source = previous.iloc[:30]
+    warm_start = analysis.warm_start(
+        "UMAP", {"UMAP": ("features-key", previous, source)}
+    )
+    assert warm_start.previous is source
+
+
+def test_figure_and_exports(analysis: GlobalAnalysis):
+    analysis.launch(["PCA"], {}, {})
+    frame = analysis.embedding_frame(analysis.embedding("PCA"), ["S1"])
+    assert list(frame.columns) == ["fst_dim", "snd_dim", "trd_dim", "Name", "Style"]
+    assert frame.set_index("Name")["Style"].value_counts().to_dict() == {
+        "Base": 59,
+        "Selected": 1,
+    }
+    windows = DataFrame(
+        {"Name": ["S1"] * 2, "Start": [0, 10], **{c: [0.1, 0.2] for c in "abcde"}}
+    )
+    reference = DataFrame(
+        {"unique_id": ["M1"], "Frequency": ["Hourly"], **{c: [0.0] for c in "abcde"}}
+    )
+    for aggregate in (False, True):
+        fig = analysis.figure(
+            "PCA",
+            frame,
+            aggregate=aggregate,
+            window_features=windows,
+            reference=reference,
+        )
+        assert isinstance(fig, Figure)
+    assert analysis.trajectories("PCA", windows)["Start"].tolist() == [0, 10]
+    assert analysis.references("PCA", reference)["Frequency"].tolist() == ["Hourly"]
+    top_five = analysis.correlations(frame)
+    assert "Correlations" in analysis.plan.measured
+    exported = analysis.exports("PCA", frame, top_five, "arrow", 12)
+    assert list(exported) == ["features", "embedding", "correlations"]
+    assert all(isinstance(data, bytes) and data for data in exported.values())
+
+
+def test_followed_panel():
+    dataset = DataFrame(
+        {"unique_id": repeat(["A", "B", "C"], 4), "ds": tile(arange(4), 3), "y": 1.0}
+    )
+    panel = followed_panel(dataset, ["C", "A"])
+    assert panel["unique_id"].tolist() == ["C"] * 4 + ["A"] * 4
+
+
+def test_reference_atlas_missing(tmp_path):
+    assert reference_atlas([24], ["a"], str(tmp_path)) == (None, [], [])
@@ -0,0 +1,92 @@
+import pytest
+from numpy import arange, pi, repeat, sin, tile
+from numpy.random import default_rng
+from pandas import DataFrame, concat
+
+from src.length_policy import LengthPolicy, policy_errors
+
+FEATURES = ["acf_features", "stl_features", "series_length"]
+
+
+@pytest.fixture
+def panel() -> DataFrame:
+    rng = default_rng(0)
+    t = arange(600)
+    long = DataFrame(
+        {
+            "unique_id": repeat(["A", "B"], 600),
+            "ds": tile(t, 2),
+            "y": tile(sin(2 * pi * t / 24), 2) + 0.1 * rng.normal(size=1200),
+        }
+    )
+    short = DataFrame({"unique_id": "C", "ds": arange(100), "y": rng.normal(size=100)})
+    return concat([long, short], ignore_index=True)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        LengthPolicy("median")
+
+
+@pytest.mark.parametrize("method", ["decimate", "aggregate"])
+def test_reduce(panel: DataFrame, method: str):
+    policy = LengthPolicy(method, max_length=200)
+    [(reduced, freq)] = policy.reduce(panel, freq=24)
+    assert policy.factor(600) == 3 and freq == 8
+    # only the long series are reduced, to at most max_length points
+    assert set(reduced["unique_id"]) == {"A", "B"}
+    assert reduced.groupby("unique_id").size().eq(200).all()
+    assert list(reduced["ds"][:2]) == [0, 3]
+    if method == "decimate":
+        assert reduced["y"].iloc[1] == panel["y"].iloc[3]
+    else:
+        assert reduced["y"].iloc[1] == pytest.approx(panel["y"].iloc[3:6].mean())
+
+
+def test_reduce_windows(panel: DataFrame):
+    policy = LengthPolicy("windows", max_length=200, n_windows=4)
+    [(windows, freq)] = policy.reduce(panel, freq=24)
+    assert freq == 24
+    sizes = windows.groupby("unique_id").size()
+    assert len(sizes) == 8 and sizes.eq(50).all()
+    assert windows["unique_id"].str.rsplit("@", n=1).str[0].nunique() == 2
+
+
+@pytest.mark.parametrize("method", ["decimate", "aggregate", "windows"])
+def test_compute_tsfeatures(panel: DataFrame, method: str):
+    policy = LengthPolicy(method, max_length=200, n_windows=4)
+    features = policy.compute_tsfeatures(panel, freq=24, features=FEATURES)
+    assert list(features["unique_id"]) == ["A", "B", "C"]
+    assert not features.isna().any().any()
+    # the full length is kept, whatever the reduction
+    assert list(features["series_length"]) == [600, 600, 100]
+
+
+@pytest.mark.parametrize("method", ["decimate", "aggregate", "windows"])
+def test_approximations(panel: DataFrame, method: str):
+    policy = LengthPolicy(method, max_length=200, n_windows=4)
+    assert policy.approximations().empty
+    policy.compute_tsfeatures(panel, freq=24, features=FEATURES)
+    approximations = policy.approximations()
+    assert list(approximations["unique_id"]) == ["A", "B", "C"]
+    assert list(approximations["Approximated"]) == [True, True, False]
+    assert list(approximations["Length"]) == [600, 600, 100]
+    # the replicates of the long series differ a little, the short series are exact
+    assert (approximations["Standard error"][:2] > 0).all()
+    assert (approximations["Standard error"][:2] < 0.5).all()
+    assert approximations["Standard error"][2] == 0
+
+
+def test_policy_errors(panel: DataFrame):
+    errors = policy_errors(
+        panel, 24, LengthPolicy("aggregate", max_length=200), features=FEATURES
+    )
+    assert "series_length" not in errors.index
+    assert list(errors.columns) == [
+        "Median absolute error",
+        "Relative error",
+        "Rank correlation",
+        "Estimated error",
+    ]
+    # the seasonality of the series is kept by the aggregation
+    assert errors.loc["seasonal_strength", "Median absolute error"] < 0.1
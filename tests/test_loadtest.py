@@ -0,0 +1,82 @@
+import pytest
+from pandas import read_csv
+from streamlit.runtime import Runtime
+
+from src import loadtest
+from src.loadtest import (
+    PAGES,
+    MemorySampler,
+    SessionAppTest,
+    check_streamlit,
+    installed_runtime,
+    run_load_test,
+    synthetic_upload,
+)
+
+
+def test_synthetic_upload(tmp_path):
+    path = synthetic_upload(str(tmp_path / "upload.csv"), 5, 48, period=12)
+    upload = read_csv(path)
+    assert list(upload.columns) == ["unique_id", "ds", "y"]
+    assert upload.groupby("unique_id").size().eq(48).all()
+    assert upload["unique_id"].nunique() == 5
+
+
+def test_memory_sampler():
+    sampler = MemorySampler(interval=0.01)
+    sampler.start()
+    memory = sampler.stop()
+    assert 0 < memory["start (MB)"] <= memory["peak (MB)"]
+
+
+def test_pages_are_resolved():
+    for page in PAGES:
+        assert SessionAppTest(page).page_script_hash
+
+
+def test_installed_runtime():
+    previous = Runtime._instance
+    with installed_runtime() as runtime:
+        assert Runtime._instance is runtime
+    assert Runtime._instance is previous
+
+
+def test_check_streamlit(monkeypatch):
+    check_streamlit()
+    monkeypatch.setattr(loadtest, "STREAMLIT_VERSION", (1, 36))
+    with pytest.raises(RuntimeError, match="streamlit >=1.29,<1.36"):
+        check_streamlit()
+
+
+def test_upload(tmp_path):
+    upload = synthetic_upload(str(tmp_path / "upload.csv"), 3, 48, period=12)
+    with installed_runtime():
+        app = SessionAppTest.from_page("Dataset Loading").run()
+        # the uploaded file is read by the page, on this run and the next ones
+        app.upload(upload).run()
+        assert not app.exception
+        assert app.button[-1].label == "Transform and compute"
+        app.run()
+        assert app.button[-1].label == "Transform and compute"
+
+
+def test_load_test(tmp_path):
+    previous = Runtime._instance
+    report = run_load_test(
+        n_users=2,
+        n_series=4,
+        series_length=72,
+        n_interactions=1,
+        algorithms=["PCA"],
+        directory=str(tmp_path),
+    )
+    assert report["errors"] == []
+    latencies = report["latencies"]
+    # one session uploads its panel with the file uploader, the other one out-of-core
+    assert latencies.loc["Dataset Loading / transform and compute", "count"] == 1
+    assert latencies.loc["Dataset Loading / partition and compute", "count"] == 1
+    assert "Global Analysis / PCA projection" in latencies.index
+    assert (latencies["p50"] <= latencies["max"]).all()
+    assert report["throughput"] > 0
+    # the mock runtime does not leak into the other tests
+    assert Runtime._instance is previous
@@ -0,0 +1,111 @@
+import pytest
+from numpy import array, zeros
+from numpy.random import rand, seed
+from pandas import DataFrame
+
+from src.neighbors import (
+    FeatureIndex,
+    KNNGraph,
+    build_feature_index,
+    build_knn_graph,
+)
+
+
+@pytest.fixture
+def features() -> DataFrame:
+    seed(0)
+    df = DataFrame(rand(50, 4), columns=["a", "b", "c", "d"])
+    df.insert(0, "unique_id", [f"serie_{i}" for i in range(50)])
+    return df
+
+
+def test_query_excludes_itself(features: DataFrame):
+    index = build_feature_index(features)
+    neighbours = index.query("serie_0", k=3)
+    assert len(neighbours) == 3
+    assert "serie_0" not in neighbours["Name"].values
+    assert neighbours["Distance"].is_monotonic_increasing
+
+
+def test_query_excludes_reference_homonyms(features: DataFrame):
+    # serie_0 is a name of the dataset and of the reference
+    reference = features.iloc[:2].copy()
+    reference["a"] += 0.01
+    index = FeatureIndex().fit(
+        features["unique_id"], features.iloc[:, 1:].values, reference, list("abcd")
+    )
+    neighbours = index.query("serie_0", k=3)
+    assert len(neighbours) == 3
+    assert "serie_0" not in neighbours["Name"].values
+
+
+def test_query_vector(features: DataFrame):
+    index = build_feature_index(features)
+    neighbours = index.query(features.iloc[3, 1:].values.astype(float), k=1)
+    assert neighbours.loc[0, "Name"] == "serie_3"
+
+
+def test_approximate_matches_exact(features: DataFrame):
+    exact = build_feature_index(features)
+    approx = FeatureIndex(exact_threshold=0).fit(
+        features["unique_id"], features.iloc[:, 1:].values
+    )
+    assert not approx.exact_
+    assert set(approx.query("serie_0", k=3)["Name"]) == set(
+        exact.query("serie_0", k=3)["Name"]
+    )
+
+
+def test_unknown_serie(features: DataFrame):
+    with pytest.raises(KeyError, match="Unknown serie"):
+        build_feature_index(features).query("unknown")
+
+
+def test_save_and_load(features: DataFrame, tmp_path):
+    index = build_feature_index(features)
+    index.save(str(tmp_path / "index.pickle"))
+    loaded = FeatureIndex.load(str(tmp_path / "index.pickle"))
+    assert loaded.query("serie_1").equals(index.query("serie_1"))
+
+
+class TestKNNGraph:
+    @pytest.fixture
+    def graph(self, features: DataFrame):
+        return build_knn_graph(features.iloc[:, 1:].values, n_neighbors=10)
+
+    def test_neighbors_include_self(self, graph):
+        indices, distances = graph.neighbors(5)
+        assert indices.shape == (50, 5)
+        assert (indices[:, 0] == range(50)).all()
+        assert (distances[:, 0] == 0).all()
+
+    def test_too_many_neighbors(self, graph):
+        with pytest.raises(ValueError, match="neighbours"):
+            graph.neighbors(11)
+
+    def test_sparse_distances(self, graph):
+        sparse = graph.sparse_distances(4)
+        assert sparse.shape == (50, 50)
+        assert (sparse.getnnz(axis=1) == 5).all()
+        assert sparse.diagonal().sum() == 0
+
+    def test_sparse_distances_of_duplicates(self):
+        # four identical points, a point is not always its own first neighbour
+        indices = array([[1, 0, 2, 3], [0, 2, 3, 1], [2, 1, 0, 3], [0, 1, 2, 3]])
+        sparse = KNNGraph(indices, zeros((4, 4))).sparse_distances(2)
+        assert sparse.indices.reshape(4, 3).tolist() == [
+            [0, 1, 2],
+            [1, 0, 2],
+            [2, 1, 0],
+            [3, 0, 1],
+        ]
+
+    def test_approximate_graph(self, features: DataFrame):
+        graph = build_knn_graph(
+            features.iloc[:, 1:].values,
+            n_neighbors=5,
+            random_state=0,
+            exact_threshold=0,
+        )
+        assert graph.search_index is not None
+        assert graph.neighbors(5)[0].shape == (50, 5)
@@ -0,0 +1,126 @@
+import pytest
+from numpy import allclose, arange, tile, repeat
+from numpy.random import randn, seed
+from pandas import DataFrame
+
+from src.partitioning import (
+    PartitionedDataset,
+    compute_partitioned_tsfeatures,
+    detect_partitioned_periods,
+    list_series,
+    open_server_dataset,
+    serie_frame,
+    serie_length,
+)
+
+
+@pytest.fixture
+def dataset() -> DataFrame:
+    seed(0)
+    return DataFrame(
+        {
+            "unique_id": repeat([f"serie_{i}" for i in range(6)], 100),
+            "ds": tile(arange(100), 6),
+            "y": randn(600),
+        }
+    )
+
+
+@pytest.fixture
+def partitioned(dataset: DataFrame, tmp_path) -> PartitionedDataset:
+    path = tmp_path / "dataset.csv"
+    dataset.to_csv(path, index=False)
+    return PartitionedDataset.from_csv(
+        str(path), str(tmp_path / "partitions"), n_partitions=3, chunksize=150
+    )
+
+
+def test_each_serie_in_a_single_partition(partitioned: PartitionedDataset):
+    names = []
+    for partition in partitioned.iter_partitions():
+        names.extend(partition["unique_id"].unique())
+    assert sorted(names) == [f"serie_{i}" for i in range(6)]
+
+
+def test_get_serie(dataset: DataFrame, partitioned: PartitionedDataset):
+    serie = partitioned.get_serie("serie_2")
+    expected = dataset[dataset["unique_id"] == "serie_2"]
+    assert allclose(serie["y"].values, expected["y"].values)
+    assert partitioned.serie_length("serie_2") == 100
+
+
+def test_reopen(partitioned: PartitionedDataset):
+    assert PartitionedDataset.is_partitioned(partitioned.directory)
+    reopened = PartitionedDataset(partitioned.directory)
+    assert reopened.serie_names() == partitioned.serie_names()
+
+
+def test_add_toy_series(partitioned: PartitionedDataset):
+    partitioned.add_toy_series(freq=12)
+    assert "White noise" in partitioned.serie_names()
+    assert len(partitioned.get_serie("White noise")) == 1000
+    assert PartitionedDataset(partitioned.directory).manifest["toys_freq"] == 12
+
+
+def test_dispatch_helpers(dataset: DataFrame, partitioned: PartitionedDataset):
+    assert list_series(dataset) == list_series(partitioned)
+    assert serie_length(dataset, "serie_1") == serie_length(partitioned, "serie_1")
+    assert serie_frame(dataset, "serie_1") is dataset
+    assert len(serie_frame(partitioned, "serie_1")) < len(dataset)
+
+
+def test_partitioned_tsfeatures(partitioned: PartitionedDataset):
+    features = compute_partitioned_tsfeatures(partitioned, freq=12)
+    assert sorted(features["unique_id"]) == [f"serie_{i}" for i in range(6)]
+    assert features.isna().sum().sum() == 0
+
+
+def test_partitioned_periods(partitioned: PartitionedDataset):
+    periods = detect_partitioned_periods(partitioned)
+    assert list(periods.index) == [f"serie_{i}" for i in range(6)]
+    # white noise series
+    assert (periods == 1).all()
+    features = compute_partitioned_tsfeatures(partitioned, periods=periods)
+    assert sorted(features["unique_id"]) == list(periods.index)
+
+
+def test_partitioned_recompute(partitioned: PartitionedDataset):
+    features = ["entropy", "stl_features"]
+    previous = compute_partitioned_tsfeatures(partitioned, freq=12, features=features)
+    previous["entropy"] = -1.0
+    recomputed = compute_partitioned_tsfeatures(
+        partitioned, freq=6, features=features, previous=previous
+    )
+    assert (recomputed["entropy"] == -1).all()
+    assert (recomputed["seasonal_period"] == 6).all()
+
+
+def test_open_server_dataset(dataset: DataFrame, tmp_path):
+    (tmp_path / "data").mkdir()
+    dataset.to_csv(tmp_path / "data" / "dataset.csv", index=False)
+    directories = {
+        "data_directory": str(tmp_path / "data"),
+        "partitions_directory": str(tmp_path / "partitions"),
+    }
+    partitioned = open_server_dataset("dataset.csv", 3, **directories)
+    # the partitions are written by the app, not next to the source
+    assert partitioned.directory.startswith(str(tmp_path / "partitions"))
+    assert sorted(partitioned.serie_names()) == sorted(dataset["unique_id"].unique())
+    assert list((tmp_path / "data").iterdir()) == [tmp_path / "data" / "dataset.csv"]
+
+
+def test_open_partitioned_server_dataset(partitioned: PartitionedDataset, tmp_path):
+    reopened = open_server_dataset("partitions", data_directory=str(tmp_path))
+    assert reopened.manifest == partitioned.manifest
+
+
+@pytest.mark.parametrize(
+    "source", ["../dataset.csv", "/etc/passwd", "link/dataset.csv", "dataset.txt"]
+)
+def test_server_dataset_outside_data_directory(source: str, tmp_path):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "dataset.csv").write_text("unique_id,ds,y\n")
+    (tmp_path / "data" / "dataset.txt").write_text("unique_id,ds,y\n")
+    (tmp_path / "data" / "link").symlink_to(tmp_path)
+    with pytest.raises(ValueError):
+        open_server_dataset(source, data_directory=str(tmp_path / "data"))
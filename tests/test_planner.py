@@ -0,0 +1,52 @@
+from numpy import float32
+from numpy.random import rand
+
+from src.dimension_reduction import PCAReductor, SubsampledReductor, TSNEReductor
+from src.planner import FEATURE_TIERS, plan_execution
+
+
+def test_small_panel_plan():
+    plan = plan_execution(200, series_length=700, n_jobs=4)
+    assert plan.feature_tier == "full"
+    assert plan.fit_samples == {} and plan.pca_solver == "auto"
+    assert not plan.approximate_neighbors and plan.correlation_samples is None
+    assert list(plan.describe()["Step"]) == [
+        "Features",
+        "T-SNE",
+        "UMAP",
+        "PCA",
+        "Neighbours graph",
+        "Correlations",
+    ]
+
+
+def test_large_panel_plan():
+    plan = plan_execution(100_000, series_length=1000, latency_budget=60, n_jobs=1)
+    assert plan.feature_tier == "light"
+    assert 1000 <= plan.fit_samples["T-SNE"] < plan.fit_samples["UMAP"] < 100_000
+    assert plan.pca_solver == "auto" and plan.approximate_neighbors
+    assert plan.correlation_samples < 100_000
+    assert "exceeds the budget" in plan.describe().loc[0, "Reason"]
+
+
+def test_lighter_tier_when_needed():
+    plan = plan_execution(2000, series_length=1000, latency_budget=300, n_jobs=1)
+    assert plan.feature_tier == "standard"
+    assert "hw_parameters" not in FEATURE_TIERS["standard"]
+
+
+def test_plan_builds_reductors():
+    plan = plan_execution(20_000, n_features=42)
+    reductor = plan.build_reductor("T-SNE", 20_000, dtype=float32)
+    assert isinstance(reductor, SubsampledReductor)
+    assert isinstance(reductor.reductor, TSNEReductor)
+    pca = plan.build_reductor("PCA", 20_000)
+    assert isinstance(pca, PCAReductor) and pca.svd_solver == "auto"
+
+
+def test_measured_durations():
+    plan = plan_execution(100, n_features=10)
+    plan.record("PCA", 0.123)
+    described = plan.describe().set_index("Step")
+    assert described.loc["PCA", "Measured (s)"] == 0.12
+    assert described["Measured (s)"].isna().sum() == len(described) - 1
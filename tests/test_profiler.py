@@ -0,0 +1,109 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from time import perf_counter
+
+from pandas import DataFrame
+
+from src.profiler import (
+    SamplingProfiler,
+    collapsed_stacks,
+    dataset_size,
+    hot_functions,
+    list_profiles,
+    load_profile,
+    owned_task,
+    parse_collapsed_stacks,
+    save_profile,
+    start_profiler,
+    stop_profiler,
+)
+
+
+def busy_loop(duration: float) -> int:
+    total, start = 0, perf_counter()
+    while perf_counter() - start < duration:
+        total += sum(range(100))
+    return total
+
+
+def test_sampling_profiler():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    busy_loop(0.3)
+    with ThreadPoolExecutor(1, thread_name_prefix="reductor") as executor:
+        executor.submit(owned_task(busy_loop), 0.2).result()
+    stacks = profiler.stop()
+    assert profiler.duration >= 0.5
+    threads = {stack[0] for stack in stacks}
+    # the worker is sampled while busy, the other threads are not
+    assert threads == {"MainThread", "reductor_0"}
+    table = hot_functions(stacks, profiler.interval, top=5)
+    assert len(table) <= 5
+    assert table["Function"].str.startswith("busy_loop (").any()
+    assert table["Self (%)"].is_monotonic_decreasing
+    assert (table["Total (%)"] >= table["Self (%)"]).all()
+
+
+def test_other_sessions_tasks():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    # a task submitted by another session, to the shared pool
+    other_session = Thread(target=lambda: executor.submit(owned_task(busy_loop), 0.2))
+    with ThreadPoolExecutor(1, thread_name_prefix="reductor") as executor:
+        other_session.start()
+        other_session.join()
+    stacks = profiler.stop()
+    assert {stack[0] for stack in stacks} <= {"MainThread"}
+
+
+def test_collapsed_stacks_round_trip():
+    stacks = Counter(
+        {("MainThread", "a (x.py:1)", "b (x.py:5)"): 3, ("MainThread",): 1}
+    )
+    text = collapsed_stacks(stacks)
+    assert "MainThread;a (x.py:1);b (x.py:5) 3\n" in text
+    assert parse_collapsed_stacks(text) == stacks
+
+
+def test_hot_functions():
+    stacks = Counter({("T", "f", "g"): 3, ("T", "f"): 1, ("T", "f", "f"): 4})
+    table = hot_functions(stacks, interval=0.01).set_index("Function")
+    assert table.loc["f", "Self (s)"] == 0.05 and table.loc["g", "Self (%)"] == 37.5
+    # the recursive calls are counted once
+    assert table.loc["f", "Total (%)"] == 100.0
+
+
+def test_dataset_size():
+    dataset = DataFrame({"unique_id": ["a", "a", "b"], "ds": [0, 1, 0], "y": 0.0})
+    assert dataset_size(dataset) == (2, 3)
+    assert dataset_size(None) == (0, 0)
+
+
+def test_profiles(tmp_path):
+    dataset = DataFrame({"unique_id": ["a", "b"], "ds": 0, "y": 0.0})
+    state = {"profiled_pages": ["Global Analysis"], "dataset": dataset}
+    assert start_profiler("Local Analysis", state) is None
+    profiler = start_profiler("Global Analysis", state)
+    assert state["profiler"] is profiler
+    busy_loop(0.1)
+    path = stop_profiler(profiler, "Global Analysis", state, str(tmp_path))
+    assert "profiler" not in state and not profiler.is_alive()
+
+    stacks, metadata = load_profile(path)
+    assert stacks == profiler.stacks
+    assert metadata["page"] == "Global Analysis"
+    assert (metadata["series"], metadata["points"]) == (2, 2)
+    assert metadata["samples"] == sum(stacks.values())
+    profiles = list_profiles(str(tmp_path))
+    assert profiles[["Page", "Series", "Path"]].values.tolist() == [
+        ["Global Analysis", 2, path]
+    ]
+
+
+def test_interrupted_rerun():
+    state = {"profiled_pages": ["Local Analysis"]}
+    interrupted = start_profiler("Local Analysis", state)
+    # the next rerun stops the profiler of the interrupted one
+    assert start_profiler("Global Analysis", state) is None
+    assert not interrupted.is_alive() and "profiler" not in state
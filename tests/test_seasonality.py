@@ -0,0 +1,118 @@
+import pytest
+from numpy import arange, cumsum, isnan, pi, sin
+from numpy.random import default_rng
+from pandas import DataFrame, concat
+
+import src.seasonality
+from src.seasonality import (
+    autocorrelations,
+    compute_grouped_tsfeatures,
+    detect_periods,
+    padded_matrix,
+)
+
+FEATURES = ["acf_features", "stl_features"]
+
+
+@pytest.fixture
+def panel() -> DataFrame:
+    rng = default_rng(0)
+    series = {
+        "daily": 24,
+        "weekly": 7,
+        "monthly": 12,
+        "noise": None,
+        "random walk": None,
+    }
+    frames = []
+    for i, (name, period) in enumerate(series.items()):
+        t = arange(300 + 50 * i)
+        if period is None:
+            y = rng.normal(size=len(t))
+            y = cumsum(y) if name == "random walk" else y
+        else:
+            y = 2 * sin(2 * pi * t / period) + 0.5 * rng.normal(size=len(t)) + 0.01 * t
+        frames.append(DataFrame({"unique_id": name, "ds": t, "y": y}))
+    return concat(frames, ignore_index=True)
+
+
+def test_padded_matrix(panel: DataFrame):
+    names, values, lengths = padded_matrix(panel)
+    assert list(names) == sorted(panel["unique_id"].unique())
+    assert values.shape == (5, lengths.max())
+    assert isnan(values[names == "daily", lengths[names == "daily"][0] :]).all()
+
+
+def test_autocorrelations(panel: DataFrame):
+    _, values, _ = padded_matrix(panel)
+    acf = autocorrelations(values, 30)
+    assert acf.shape == (5, 31)
+    assert acf[:, 0] == pytest.approx(1)
+
+
+def test_detect_periods(panel: DataFrame):
+    periods = detect_periods(panel)
+    assert periods.to_dict() == {
+        "daily": 24,
+        "monthly": 12,
+        "noise": 1,
+        "random walk": 1,
+        "weekly": 7,
+    }
+
+
+def test_detect_periods_length_buckets(panel: DataFrame, monkeypatch):
+    t = arange(20_000)
+    long_serie = DataFrame({"unique_id": "long", "ds": t, "y": sin(2 * pi * t / 24)})
+    shapes = []
+
+    def recording(df):
+        names, values, lengths = padded_matrix(df)
+        shapes.append(values.shape)
+        return names, values, lengths
+
+    monkeypatch.setattr(src.seasonality, "padded_matrix", recording)
+    periods = detect_periods(concat([panel, long_serie], ignore_index=True))
+    assert periods["long"] == 24 and periods["daily"] == 24
+    # the short series are not padded to the long one
+    assert (1, 20_000) in shapes
+    assert max(rows * length for rows, length in shapes) == 20_000
+
+
+def test_detect_periods_bounds(panel: DataFrame):
+    assert detect_periods(panel, max_period=10)["daily"] == 1
+    assert detect_periods(panel, candidates=[7, 12])["daily"] == 1
+
+
+def test_grouped_tsfeatures(panel: DataFrame):
+    periods = detect_periods(panel)
+    features = compute_grouped_tsfeatures(panel, periods, features=FEATURES)
+    assert list(features["unique_id"]) == list(periods.index)
+    assert features.isna().sum().sum() == 0
+    # the seasonal features of the non seasonal series are filled
+    seasonal = features.set_index("unique_id")["seasonal_strength"]
+    assert seasonal["noise"] == 0 and seasonal["daily"] > 0.5
+
+
+def test_grouped_tsfeatures_wrapped_tasks(panel: DataFrame):
+    periods = {"daily": 24, "weekly": 7, "monthly": 12}
+    wrapped = []
+
+    def wrap_task(task):
+        wrapped.append(task)
+        return task
+
+    def compute(df, freq, fill_value, features):
+        return DataFrame({"unique_id": df["unique_id"].unique(), "freq": freq})
+
+    features = compute_grouped_tsfeatures(
+        panel, periods, compute=compute, wrap_task=wrap_task
+    )
+    assert wrapped == [compute]
+    assert features.set_index("unique_id")["freq"].to_dict() == {
+        "daily": 24,
+        "monthly": 12,
+        "noise": 1,
+        "random walk": 1,
+        "weekly": 7,
+    }
@@ -0,0 +1,114 @@
+import pytest
+from numpy import allclose
+from numpy.random import randn, seed
+
+from precomputed_ressources.loader import load_computed_features
+import src.service
+from src.service import (
+    FeatureBatcher,
+    LatencyRecorder,
+    ProjectionModel,
+    ProjectionService,
+    ServiceClient,
+)
+
+
+@pytest.fixture(scope="module")
+def model() -> ProjectionModel:
+    return ProjectionModel("PCA").fit(load_computed_features())
+
+
+@pytest.fixture
+def series() -> dict:
+    seed(0)
+    return {f"S{i}": randn(200).cumsum() for i in range(3)}
+
+
+def test_model_persistence(model: ProjectionModel, tmp_path):
+    features = load_computed_features().set_index("unique_id")
+    path = str(tmp_path / "model.pickle")
+    model.save(path)
+    loaded = ProjectionModel.load(path)
+    assert allclose(
+        loaded.transform(features), model.reductor_.reducted_dataset_, atol=1e-4
+    )
+    assert set(loaded.correlations_) == {"fst_dim", "snd_dim", "trd_dim"}
+
+
+def test_model_unprojectable_algorithm():
+    with pytest.raises(ValueError, match="T-SNE cannot project new series"):
+        ProjectionModel("T-SNE").fit(load_computed_features())
+
+
+def test_latency_percentiles():
+    recorder = LatencyRecorder()
+    for latency in range(1, 101):
+        recorder.record("/project", latency / 1000)
+    report = recorder.percentiles()["/project"]
+    assert report["count"] == 100 and report["p50"] == pytest.approx(50.5)
+
+
+def test_batcher_deduplicates(series: dict):
+    batcher = FeatureBatcher(max_wait=0.2, n_workers=1)
+    futures = [batcher.submit(values) for values in series.values()]
+    duplicate = batcher.submit(series["S0"])
+    assert duplicate is futures[0]
+    assert (duplicate.result() == futures[0].result()).all()
+    assert batcher.submit(series["S0"]).result() is not None
+    stats = batcher.stats()
+    assert (stats["batches"], stats["computed"], stats["deduplicated"]) == (1, 3, 2)
+    batcher.close()
+
+
+def test_batcher_isolates_failures(series: dict, monkeypatch):
+    def compute_tsfeatures(frame, freq, fill_value):
+        if (frame["y"] < -1e6).any():
+            raise ValueError("Bad serie")
+        return frame.groupby("unique_id").size().rename("length").reset_index()
+
+    monkeypatch.setattr(src.service, "compute_tsfeatures", compute_tsfeatures)
+    batcher = FeatureBatcher(max_wait=0.2, n_workers=1)
+    futures = [batcher.submit(values) for values in series.values()]
+    bad, empty = batcher.submit([-1e9] * 10), batcher.submit([])
+    # the batch fails, the series are retried one by one
+    assert [future.result()["length"] for future in futures] == [200] * 3
+    with pytest.raises(ValueError, match="Bad serie"):
+        bad.result()
+    with pytest.raises(ValueError, match="no values"):
+        empty.result()
+    assert batcher.stats()["computed"] == 3
+    batcher.close()
+
+
+def test_internal_error():
+    # an unfitted model has no correlations
+    service = ProjectionService(ProjectionModel(), n_workers=1)
+    status, response = service.handle("GET", "/correlations")
+    assert status == 500 and response["error"].startswith("AttributeError")
+    service.stop()
+
+
+class TestProjectionService:
+    @pytest.fixture
+    def client(self, model: ProjectionModel):
+        service = ProjectionService(model, port=0)
+        host, port = service.start()
+        yield ServiceClient(f"http://{host}:{port}")
+        service.stop()
+
+    def test_project(self, client: ServiceClient, series: dict):
+        coordinates = client.project(series)
+        assert coordinates.shape == (3, 3)
+        assert list(coordinates.index) == list(series)
+        features = client.features({"S0": series["S0"]})
+        assert "hurst" in features.columns
+        assert client.stats()["latencies_ms"]["/project"]["count"] == 1
+
+    def test_correlations(self, client: ServiceClient):
+        assert len(client.correlations()["fst_dim"]) == 5
+
+    def test_errors(self, client: ServiceClient):
+        with pytest.raises(RuntimeError, match="Unknown endpoint"):
+            client._request("/unknown")
+        with pytest.raises(RuntimeError, match="must map the series names"):
+            client._request("/project", {"series": []})
@@ -0,0 +1,180 @@
+import pytest
+from numpy import allclose, arange, memmap, repeat, tile
+from numpy.random import default_rng
+from pandas import DataFrame
+
+from src.partitioning import PartitionedDataset
+from src.planner import plan_execution
+from src.snapshot import (
+    list_snapshots,
+    load_snapshot,
+    owner_directory,
+    save_snapshot,
+    signing_key,
+    snapshot_directory,
+)
+from src.summary import summarize_panel
+
+
+KEY = b"server-key"
+
+
+@pytest.fixture
+def state() -> dict:
+    rng = default_rng(0)
+    dataset = DataFrame(
+        {
+            "unique_id": repeat(["A", "B", "C"], 50),
+            "ds": tile(arange(50), 3),
+            "y": rng.normal(size=150),
+        }
+    )
+    features = DataFrame(
+        {"unique_id": ["A", "B", "C"], "entropy": [0.1, 0.5, 0.9], "trend": 0.0}
+    )
+    embedding = rng.normal(size=(3, 3))
+    return {
+        "dataset": dataset,
+        "features": features,
+        "summary": summarize_panel(dataset),
+        "period": 12,
+        "periods": {"A": 12, "B": 1, "C": 12},
+        "plan": plan_execution(3, series_length=50),
+        "features_key": "features-key",
+        "embedding_keys": {"PCA": "pca-key"},
+        "selection": {"selected_datasets": ["A"], "followed_series": []},
+        "previous_embeddings": {
+            "PCA": (
+                "features-key",
+                DataFrame(embedding, index=["A", "B", "C"]),
+                DataFrame(embedding[:2], index=["A", "B"]),
+            ),
+            "UMAP": ("features-key", DataFrame(embedding, index=["A", "B", "C"]), None),
+        },
+        # not part of the analysis
+        "view_cache": object(),
+    }
+
+
+def test_round_trip(state: dict, tmp_path):
+    embedding = default_rng(1).normal(size=(3, 3))
+    save_snapshot(state, str(tmp_path / "analysis"), {"pca-key": embedding}, KEY)
+    restored, embeddings = load_snapshot(str(tmp_path / "analysis"), key=KEY)
+    assert "view_cache" not in restored
+    for name in ("dataset", "features", "summary"):
+        assert restored[name].equals(state[name])
+    for name in ("period", "periods", "features_key", "embedding_keys", "selection"):
+        assert restored[name] == state[name]
+    assert restored["plan"].feature_tier == state["plan"].feature_tier
+    features_key, previous, source = restored["previous_embeddings"]["PCA"]
+    assert features_key == "features-key"
+    assert previous.equals(state["previous_embeddings"]["PCA"][1])
+    # the warm start of the embedding is rebuilt with the same key
+    assert source.equals(state["previous_embeddings"]["PCA"][2])
+    assert restored["previous_embeddings"]["UMAP"][2] is None
+    # the embeddings are memory mapped
+    assert isinstance(embeddings["pca-key"], memmap)
+    assert allclose(embeddings["pca-key"], embedding)
+
+
+def test_restored_tables_are_mapped(state: dict, tmp_path):
+    save_snapshot(state, str(tmp_path / "analysis"), key=KEY)
+    restored, _ = load_snapshot(str(tmp_path / "analysis"), key=KEY)
+    # the numeric columns are read only views on the arrow files, not copies
+    for name, column in (("dataset", "y"), ("features", "entropy")):
+        values = restored[name][column].to_numpy()
+        assert not values.flags.writeable and not values.flags.owndata
+    assert (
+        restored["dataset"]["unique_id"].tolist()
+        == state["dataset"]["unique_id"].tolist()
+    )
+
+
+def test_save_restored_snapshot(state: dict, tmp_path):
+    directory = str(tmp_path / "analysis")
+    embedding = default_rng(1).normal(size=(1000, 50))
+    save_snapshot(state, directory, {"pca-key": embedding}, KEY)
+    restored, embeddings = load_snapshot(directory, key=KEY)
+    # saved again under its own name, while its files are memory mapped
+    save_snapshot(restored, directory, embeddings, KEY)
+    assert allclose(embeddings["pca-key"], embedding)
+    assert allclose(
+        restored["previous_embeddings"]["PCA"][1],
+        state["previous_embeddings"]["PCA"][1],
+    )
+    restored, embeddings = load_snapshot(directory, key=KEY)
+    assert allclose(embeddings["pca-key"], embedding)
+    assert restored["features"].equals(state["features"])
+    # the bundle is written aside and moved in place, nothing is left behind
+    assert [path.name for path in tmp_path.iterdir()] == ["analysis"]
+
+
+def test_corrupted_snapshot(state: dict, tmp_path):
+    save_snapshot(state, str(tmp_path / "analysis"), key=KEY)
+    with open(tmp_path / "analysis" / "features.arrow", "r+b") as handle:
+        handle.seek(-16, 2)
+        handle.write(b"0" * 8)
+    with pytest.raises(ValueError):
+        load_snapshot(str(tmp_path / "analysis"), key=KEY)
+    (tmp_path / "analysis" / "values.pickle").unlink()
+    with pytest.raises(ValueError):
+        load_snapshot(str(tmp_path / "analysis"), verify=False, key=KEY)
+    with pytest.raises(ValueError):
+        load_snapshot(str(tmp_path / "missing"), key=KEY)
+
+
+def test_foreign_snapshot(state: dict, tmp_path):
+    save_snapshot(state, str(tmp_path / "analysis"), key=b"another-server")
+    with pytest.raises(ValueError, match="not saved by this server"):
+        load_snapshot(str(tmp_path / "analysis"), key=KEY)
+    # the pickled values are checked even without the checksums
+    save_snapshot(state, str(tmp_path / "analysis"), key=KEY)
+    with open(tmp_path / "analysis" / "values.pickle", "ab") as handle:
+        handle.write(b"0")
+    with pytest.raises(ValueError, match="Corrupted"):
+        load_snapshot(str(tmp_path / "analysis"), verify=False, key=KEY)
+
+
+def test_signing_key(tmp_path, monkeypatch):
+    monkeypatch.delenv("FBP_SNAPSHOT_KEY", raising=False)
+    key = signing_key(str(tmp_path))
+    assert len(key) == 32 and signing_key(str(tmp_path)) == key
+    assert (tmp_path / ".signing_key").stat().st_mode & 0o077 == 0
+    monkeypatch.setenv("FBP_SNAPSHOT_KEY", "00ff")
+    assert signing_key(str(tmp_path)) == b"\x00\xff"
+
+
+@pytest.mark.parametrize("name", ["../escape", "/tmp/absolute", "a/b", "", ".."])
+def test_invalid_snapshot_name(name: str, tmp_path):
+    with pytest.raises(ValueError, match="Invalid snapshot name"):
+        snapshot_directory(owner_directory("key"), name, str(tmp_path))
+
+
+def test_symbolic_link_escape(tmp_path):
+    owner = owner_directory("key")
+    (tmp_path / "root" / owner).mkdir(parents=True)
+    (tmp_path / "root" / owner / "link").symlink_to(tmp_path)
+    with pytest.raises(ValueError, match="outside"):
+        snapshot_directory(owner, "link", str(tmp_path / "root"))
+
+
+def test_partitioned_dataset(state: dict, tmp_path):
+    path = tmp_path / "dataset.csv"
+    state["dataset"].to_csv(path, index=False)
+    state["dataset"] = PartitionedDataset.from_csv(
+        str(path), str(tmp_path / "partitions"), n_partitions=2
+    )
+    save_snapshot(state, str(tmp_path / "analysis"), key=KEY)
+    restored, _ = load_snapshot(str(tmp_path / "analysis"), key=KEY)
+    assert isinstance(restored["dataset"], PartitionedDataset)
+    assert sorted(restored["dataset"].serie_names()) == ["A", "B", "C"]
+
+
+def test_list_snapshots(state: dict, tmp_path):
+    owner, other = owner_directory("key"), owner_directory("other key")
+    assert list_snapshots(owner, str(tmp_path)).empty
+    for name in ("first", "second"):
+        save_snapshot(state, snapshot_directory(owner, name, str(tmp_path)), key=KEY)
+    save_snapshot(state, snapshot_directory(other, "third", str(tmp_path)), key=KEY)
+    # the snapshots of the other owners are not listed
+    assert set(list_snapshots(owner, str(tmp_path))["Snapshot"]) == {"first", "second"}
@@ -1,5 +1,10 @@
+from subprocess import run
+from textwrap import dedent
+import sys
+
 import pytest
-from numpy.random import seed
+from numpy import arange, abs as nabs, allclose
+from numpy.random import seed, randn
 from pandas import DataFrame
 
 from precomputed_ressources.loader import (
@@ -17,6 +22,10 @@ from src.space_projection import (
     compute_wavelets,
     compute_fft,
     compute_tsfeatures,
+    compute_window_tsfeatures,
+    recompute_tsfeatures,
+    window_panel,
+    WaveletScalogram,
 )
 from src.utils import transform_nixtla_format
 
@@ -52,6 +61,36 @@ def test_wavelets_computation(dataset: DataFrame):
     assert (continuous_wavelet_transform == precomputed_cwt).all()
 
 
+class TestWaveletScalogram:
+    @pytest.fixture
+    def serie(self) -> DataFrame:
+        seed(0)
+        return DataFrame({"ds": arange(20000), "y": randn(20000).cumsum()})
+
+    def test_tiles_match_full_transform(self, serie: DataFrame):
+        _, _, cwt_result = compute_wavelets(serie, 24)
+        scalogram = WaveletScalogram(serie, 24, tile_size=1000, max_points=5000)
+        time_index, magnitude = scalogram.window(900, 2900)
+        assert (time_index == arange(900, 2900)).all()
+        assert allclose(magnitude, nabs(cwt_result[:, 900:2900]))
+        assert len(scalogram.tiles_) == 3
+
+    def test_overview_is_pooled(self, serie: DataFrame):
+        _, _, cwt_result = compute_wavelets(serie, 24)
+        scalogram = WaveletScalogram(serie, 24, tile_size=1000, max_points=1000)
+        time_index, magnitude = scalogram.window()
+        assert magnitude.shape == (33, 1000)
+        assert (time_index == arange(0, 19999, 20)).all()
+        assert allclose(magnitude[:, 0], nabs(cwt_result[:, :20]).max(axis=1))
+        assert scalogram.window() is scalogram.overview_
+
+    def test_short_serie(self):
+        serie = DataFrame({"ds": arange(300), "y": randn(300)})
+        _, _, cwt_result = compute_wavelets(serie, 24)
+        _, magnitude = WaveletScalogram(serie, 24).window()
+        assert allclose(magnitude, nabs(cwt_result))
+
+
 class TestFeaturesComputation:
     @pytest.fixture
     def features(self) -> DataFrame:
@@ -70,3 +109,149 @@ class TestFeaturesComputation:
 #     precomputed_freq, precomputed_fft = load_fft()
 #     assert (freq == precomputed_freq).all()
 #     assert (fft == precomputed_fft).all()
+
+
+def test_tsfeatures_tier():
+    seed(0)
+    df = DataFrame(
+        {
+            "unique_id": ["A"] * 100 + ["B"] * 100,
+            "ds": [*arange(100), *arange(100)],
+            "y": randn(200).cumsum(),
+        }
+    )
+    features = compute_tsfeatures(
+        df, freq=12, features=["acf_features", "series_length"]
+    )
+    assert set(features.columns) == {
+        "unique_id",
+        "series_length",
+        "x_acf1",
+        "x_acf10",
+        "diff1_acf1",
+        "diff1_acf10",
+        "diff2_acf1",
+        "diff2_acf10",
+        "seas_acf1",
+    }
+
+
+class TestRollingWindows:
+    @pytest.fixture
+    def panel(self) -> DataFrame:
+        seed(0)
+        return DataFrame(
+            {
+                "unique_id": ["B"] * 120 + ["A"] * 100 + ["C"] * 20,
+                "ds": [*arange(120), *arange(100), *arange(20)],
+                "y": randn(240).cumsum(),
+            }
+        )
+
+    def test_window_panel(self, panel: DataFrame):
+        windows_panel, windows = window_panel(panel, window=50, step=25)
+        # 3 windows of A, 3 of B, C is shorter than a window
+        assert list(windows["Name"]) == ["A"] * 3 + ["B"] * 3
+        assert list(windows["Start"]) == [0, 25, 50] * 2
+        assert len(windows_panel) == 6 * 50
+        serie = panel[panel["unique_id"] == "B"]["y"].to_numpy()
+        window = windows_panel[windows_panel["unique_id"] == windows["unique_id"][4]]
+        assert allclose(window["y"], serie[25:75])
+
+    def test_invalid_window(self, panel: DataFrame):
+        with pytest.raises(ValueError):
+            window_panel(panel, window=0)
+
+    def test_window_tsfeatures(self, panel: DataFrame):
+        features = compute_window_tsfeatures(
+            panel, window=50, step=25, freq=12, features=["series_length"]
+        )
+        assert list(features.columns) == ["Name", "Start", "series_length"]
+        assert (features["series_length"] == 50).all()
+        assert len(features) == 6
+
+    def test_window_tsfeatures_after_umap(self):
+        # the trajectories of the Global page, computed once UMAP started the numba threads
+        script = dedent(
+            """
+            from numpy import arange, repeat, tile
+            from numpy.random import default_rng
+            from pandas import DataFrame
+
+            from src.dimension_reduction import UMAPReductor
+            from src.neighbors import build_knn_graph
+            from src.space_projection import compute_window_tsfeatures
+
+            rng = default_rng(0)
+            X = rng.normal(size=(200, 8))
+            graph = build_knn_graph(X, 16, random_state=0, exact_threshold=0)
+            UMAPReductor(random_state=None, knn_graph=graph).fit_transform(X)
+            panel = DataFrame(
+                {
+                    "unique_id": repeat(["A", "B"], 100),
+                    "ds": tile(arange(100), 2),
+                    "y": rng.normal(size=200).cumsum(),
+                }
+            )
+            features = compute_window_tsfeatures(
+                panel, window=50, step=25, freq=12, features=["acf_features"]
+            )
+            assert len(features) == 6
+            """
+        )
+        # a deadlocked pool hangs, the timeout turns it into a failure
+        done = run([sys.executable, "-c", script], timeout=300)
+        assert done.returncode == 0
+
+
+class TestRecomputeFeatures:
+    FEATURES = ["acf_features", "entropy", "stl_features", "series_length"]
+
+    @pytest.fixture
+    def panel(self) -> DataFrame:
+        seed(0)
+        return DataFrame(
+            {
+                "unique_id": ["A"] * 120 + ["B"] * 120,
+                "ds": [*arange(120), *arange(120)],
+                "y": randn(240),
+            }
+        )
+
+    @pytest.mark.parametrize("previous_freq,freq", [(12, 6), (1, 12), (12, 1)])
+    def test_same_as_full_computation(
+        self, panel: DataFrame, previous_freq: int, freq: int
+    ):
+        previous = compute_tsfeatures(panel, freq=previous_freq, features=self.FEATURES)
+        recomputed = recompute_tsfeatures(
+            panel, previous, freq=freq, features=self.FEATURES
+        )
+        expected = compute_tsfeatures(panel, freq=freq, features=self.FEATURES)
+        assert set(recomputed.columns) == set(expected.columns)
+        assert (recomputed["unique_id"] == expected["unique_id"]).all()
+        columns = expected.columns.drop("unique_id")
+        assert allclose(recomputed[columns], expected[columns])
+
+    def test_columns_order_and_reuse(self, panel: DataFrame):
+        previous = compute_tsfeatures(panel, freq=12, features=self.FEATURES)
+        previous = previous[["unique_id", *previous.columns[:0:-1]]]
+        # a marker on a period independent feature
+        previous["entropy"] = -1.0
+        recomputed = recompute_tsfeatures(
+            panel, previous, freq=6, features=self.FEATURES
+        )
+        assert list(recomputed.columns) == list(previous.columns)
+        assert (recomputed["entropy"] == -1).all()
+
+    def test_stale_and_new_series(self, panel: DataFrame):
+        previous = compute_tsfeatures(panel, freq=12, features=self.FEATURES)
+        previous["entropy"] = -1.0
+        recomputed = recompute_tsfeatures(
+            panel,
+            previous[previous["unique_id"] == "A"],
+            freq=12,
+            features=self.FEATURES,
+            stale=["A"],
+        )
+        assert list(recomputed["unique_id"]) == ["A", "B"]
+        assert (recomputed["entropy"] > 0).all()
@@ -0,0 +1,17 @@
+import pytest
+
+from src.startup import import_time
+
+
+@pytest.mark.parametrize(
+    "module", ["src.dimension_reduction", "src.space_projection", "src.views"]
+)
+def test_heavy_modules_are_lazily_imported(module: str):
+    measure = import_time(module)
+    assert measure["Heavy modules loaded"] == ""
+    assert measure["Import time (ms)"] > 0
+
+
+def test_import_error():
+    with pytest.raises(ImportError):
+        import_time("src.not_a_module")
@@ -0,0 +1,82 @@
+import pytest
+from numpy import arange, isclose, nan, repeat
+from numpy.random import default_rng
+from pandas import DataFrame, concat
+
+from src.partitioning import PartitionedDataset
+from src.summary import (
+    SUMMARY_COLUMNS,
+    outlier_statistics,
+    summarize_dataset,
+    summarize_panel,
+)
+from src.utils import advanced_describe
+
+
+@pytest.fixture
+def panel() -> DataFrame:
+    rng = default_rng(0)
+    return DataFrame(
+        {
+            "unique_id": repeat(["B", "A", "C"], [200, 150, 3]),
+            "ds": [*arange(200), *arange(150), *arange(3)],
+            "y": rng.gamma(2, size=353),
+        }
+    )
+
+
+def test_matches_advanced_describe(panel: DataFrame):
+    summary = summarize_panel(panel)
+    assert list(summary.index) == ["A", "B", "C"]
+    for name in ["A", "B"]:
+        expected = advanced_describe(panel[panel["unique_id"] == name]["y"])
+        assert isclose(summary.loc[name, SUMMARY_COLUMNS].astype(float), expected).all()
+    assert not summary["approximate"].any()
+
+
+def test_short_and_constant_series():
+    panel = DataFrame(
+        {"unique_id": ["A"] * 3 + ["B"] * 5, "ds": 0, "y": [1, 2, 4, 3, 3, 3, 3, nan]}
+    )
+    summary = summarize_panel(panel)
+    assert summary.loc["A", "kurt"] != summary.loc["A", "kurt"]
+    assert summary.loc["B", "count"] == 4
+    assert summary.loc["B", "std"] == 0 and summary.loc["B", "skew"] == 0
+
+
+def test_approximate_quantiles():
+    rng = default_rng(0)
+    panel = DataFrame({"unique_id": "A", "ds": 0, "y": rng.normal(size=50_000)})
+    summary = summarize_panel(panel, exact_threshold=10_000, sketch_size=4096)
+    expected = advanced_describe(panel["y"])
+    assert summary.loc["A", "approximate"]
+    assert isclose(
+        summary.loc["A", ["25%", "50%", "75%"]].astype(float), expected[4:7], atol=0.05
+    ).all()
+    # the moments and extremes stay exact
+    for column in ["count", "mean", "std", "min", "max", "skew", "kurt"]:
+        assert isclose(summary.loc["A", column], expected[column])
+
+
+def test_partitioned_dataset(panel: DataFrame, tmp_path):
+    dataset = PartitionedDataset.from_chunks(
+        [panel], directory=str(tmp_path), n_partitions=2
+    )
+    assert summarize_dataset(dataset).equals(summarize_panel(panel))
+
+
+def test_outlier_statistics(panel: DataFrame):
+    panel = panel[panel["unique_id"] != "C"]
+    shifted = panel.assign(unique_id="D", y=panel["y"] + 100)
+    rng = default_rng(1)
+    others = DataFrame(
+        {
+            "unique_id": repeat([f"S{i}" for i in range(20)], 100),
+            "ds": 0,
+            "y": rng.gamma(2, size=2000),
+        }
+    )
+    summary = summarize_panel(concat([panel, shifted, others]))
+    outlying = outlier_statistics(summary)
+    assert "mean" in outlying["D"]
+    assert outlying["S0"] == ""
@@ -1,4 +1,5 @@
 from pandas import Series, DataFrame
+from numpy import float32
 from numpy.random import rand, randn
 from numpy.testing import assert_array_almost_equal
 
@@ -8,6 +9,7 @@ from src.utils import (
     build_reduc_dim_df,
     advanced_describe,
     encoder,
+    get_top_five_correlations,
     preprocess_features,
 )
 
@@ -61,3 +63,20 @@ def test_preprocess_features():
     assert (names == ["Test"] * 100).all()
     assert features.equals(df.drop("unique_id", axis=1))
     assert_array_almost_equal(features_values, df.drop("unique_id", axis=1).values)
+
+
+def test_preprocess_features_dtype():
+    df = DataFrame({"unique_id": ["A", "B"], "1": [1.0, None], "2": [2, 3]})
+    _, _, features_values = preprocess_features(df, dtype=float32)
+    assert features_values.dtype == float32
+    assert_array_almost_equal(features_values, [[1, 2], [0, 3]])
+
+
+def test_top_five_correlations_subsample():
+    reducted = DataFrame(rand(500, 3), columns=["fst_dim", "snd_dim", "trd_dim"])
+    features = DataFrame(rand(500, 8), columns=[f"feature_{i}" for i in range(8)])
+    features["feature_0"] = reducted["fst_dim"]
+    top_five = get_top_five_correlations(reducted, features, max_samples=100)
+    assert list(top_five) == ["fst_dim", "snd_dim", "trd_dim"]
+    assert top_five["fst_dim"].index[0] == "feature_0"
+    assert top_five["fst_dim"].iloc[0] == 1
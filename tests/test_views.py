@@ -0,0 +1,59 @@
+import pytest
+from numpy import arange, tile, repeat
+from numpy.random import randn, seed
+from pandas import DataFrame
+
+from src.views import VIEWS, ViewCache, build_view, neighbouring_series
+
+
+@pytest.fixture
+def dataset() -> DataFrame:
+    seed(0)
+    return DataFrame(
+        {
+            "unique_id": repeat(["A", "B", "C"], 200),
+            "ds": tile(arange(200), 3),
+            "y": randn(600),
+        }
+    )
+
+
+@pytest.mark.parametrize("plot_name", VIEWS)
+def test_build_view(dataset: DataFrame, plot_name: str):
+    fig, describe = build_view(dataset, "A", plot_name, period=12)
+    assert len(fig.data) > 0
+    assert describe.index == ["A"]
+
+
+def test_unknown_view(dataset: DataFrame):
+    with pytest.raises(ValueError, match="Unknown type of plot"):
+        build_view(dataset, "A", "Unknown view")
+
+
+def test_view_cache(dataset: DataFrame):
+    cache = ViewCache(max_entries=2)
+    view = cache.get_view(dataset, "A", "Time view", 12)
+    assert cache.get_view(dataset, "A", "Time view", 12) is view
+    assert ("A", "Time view", 12, None) in cache
+    assert ("A", "Time view", 24, None) not in cache
+
+
+def test_prefetch(dataset: DataFrame):
+    cache = ViewCache()
+    cache.prefetch(dataset, ["B", "C"], "Density view", 12)
+    cache.get_view(dataset, "B", "Density view", 12)
+    cache.get_view(dataset, "C", "Density view", 12)
+    assert len(cache) == 2
+
+
+def test_neighbouring_series():
+    options = ["A", "B", "C", "D"]
+    assert neighbouring_series(options, "B") == ["C", "A"]
+    assert neighbouring_series(options, "A", width=2) == ["B", "C"]
+
+
+def test_wavelet_window(dataset: DataFrame):
+    cache = ViewCache()
+    fig, _ = cache.get_view(dataset, "A", "Wavelets (ricker) view", 12, window=(10, 60))
+    assert fig.data[0].x.shape == (21, 50)
+    assert len(cache.scalograms_) == 1